@@ -0,0 +1,127 @@
+"""Schemat początkowy
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+Istniejące bazy utworzone przed wprowadzeniem migracji należy oznaczyć poleceniem
+`alembic stamp 0001`, a następnie wykonać `alembic upgrade head`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datasets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("format", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_datasets_id", "datasets", ["id"])
+    op.create_index("ix_datasets_name", "datasets", ["name"])
+
+    op.create_table(
+        "images",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("path", sa.String()),
+        sa.Column("width", sa.Integer()),
+        sa.Column("height", sa.Integer()),
+        sa.Column("format", sa.String()),
+        sa.Column("size", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id"), nullable=True),
+    )
+    op.create_index("ix_images_id", "images", ["id"])
+    op.create_index("ix_images_name", "images", ["name"])
+
+    op.create_table(
+        "classes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("color", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_classes_id", "classes", ["id"])
+    op.create_index("ix_classes_name", "classes", ["name"])
+
+    op.create_table(
+        "annotations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("x", sa.Float()),
+        sa.Column("y", sa.Float()),
+        sa.Column("width", sa.Float()),
+        sa.Column("height", sa.Float()),
+        sa.Column("format", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id")),
+        sa.Column("class_id", sa.Integer(), sa.ForeignKey("classes.id")),
+    )
+    op.create_index("ix_annotations_id", "annotations", ["id"])
+
+    op.create_table(
+        "models",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("model_type", sa.String()),
+        sa.Column("framework", sa.String()),
+        sa.Column("version", sa.String()),
+        sa.Column("path", sa.String(), nullable=True),
+        sa.Column("config", sa.JSON(), nullable=True),
+        sa.Column("metrics", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_models_id", "models", ["id"])
+    op.create_index("ix_models_name", "models", ["name"])
+
+    op.create_table(
+        "trainings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("config", sa.JSON(), nullable=True),
+        sa.Column("results", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id")),
+        sa.Column("model_id", sa.Integer(), sa.ForeignKey("models.id")),
+    )
+    op.create_index("ix_trainings_id", "trainings", ["id"])
+    op.create_index("ix_trainings_name", "trainings", ["name"])
+
+    op.create_table(
+        "detections",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("results", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("processing_time", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id")),
+        sa.Column("model_id", sa.Integer(), sa.ForeignKey("models.id")),
+    )
+    op.create_index("ix_detections_id", "detections", ["id"])
+
+
+def downgrade():
+    for table in ("detections", "trainings", "models", "annotations", "classes", "images", "datasets"):
+        op.drop_table(table)
@@ -0,0 +1,43 @@
+"""Kolumna images.is_labeled i tabela dataset_stats
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00
+
+Statystyki nie są tu wypełniane - brakujący wiersz dataset_stats jest przeliczany
+przy pierwszym odczycie lub zapisie w datasecie (DatasetStatsService).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "images",
+        sa.Column("is_labeled", sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.execute(
+        "UPDATE images SET is_labeled = TRUE "
+        "WHERE EXISTS (SELECT 1 FROM annotations WHERE annotations.image_id = images.id)"
+    )
+
+    op.create_table(
+        "dataset_stats",
+        sa.Column("dataset_id", sa.Integer(), sa.ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("images_count", sa.Integer(), nullable=False),
+        sa.Column("labeled_images_count", sa.Integer(), nullable=False),
+        sa.Column("annotations_count", sa.Integer(), nullable=False),
+        sa.Column("class_counts", sa.JSON(), nullable=False),
+        sa.Column("box_size_histogram", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("dataset_stats")
+    op.drop_column("images", "is_labeled")
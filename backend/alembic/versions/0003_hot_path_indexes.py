@@ -0,0 +1,55 @@
+"""Indeksy złożone i częściowe dla najczęstszych zapytań
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:10:00
+
+Indeksy tworzone są z CONCURRENTLY (poza transakcją migracji), aby nie blokować
+zapisów do dużych tabel. Przerwane CREATE INDEX CONCURRENTLY zostawia nieważny
+indeks - przed ponowieniem migracji należy go usunąć.
+Kolumny wiodące (dataset_id, image_id, class_id, model_id) obsługują także zwykłe
+filtrowanie po kluczu obcym, a (created_at, id) - paginację po kluczu.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+PENDING = sa.text("status IN ('created', 'processing')")
+
+INDEXES = [
+    ("ix_images_created_at_id", "images", ["created_at", "id"], None),
+    ("ix_images_dataset_id_created_at_id", "images", ["dataset_id", "created_at", "id"], None),
+    ("ix_datasets_created_at_id", "datasets", ["created_at", "id"], None),
+    ("ix_classes_created_at_id", "classes", ["created_at", "id"], None),
+    ("ix_annotations_created_at_id", "annotations", ["created_at", "id"], None),
+    ("ix_annotations_image_id_created_at_id", "annotations", ["image_id", "created_at", "id"], None),
+    ("ix_annotations_class_id_created_at_id", "annotations", ["class_id", "created_at", "id"], None),
+    ("ix_trainings_created_at_id", "trainings", ["created_at", "id"], None),
+    ("ix_trainings_dataset_id", "trainings", ["dataset_id"], None),
+    ("ix_trainings_model_id", "trainings", ["model_id"], None),
+    ("ix_trainings_pending_created_at", "trainings", ["created_at"], PENDING),
+    ("ix_detections_created_at_id", "detections", ["created_at", "id"], None),
+    ("ix_detections_image_id_created_at_id", "detections", ["image_id", "created_at", "id"], None),
+    ("ix_detections_model_id_created_at_id", "detections", ["model_id", "created_at", "id"], None),
+    ("ix_detections_pending_created_at", "detections", ["created_at"], PENDING),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, postgresql_where=where, postgresql_concurrently=True)
+
+    # Świeże statystyki planera dla nowych indeksów
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""Kolumna images.content_hash i tabela detection_cache
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:15:00
+
+Skróty istniejących obrazów nie są tu liczone (wymagałoby to pobrania wszystkich
+plików z MinIO) - worker uzupełnia content_hash przy pierwszej detekcji obrazu.
+Indeks na images tworzony jest z CONCURRENTLY, jak w 0003.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("images", sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+    op.create_table(
+        "detection_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("model_id", sa.Integer(), sa.ForeignKey("models.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("results", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("detection_id", sa.Integer(), sa.ForeignKey("detections.id", ondelete="SET NULL"), nullable=True),
+    )
+    op.create_index("ix_detection_cache_content_hash", "detection_cache", ["content_hash"])
+    op.create_index("ix_detection_cache_model_id", "detection_cache", ["model_id"])
+    op.create_index("ix_detection_cache_created_at", "detection_cache", ["created_at"])
+
+    with op.get_context().autocommit_block():
+        op.create_index("ix_images_content_hash", "images", ["content_hash"], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_images_content_hash", table_name="images", postgresql_concurrently=True)
+    op.drop_table("detection_cache")
+    op.drop_column("images", "content_hash")
@@ -0,0 +1,34 @@
+"""Spakowane wyniki detekcji (detections.results_packed, detection_cache.results_packed)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:20:00
+
+Istniejące wyniki JSON w detections.results pozostają czytelne (model dekoduje je
+jak dotąd) - konwersję wykonuje osobno `python -m app.db.pack_results`.
+Wpisy detection_cache są usuwane: to tylko cache, odbuduje się przy kolejnych detekcjach.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("detections", sa.Column("results_packed", sa.LargeBinary(), nullable=True))
+
+    op.execute("DELETE FROM detection_cache")
+    op.drop_column("detection_cache", "results")
+    op.add_column("detection_cache", sa.Column("results_packed", sa.LargeBinary(), nullable=False))
+
+
+def downgrade():
+    op.execute("DELETE FROM detection_cache")
+    op.drop_column("detection_cache", "results_packed")
+    op.add_column("detection_cache", sa.Column("results", sa.JSON(), nullable=False))
+
+    # Wyniki zapisane tylko w formacie binarnym są tracone
+    op.drop_column("detections", "results_packed")
@@ -0,0 +1,27 @@
+"""Kolumna dataset_stats.annotations_revision
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:25:00
+
+Licznik zwiększany przy każdym zapisie adnotacji datasetu - unieważnia kolumnowe
+migawki adnotacji (AnnotationStore) bez skanowania tabeli annotations.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "dataset_stats",
+        sa.Column("annotations_revision", sa.BigInteger(), nullable=False, server_default="0")
+    )
+
+
+def downgrade():
+    op.drop_column("dataset_stats", "annotations_revision")
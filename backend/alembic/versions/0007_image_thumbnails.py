@@ -0,0 +1,32 @@
+"""Kolumna images.has_thumbnails
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:30:00
+
+Znacznik wygenerowanych miniatur obrazu (ThumbnailService) i indeks częściowy
+obrazów oczekujących na miniatury.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "images",
+        sa.Column("has_thumbnails", sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.create_index(
+        "ix_images_pending_thumbnails", "images", ["dataset_id", "id"],
+        postgresql_where=sa.text("NOT has_thumbnails")
+    )
+
+
+def downgrade():
+    op.drop_index("ix_images_pending_thumbnails", table_name="images")
+    op.drop_column("images", "has_thumbnails")
@@ -0,0 +1,49 @@
+"""Tabela video_detections
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 10:35:00
+
+Zadania detekcji na plikach wideo - wyniki klatek zapisywane są w buckecie videos
+(format VideoResults), w bazie tylko podsumowanie i statystyki przepustowości.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "video_detections",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("path", sa.String(), nullable=True),
+        sa.Column("size", sa.BigInteger(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("config", sa.JSON(), nullable=True),
+        sa.Column("frames_total", sa.Integer(), nullable=True),
+        sa.Column("frames_processed", sa.Integer(), nullable=True),
+        sa.Column("objects", sa.Integer(), nullable=True),
+        sa.Column("video_fps", sa.Float(), nullable=True),
+        sa.Column("throughput_fps", sa.Float(), nullable=True),
+        sa.Column("stats", sa.JSON(), nullable=True),
+        sa.Column("results_path", sa.String(), nullable=True),
+        sa.Column("processing_time", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("model_id", sa.Integer(), sa.ForeignKey("models.id"), nullable=True),
+    )
+    op.create_index("ix_video_detections_id", "video_detections", ["id"])
+    op.create_index("ix_video_detections_created_at_id", "video_detections", ["created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_video_detections_created_at_id", table_name="video_detections")
+    op.drop_index("ix_video_detections_id", table_name="video_detections")
+    op.drop_table("video_detections")
@@ -0,0 +1,28 @@
+"""Kolumna images.thumbnail_key
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 11:00:00
+
+Prefiks kluczy miniatur zapisany przy ich generowaniu - późniejsze uzupełnienie
+content_hash nie zmienia już położenia istniejących miniatur.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("images", sa.Column("thumbnail_key", sa.String(length=80), nullable=True))
+    # Obrazy z miniaturami - prefiks wyznaczany dotąd w locie; rozbieżności usuwa ponowne generowanie
+    op.execute(
+        "UPDATE images SET thumbnail_key = COALESCE(content_hash, 'image_' || id) WHERE has_thumbnails"
+    )
+
+
+def downgrade():
+    op.drop_column("images", "thumbnail_key")
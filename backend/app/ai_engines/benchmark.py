@@ -0,0 +1,93 @@
+"""
+Mikro-benchmark silnika inferencji
+
+Uruchomienie (z katalogu backend):
+    python -m app.ai_engines.benchmark --weights yolov8n.pt --batch-sizes 1 4 8 16
+"""
+import os
+import time
+import argparse
+import logging
+from typing import Dict, Any, List, Optional
+import numpy as np
+import cv2
+from app.ai_engines.inference_engine import InferenceEngine
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(images_dir: Optional[str], count: int, width: int, height: int) -> List[np.ndarray]:
+    """Wczytuje obrazy z katalogu lub generuje losowe obrazy syntetyczne"""
+    if images_dir:
+        files = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        images = [cv2.imread(os.path.join(images_dir, f)) for f in files[:count]]
+        images = [image for image in images if image is not None]
+        if not images:
+            raise ValueError(f"Brak obrazów w katalogu {images_dir}")
+        return images
+
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def benchmark_batch_size(
+    engine: InferenceEngine,
+    images: List[np.ndarray],
+    batch_size: int,
+    iterations: int,
+    warmup: int
+) -> Dict[str, Any]:
+    """
+    Mierzy opóźnienie i przepustowość silnika dla zadanego rozmiaru partii
+
+    Returns:
+        Dict z liczbą obrazów/s oraz opóźnieniem p50/p99 jednej partii (ms)
+    """
+    batches = [
+        [images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+        for i in range(warmup + iterations)
+    ]
+
+    for batch in batches[:warmup]:
+        engine.predict_arrays(batch, batch_size=batch_size)
+
+    latencies = []
+    for batch in batches[warmup:]:
+        started = time.perf_counter()
+        engine.predict_arrays(batch, batch_size=batch_size)
+        latencies.append(time.perf_counter() - started)
+
+    latencies = np.asarray(latencies)
+    return {
+        "batch_size": batch_size,
+        "images_per_sec": batch_size * iterations / latencies.sum(),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inferencji YOLO na CPU")
+    parser.add_argument("--weights", required=True, help="Ścieżka do wag (.pt lub .onnx)")
+    parser.add_argument("--images", default=None, help="Katalog z obrazami (domyślnie obrazy syntetyczne)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=None, help="Rozmiar wejścia modelu")
+    parser.add_argument("--width", type=int, default=1280, help="Szerokość obrazów syntetycznych")
+    parser.add_argument("--height", type=int, default=720, help="Wysokość obrazów syntetycznych")
+    args = parser.parse_args()
+
+    engine = InferenceEngine(args.weights, image_size=args.image_size)
+    images = load_images(args.images, max(args.batch_sizes), args.width, args.height)
+
+    print(f"{'batch':>6} {'img/s':>10} {'p50 [ms]':>10} {'p99 [ms]':>10}")
+    for batch_size in args.batch_sizes:
+        result = benchmark_batch_size(engine, images, batch_size, args.iterations, args.warmup)
+        print(f"{result['batch_size']:>6} {result['images_per_sec']:>10.2f} {result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import os
+import ast
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import cv2
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Maksymalna liczba kandydatów przekazywanych do NMS dla jednego obrazu
+MAX_NMS_CANDIDATES = 30000
+
+
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Skaluje obraz z zachowaniem proporcji i dopełnia go do kwadratu o boku `size`
+
+    Returns:
+        Krotka (obraz, współczynnik skalowania, (przesunięcie x, przesunięcie y))
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    pad_w, pad_h = (size - new_width) / 2, (size - new_height) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return image, ratio, (left, top)
+
+
+def xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Konwertuje ramki (środek x, środek y, szerokość, wysokość) do (x1, y1, x2, y2)"""
+    result = np.empty_like(boxes)
+    half_w = boxes[:, 2] / 2
+    half_h = boxes[:, 3] / 2
+    result[:, 0] = boxes[:, 0] - half_w
+    result[:, 1] = boxes[:, 1] - half_h
+    result[:, 2] = boxes[:, 0] + half_w
+    result[:, 3] = boxes[:, 1] + half_h
+    return result
+
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    class_ids: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Wektoryzowany NMS na ramkach w formacie (x1, y1, x2, y2)
+
+    Jeśli podano `class_ids`, ramki różnych klas są przesuwane tak, aby się nie
+    nakładały - dzięki temu NMS per klasa odbywa się w jednym przebiegu.
+
+    Returns:
+        Indeksy zachowanych ramek posortowane malejąco po wyniku
+    """
+    if boxes.shape[0] == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if class_ids is not None:
+        span = float(boxes.max() - boxes.min()) + 1.0
+        boxes = boxes + class_ids.astype(boxes.dtype)[:, None] * span
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        current = order[0]
+        keep.append(current)
+        rest = order[1:]
+
+        inter_w = np.clip(np.minimum(x2[current], x2[rest]) - np.maximum(x1[current], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[current], y2[rest]) - np.maximum(y1[current], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[current] + areas[rest] - inter + 1e-9)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def _parse_names(raw: Any) -> Dict[int, str]:
+    """Normalizuje mapę nazw klas zapisaną w modelu do postaci {id: nazwa}"""
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            raw = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return {}
+    if isinstance(raw, (list, tuple)):
+        return {i: str(name) for i, name in enumerate(raw)}
+    return {int(k): str(v) for k, v in dict(raw).items()}
+
+
+class _TorchBackend:
+    """Backend PyTorch ładujący wagi przez bibliotekę ultralytics"""
+
+    def __init__(self, weights_path: str):
+        import torch
+        from ultralytics import YOLO
+
+        if settings.INFERENCE_NUM_THREADS > 0:
+            torch.set_num_threads(settings.INFERENCE_NUM_THREADS)
+
+        self._torch = torch
+        yolo = YOLO(weights_path)
+        self.model = yolo.model.float().eval()
+        self.names = _parse_names(getattr(self.model, "names", None))
+        self.nbytes = sum(t.numel() * t.element_size() for t in list(self.model.parameters()) + list(self.model.buffers()))
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        with self._torch.inference_mode():
+            output = self.model(self._torch.from_numpy(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.cpu().numpy()
+
+
+class _OnnxBackend:
+    """Backend ONNX Runtime (CPU)"""
+
+    def __init__(self, weights_path: str):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if settings.INFERENCE_NUM_THREADS > 0:
+            options.intra_op_num_threads = settings.INFERENCE_NUM_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(weights_path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Modele eksportowane bez dynamicznych osi mają stały rozmiar batcha
+        self.static_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self.names = _parse_names(self.session.get_modelmeta().custom_metadata_map.get("names"))
+        self.nbytes = os.path.getsize(weights_path)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        if not self.static_batch or self.static_batch == batch.shape[0]:
+            return self.session.run(None, {self.input_name: batch})[0]
+
+        outputs = []
+        for start in range(0, batch.shape[0], self.static_batch):
+            outputs.append(self.session.run(None, {self.input_name: batch[start:start + self.static_batch]})[0])
+        return np.concatenate(outputs, axis=0)
+
+
+class _OpenVinoBackend:
+    """Backend OpenVINO (CPU) uruchamiający model ONNX bez osobnej konwersji"""
+
+    def __init__(self, weights_path: str):
+        from openvino.runtime import Core
+
+        core = Core()
+        config = {}
+        if settings.INFERENCE_NUM_THREADS > 0:
+            config["INFERENCE_NUM_THREADS"] = str(settings.INFERENCE_NUM_THREADS)
+        self.compiled = core.compile_model(core.read_model(weights_path), "CPU", config)
+        self.output = self.compiled.output(0)
+        # Wywołanie skompilowanego modelu korzysta ze wspólnego żądania inferencji
+        self._lock = threading.Lock()
+        # Metadane ONNX (nazwy klas) nie są dostępne przez OpenVINO - przekazuje je rejestr modeli
+        self.names = {}
+        self.nbytes = os.path.getsize(weights_path)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            return self.compiled([batch])[self.output]
+
+
+# Środowiska uruchomieniowe modelu: nazwa -> klasa backendu
+RUNTIME_BACKENDS = {
+    "torch": _TorchBackend,
+    "onnx": _OnnxBackend,
+    "onnx-int8": _OnnxBackend,
+    "openvino": _OpenVinoBackend,
+}
+
+
+class InferenceEngine:
+    """Silnik do detekcji obiektów na partiach obrazów (CPU)"""
+
+    def __init__(
+        self,
+        weights_path: str,
+        image_size: Optional[int] = None,
+        runtime: Optional[str] = None,
+        names: Optional[Dict[int, str]] = None
+    ):
+        self.weights_path = weights_path
+        self.image_size = image_size or settings.INFERENCE_IMAGE_SIZE
+        self.runtime = runtime or ("onnx" if weights_path.endswith(".onnx") else "torch")
+        if self.runtime not in RUNTIME_BACKENDS:
+            raise ValueError(f"Nieznane środowisko uruchomieniowe: {self.runtime}")
+
+        self.backend = RUNTIME_BACKENDS[self.runtime](weights_path)
+
+        self.names = self.backend.names or _parse_names(names)
+        # Przybliżony rozmiar modelu w pamięci (używany przez rejestr modeli)
+        self.nbytes = self.backend.nbytes
+        logger.info(f"Załadowano model {weights_path} ({type(self.backend).__name__})")
+
+    def preprocess(self, images: List[np.ndarray]) -> Tuple[np.ndarray, List[Tuple[float, Tuple[int, int], Tuple[int, int]]]]:
+        """
+        Przygotowuje partię obrazów BGR do wejścia modelu
+
+        Returns:
+            Krotka (tensor NCHW float32, metadane potrzebne do odwrócenia skalowania)
+        """
+        size = self.image_size
+        batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+        metas = []
+        for i, image in enumerate(images):
+            padded, ratio, pad = letterbox(image, size)
+            # BGR -> RGB, HWC -> CHW
+            batch[i] = padded[:, :, ::-1].transpose(2, 0, 1)
+            metas.append((ratio, pad, image.shape[:2]))
+        batch /= 255.0
+        return batch, metas
+
+    def postprocess(
+        self,
+        predictions: np.ndarray,
+        metas: List[Tuple[float, Tuple[int, int], Tuple[int, int]]],
+        conf_threshold: float,
+        iou_threshold: float
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Dekoduje surowe wyjście modelu (B, 4 + liczba klas, N) i wykonuje NMS
+
+        Returns:
+            Lista krotek (ramki xyxy w pikselach obrazu, wyniki, ID klas) dla każdego obrazu
+        """
+        results = []
+        predictions = predictions.transpose(0, 2, 1)
+        for prediction, (ratio, (pad_x, pad_y), (height, width)) in zip(predictions, metas):
+            class_scores = prediction[:, 4:]
+            class_ids = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(class_ids.shape[0]), class_ids]
+
+            mask = scores >= conf_threshold
+            prediction, class_ids, scores = prediction[mask], class_ids[mask], scores[mask]
+
+            if scores.shape[0] > MAX_NMS_CANDIDATES:
+                top = np.argpartition(-scores, MAX_NMS_CANDIDATES)[:MAX_NMS_CANDIDATES]
+                prediction, class_ids, scores = prediction[top], class_ids[top], scores[top]
+
+            boxes = xywh2xyxy(prediction[:, :4])
+            keep = non_max_suppression(boxes, scores, iou_threshold, class_ids)[:settings.INFERENCE_MAX_DETECTIONS]
+            boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+            boxes[:, [0, 2]] -= pad_x
+            boxes[:, [1, 3]] -= pad_y
+            boxes /= ratio
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+            results.append((boxes, scores, class_ids))
+        return results
+
+    def predict_arrays(
+        self,
+        images: List[np.ndarray],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Wykonuje detekcję na liście obrazów BGR, dzieląc ją na partie
+
+        Returns:
+            Lista krotek (ramki xyxy, wyniki, ID klas) w kolejności obrazów wejściowych
+        """
+        conf_threshold = settings.DEFAULT_CONFIDENCE_THRESHOLD if conf_threshold is None else conf_threshold
+        iou_threshold = settings.DEFAULT_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+
+        results = []
+        for start in range(0, len(images), batch_size):
+            batch, metas = self.preprocess(images[start:start + batch_size])
+            predictions = self.backend.forward(batch)
+            results.extend(self.postprocess(predictions, metas, conf_threshold, iou_threshold))
+        return results
+
+    def to_objects(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray) -> List[Dict[str, Any]]:
+        """Zamienia tablice wyników na listę obiektów w formacie API"""
+        return [
+            {
+                "class": self.names.get(int(class_id), str(int(class_id))),
+                "class_id": int(class_id),
+                "confidence": round(float(score), 4),
+                "bbox": [round(float(v), 1) for v in box]
+            }
+            for box, score, class_id in zip(boxes, scores, class_ids)
+        ]
+
+    def predict(
+        self,
+        images: List[np.ndarray],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Wykonuje detekcję na liście obrazów BGR
+
+        Returns:
+            Lista wykrytych obiektów ({"class", "class_id", "confidence", "bbox"}) dla każdego obrazu
+        """
+        return [
+            self.to_objects(boxes, scores, class_ids)
+            for boxes, scores, class_ids in self.predict_arrays(images, conf_threshold, iou_threshold)
+        ]
+
@@ -0,0 +1,206 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.ai_engines.inference_engine import InferenceEngine
+
+logger = logging.getLogger(__name__)
+
+# (ID modelu, wersja, próg IoU) - żądania o różnych progach pewności trafiają do wspólnej partii
+BatcherKey = Tuple[int, str, float]
+
+
+class QueueFullError(Exception):
+    """Kolejka batchera jest pełna - żądanie należy odrzucić (HTTP 429)"""
+
+
+class _Request:
+    __slots__ = ("image", "conf_threshold", "future", "enqueued_at")
+
+    def __init__(self, image: np.ndarray, conf_threshold: float):
+        self.image = image
+        self.conf_threshold = conf_threshold
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Dynamiczne łączenie współbieżnych żądań detekcji w partie
+
+    Wątek batchera czeka na pierwsze żądanie, a potem dobiera kolejne do max_batch_size
+    obrazów lub do upływu max_wait_ms od przyjęcia pierwszego. Partia liczona jest jednym
+    wywołaniem predict_arrays z najniższym progiem pewności w partii, a wyniki każdego
+    żądania filtrowane są jego własnym progiem (NMS odrzuca ramki tylko na rzecz ramek
+    o wyższym wyniku, więc filtr po NMS daje ten sam zbiór).
+    """
+
+    def __init__(
+        self,
+        key: BatcherKey,
+        engine: InferenceEngine,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue: int,
+        pool: "MicroBatcherPool"
+    ):
+        self.key = key
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "queue.Queue[_Request]" = queue.Queue(maxsize=max_queue)
+        self.pool = pool
+        self._thread = threading.Thread(target=self._run, name=f"micro-batcher-{key[0]}", daemon=True)
+        self._thread.start()
+
+    def _collect(self) -> Optional[List[_Request]]:
+        """Zbiera kolejną partię; None oznacza, że batcher był bezczynny i został zamknięty"""
+        while True:
+            try:
+                first = self.queue.get(timeout=settings.INFER_BATCHER_IDLE_TIMEOUT)
+                break
+            except queue.Empty:
+                if self.pool._close_if_idle(self):
+                    return None
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Żądania anulowane w międzyczasie (przekroczony czas po stronie klienta) są pomijane
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = self.engine.predict_arrays(
+                    [request.image for request in batch],
+                    min(request.conf_threshold for request in batch),
+                    self.key[2],
+                    len(batch)
+                )
+            except Exception as e:
+                logger.error(f"Błąd podczas detekcji partii żądań: {str(e)}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            compute_time = time.perf_counter() - started
+
+            for request, (boxes, scores, class_ids) in zip(batch, results):
+                keep = scores >= request.conf_threshold
+                request.future.set_result({
+                    "boxes": boxes[keep],
+                    "scores": scores[keep],
+                    "class_ids": class_ids[keep],
+                    "queue_wait": started - request.enqueued_at,
+                    "compute": compute_time,
+                    "batch_size": len(batch),
+                })
+            self.pool._record_batch(batch, started, compute_time)
+
+
+class MicroBatcherPool:
+    """
+    Procesowa pula batcherów (jeden na model, wersję i próg IoU)
+
+    Batcher z wątkiem tworzony jest przy pierwszym żądaniu i zamykany po
+    INFER_BATCHER_IDLE_TIMEOUT s bezczynności. Pełna kolejka batchera
+    (INFER_MAX_QUEUE) kończy się QueueFullError zamiast dalszego oczekiwania.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_queue: Optional[int] = None
+    ):
+        self.max_batch_size = max_batch_size or settings.INFER_MAX_BATCH_SIZE
+        self.max_wait_ms = settings.INFER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        self.max_queue = max_queue or settings.INFER_MAX_QUEUE
+        self._batchers: Dict[BatcherKey, MicroBatcher] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.processed = 0
+        self.queue_wait_total = 0.0
+        self.compute_total = 0.0
+
+    def submit(self, model, engine: InferenceEngine, image: np.ndarray, conf_threshold: float, iou_threshold: float) -> Future:
+        """
+        Dodaje obraz BGR do kolejki batchera modelu
+
+        Returns:
+            Future z dict (boxes, scores, class_ids, queue_wait, compute, batch_size)
+
+        Raises:
+            QueueFullError: kolejka batchera jest pełna
+        """
+        key = (model.id, model.version or "", float(iou_threshold))
+        request = _Request(image, conf_threshold)
+        # Wstawienie pod blokadą puli - batcher nie zostanie zamknięty między wyborem a put
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None or batcher.engine is not engine:
+                batcher = MicroBatcher(key, engine, self.max_batch_size, self.max_wait_ms, self.max_queue, self)
+                self._batchers[key] = batcher
+            try:
+                batcher.queue.put_nowait(request)
+            except queue.Full:
+                self.rejected += 1
+                raise QueueFullError(f"Kolejka detekcji modelu {model.id} jest pełna")
+            self.requests += 1
+        return request.future
+
+    def _close_if_idle(self, batcher: MicroBatcher) -> bool:
+        with self._lock:
+            if not batcher.queue.empty():
+                return False
+            if self._batchers.get(batcher.key) is batcher:
+                del self._batchers[batcher.key]
+            return True
+
+    def _record_batch(self, batch: List[_Request], started: float, compute_time: float):
+        with self._lock:
+            self.batches += 1
+            self.processed += len(batch)
+            self.queue_wait_total += sum(started - request.enqueued_at for request in batch)
+            self.compute_total += compute_time
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczniki żądań, odrzuceń i partii oraz średni czas oczekiwania w kolejce i obliczeń"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "avg_batch_size": round(self.processed / self.batches, 2) if self.batches else None,
+                "avg_queue_wait_ms": round(self.queue_wait_total / self.processed * 1000, 2) if self.processed else None,
+                "avg_compute_ms": round(self.compute_total / self.batches * 1000, 2) if self.batches else None,
+                "queued": {
+                    f"{key[0]}:{key[1]}:{key[2]}": batcher.queue.qsize() for key, batcher in self._batchers.items()
+                },
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue": self.max_queue,
+            }
+
+
+# Singleton instance (jedna pula na proces API)
+micro_batcher_pool = MicroBatcherPool()
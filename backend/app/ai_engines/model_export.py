@@ -0,0 +1,130 @@
+import time
+import shutil
+import logging
+import importlib.util
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.ai_engines.inference_engine import InferenceEngine
+from app.ai_engines.tiled_benchmark import match
+
+logger = logging.getLogger(__name__)
+
+Detections = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Biblioteka wymagana przez środowisko uruchomieniowe
+RUNTIME_MODULES = {
+    "torch": "ultralytics",
+    "onnx": "onnxruntime",
+    "onnx-int8": "onnxruntime",
+    "openvino": "openvino",
+}
+
+# Środowiska o obniżonej precyzji - wybierane tylko po potwierdzeniu zgodności wykryć
+QUANTIZED_RUNTIMES = ("onnx-int8",)
+
+
+@lru_cache(maxsize=1)
+def available_runtimes() -> Tuple[str, ...]:
+    """Środowiska uruchomieniowe, których biblioteki są zainstalowane w tym procesie"""
+    return tuple(runtime for runtime, module in RUNTIME_MODULES.items() if importlib.util.find_spec(module))
+
+
+def export_onnx(weights_path: str, output_path: str, image_size: Optional[int] = None) -> str:
+    """
+    Eksportuje wagi YOLO (.pt) do ONNX z dynamicznym rozmiarem partii
+
+    Nazwy klas zapisywane są w metadanych modelu (czyta je _OnnxBackend).
+    """
+    from ultralytics import YOLO
+
+    exported = YOLO(weights_path).export(
+        format="onnx",
+        imgsz=image_size or settings.INFERENCE_IMAGE_SIZE,
+        dynamic=True,
+        simplify=False,
+        opset=settings.EXPORT_ONNX_OPSET
+    )
+    shutil.move(str(exported), output_path)
+    return output_path
+
+
+def quantize_onnx(onnx_path: str, output_path: str) -> str:
+    """Kwantyzacja dynamiczna wag ONNX do INT8 (aktywacje kwantyzowane w trakcie inferencji)"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8)
+    return output_path
+
+
+def compare_detections(reference: List[Detections], candidate: List[Detections], match_iou: float) -> Dict[str, float]:
+    """
+    Zgodność wykryć środowiska z wykryciami modelu referencyjnego (PyTorch)
+
+    Wykrycia referencyjne traktowane są jak etykiety: recall to udział wykryć
+    referencyjnych odtworzonych przez środowisko, precision - udział wykryć środowiska
+    zgodnych z referencją, agreement - ich średnia harmoniczna.
+    """
+    reference_total = candidate_total = matched = 0
+    for (ref_boxes, _, ref_classes), (boxes, scores, class_ids) in zip(reference, candidate):
+        matched += int(match(ref_boxes, ref_classes, boxes, scores, class_ids, match_iou).sum())
+        reference_total += len(ref_boxes)
+        candidate_total += len(boxes)
+
+    recall = matched / reference_total if reference_total else 1.0
+    precision = matched / candidate_total if candidate_total else 1.0
+    agreement = 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+    return {"recall": round(recall, 4), "precision": round(precision, 4), "agreement": round(agreement, 4)}
+
+
+def evaluate_runtime(
+    engine: InferenceEngine,
+    images: List[np.ndarray],
+    reference: Optional[List[Detections]] = None,
+    conf_threshold: Optional[float] = None,
+    warmup: int = 2
+) -> Tuple[List[Detections], Dict[str, Any]]:
+    """
+    Mierzy opóźnienie jednego obrazu (p50) i - przy wynikach referencyjnych - zgodność wykryć
+
+    Returns:
+        Krotka (wykrycia dla każdego obrazu, raport)
+    """
+    for image in images[:warmup]:
+        engine.predict_arrays([image], conf_threshold)
+
+    results, latencies = [], []
+    for image in images:
+        started = time.perf_counter()
+        results.extend(engine.predict_arrays([image], conf_threshold))
+        latencies.append(time.perf_counter() - started)
+
+    report: Dict[str, Any] = {"latency_ms": round(float(np.percentile(latencies, 50)) * 1000, 2)}
+    if reference is not None:
+        report.update(compare_detections(reference, results, settings.EXPORT_MATCH_IOU))
+        report["within_tolerance"] = report["agreement"] >= 1.0 - settings.EXPORT_ACCURACY_TOLERANCE
+    return results, report
+
+
+def select_runtime(runtimes: Dict[str, Dict[str, Any]], available: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    Wybiera środowisko uruchomieniowe modelu
+
+    Spośród środowisk dostępnych w procesie, których zgodność mieści się w tolerancji
+    (dla INT8 musi być potwierdzona), wybierane jest to o najniższym zmierzonym
+    opóźnieniu. INFERENCE_RUNTIME różne od "auto" wymusza dane środowisko, o ile
+    model ma taki eksport.
+    """
+    available = available_runtimes() if available is None else available
+    candidates = {
+        name: info for name, info in runtimes.items()
+        if name in available and info.get("latency_ms") is not None
+        and info.get("within_tolerance") is not False
+        and (name not in QUANTIZED_RUNTIMES or info.get("within_tolerance") is True)
+    }
+    if settings.INFERENCE_RUNTIME != "auto":
+        return settings.INFERENCE_RUNTIME if settings.INFERENCE_RUNTIME in candidates else "torch"
+    if not candidates:
+        return "torch"
+    return min(candidates, key=lambda name: candidates[name]["latency_ms"])
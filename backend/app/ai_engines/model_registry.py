@@ -0,0 +1,227 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import redis
+from minio.error import S3Error
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.ai_engines.inference_engine import InferenceEngine
+from app.ai_engines.model_export import select_runtime
+from app.ai_engines.training_manager import TrainingManager
+from app.services.minio_service import minio_service
+
+logger = logging.getLogger(__name__)
+
+# (ID modelu, wersja, środowisko uruchomieniowe)
+RegistryKey = Tuple[int, str, str]
+
+STATS_FIELDS = ("hits", "misses", "evictions")
+
+# Po błędzie Redis liczniki floty nie są zapisywane przez ten czas (s), aby nie spowalniać inferencji
+STATS_RETRY_INTERVAL = 30
+
+
+def fleet_stats_key(model_id: int) -> str:
+    """Hash Redis z licznikami rejestru modelu sumowanymi ze wszystkich procesów"""
+    return f"{settings.MODEL_REGISTRY_STATS_PREFIX}:{model_id}"
+
+
+def fleet_stats() -> Dict[str, Any]:
+    """
+    Liczniki rejestru modeli zsumowane ze wszystkich procesów (API i workerów)
+
+    Raises:
+        redis.RedisError: gdy Redis jest niedostępny
+    """
+    client = get_redis()
+    models = []
+    for key in client.scan_iter(match=f"{settings.MODEL_REGISTRY_STATS_PREFIX}:*", count=500):
+        counters = {field.decode(): int(value) for field, value in client.hgetall(key).items()}
+        models.append({
+            "model_id": int(key.decode().rsplit(":", 1)[1]),
+            **{field: counters.get(field, 0) for field in STATS_FIELDS}
+        })
+    models.sort(key=lambda item: item["model_id"])
+    return {
+        **{field: sum(item[field] for item in models) for field in STATS_FIELDS},
+        "models": models,
+    }
+
+
+class ModelRegistry:
+    """
+    Procesowy rejestr załadowanych modeli detekcji
+
+    Modele identyfikowane są przez (Model.id, Model.version, środowisko), ładowane leniwie
+    przy pierwszym użyciu i usuwane w kolejności LRU po przekroczeniu budżetu pamięci.
+    Środowisko (torch, onnx, onnx-int8, openvino) wybierane jest z eksportów zapisanych
+    w Model.config["runtimes"] - najszybsze dostępne w procesie (select_runtime).
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or settings.MODEL_CACHE_MAX_BYTES
+        self.cache_dir = os.path.join(settings.MODELS_DIR, "registry")
+        self._engines: "OrderedDict[RegistryKey, InferenceEngine]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[RegistryKey, threading.Lock] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_retry_at = 0.0
+
+    @staticmethod
+    def runtimes_for(model) -> Dict[str, Dict[str, Any]]:
+        """Eksporty modelu zapisane dla jego bieżącej wersji (starsze wersje są pomijane)"""
+        config = model.config or {}
+        if config.get("runtime_version") != model.version:
+            return {}
+        return config.get("runtimes") or {}
+
+    @classmethod
+    def key_for(cls, model) -> RegistryKey:
+        return (model.id, model.version or "", select_runtime(cls.runtimes_for(model)))
+
+    def get(self, model) -> InferenceEngine:
+        """Zwraca silnik dla modelu, ładując go przy pierwszym użyciu w procesie"""
+        key = self.key_for(model)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                load_lock = self._load_locks.setdefault(key, threading.Lock())
+        self._publish_stats(key[0], "hits" if engine is not None else "misses")
+        if engine is not None:
+            return engine
+
+        # Osobna blokada na klucz - równoległe żądania tego samego modelu ładują go tylko raz
+        with load_lock:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is not None:
+                    self._engines.move_to_end(key)
+                    return engine
+
+            engine = self._load(model, key[2])
+
+            with self._lock:
+                self._engines[key] = engine
+                self.current_bytes += engine.nbytes
+                evicted = self._evict()
+                self._load_locks.pop(key, None)
+        for evicted_key in evicted:
+            self._publish_stats(evicted_key[0], "evictions")
+        return engine
+
+    def _publish_stats(self, model_id: int, field: str):
+        """Dopisuje zdarzenie do liczników floty w Redis (HINCRBY); błędy są tylko logowane"""
+        if time.monotonic() < self._stats_retry_at:
+            return
+        try:
+            get_redis().hincrby(fleet_stats_key(model_id), field, 1)
+        except redis.RedisError as e:
+            self._stats_retry_at = time.monotonic() + STATS_RETRY_INTERVAL
+            logger.warning(f"Nie udało się zapisać liczników rejestru modeli w Redis: {str(e)}")
+
+    def _load(self, model, runtime: str) -> InferenceEngine:
+        """Ładuje silnik w wybranym środowisku; przy braku pliku eksportu wraca do wag PyTorch"""
+        if runtime != "torch":
+            object_name = self.runtimes_for(model)[runtime]["path"]
+            path = self._download_weights(model, object_name)
+            if path:
+                names = (model.config or {}).get("names")
+                return InferenceEngine(path, runtime=runtime, names=names)
+            logger.warning(f"Brak eksportu {runtime} modelu {model.id} - użyte zostaną wagi PyTorch")
+        return InferenceEngine(self.resolve_weights(model))
+
+    def _evict(self) -> List[RegistryKey]:
+        """Usuwa najdawniej używane modele, dopóki rejestr przekracza budżet (wywoływane pod blokadą)"""
+        evicted = []
+        # Ostatnio załadowany model zostaje zawsze, nawet jeśli sam przekracza budżet
+        while self.current_bytes > self.max_bytes and len(self._engines) > 1:
+            key, engine = self._engines.popitem(last=False)
+            self.current_bytes -= engine.nbytes
+            self.evictions += 1
+            evicted.append(key)
+            logger.info(f"Usunięto z rejestru model {key[0]} (wersja {key[1]}, {key[2]})")
+        return evicted
+
+    def invalidate(self, model_id: int):
+        """Usuwa z rejestru wszystkie wersje modelu"""
+        with self._lock:
+            for key in [key for key in self._engines if key[0] == model_id]:
+                self.current_bytes -= self._engines.pop(key).nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Zwraca liczniki trafień, chybień i usunięć oraz zajętość rejestru tego procesu (sumy floty: fleet_stats)"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loaded": [{"model_id": key[0], "version": key[1], "runtime": key[2]} for key in self._engines],
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def resolve_weights(self, model) -> str:
+        """Ustala lokalną ścieżkę do wag modelu (Model.path, MODELS_DIR, bucket models lub domyślne wagi YOLO)"""
+        if model.path:
+            for candidate in (model.path, os.path.join(settings.MODELS_DIR, model.path)):
+                if os.path.exists(candidate):
+                    return candidate
+
+            downloaded = self._download_weights(model)
+            if downloaded:
+                return downloaded
+
+        trained_path = TrainingManager().get_model_path(model.id)
+        if trained_path:
+            return trained_path
+
+        return settings.DEFAULT_MODEL_WEIGHTS
+
+    def _download_weights(self, model, object_name: Optional[str] = None) -> Optional[str]:
+        """Pobiera wagi modelu (lub plik eksportu) z bucketu models do lokalnej pamięci podręcznej"""
+        object_name = object_name or model.path
+        filename = f"{model.id}_{model.version or 'latest'}_{os.path.basename(object_name)}"
+        local_path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(local_path):
+            return local_path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{local_path}.part"
+        try:
+            minio_service.client.fget_object(settings.MODELS_BUCKET, object_name, tmp_path)
+        except S3Error as e:
+            logger.warning(f"Nie znaleziono wag modelu {model.id} w MinIO: {str(e)}")
+            return None
+        os.replace(tmp_path, local_path)
+        return local_path
+
+    def warm_up(self, model_ids: List[int]):
+        """Ładuje z wyprzedzeniem modele o podanych ID"""
+        from app.db.session import SessionLocal
+        from app.models.models import Model
+
+        db = SessionLocal()
+        try:
+            models = db.query(Model).filter(Model.id.in_(model_ids)).all()
+            for model in models:
+                try:
+                    self.get(model)
+                    logger.info(f"Rozgrzano model {model.id} (wersja {model.version}, {self.key_for(model)[2]})")
+                except Exception as e:
+                    logger.error(f"Błąd podczas rozgrzewania modelu {model.id}: {str(e)}")
+        finally:
+            db.close()
+
+
+# Singleton instance (jeden rejestr na proces)
+model_registry = ModelRegistry()
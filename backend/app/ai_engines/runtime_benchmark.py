@@ -0,0 +1,64 @@
+"""
+Porównanie środowisk uruchomieniowych modelu (PyTorch, ONNX, ONNX INT8, OpenVINO)
+
+Eksportuje wagi .pt do katalogu tymczasowego, mierzy opóźnienie jednego obrazu (p50)
+i zgodność wykryć z modelem PyTorch (recall, precyzja i ich F1 przy IoU >= --match-iou).
+Kończy się kodem 1, jeśli któryś eksport przekracza tolerancję (--tolerance).
+
+Uruchomienie (z katalogu backend):
+    python -m app.ai_engines.runtime_benchmark --weights best.pt --images /data/val/images
+"""
+import sys
+import argparse
+import tempfile
+from app.core.config import settings
+from app.ai_engines.inference_engine import InferenceEngine
+from app.ai_engines.training_engine import TrainingEngine
+from app.ai_engines.model_export import evaluate_runtime
+from app.ai_engines.benchmark import load_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opóźnienie i zgodność wykryć eksportów modelu")
+    parser.add_argument("--weights", required=True, help="Ścieżka do wag PyTorch (.pt)")
+    parser.add_argument("--images", default=None, help="Katalog z obrazami (domyślnie obrazy syntetyczne)")
+    parser.add_argument("--count", type=int, default=32, help="Maksymalna liczba obrazów")
+    parser.add_argument("--no-int8", action="store_true", help="Bez wariantu INT8")
+    parser.add_argument("--conf", type=float, default=None, help="Próg pewności")
+    parser.add_argument("--match-iou", type=float, default=settings.EXPORT_MATCH_IOU)
+    parser.add_argument("--tolerance", type=float, default=settings.EXPORT_ACCURACY_TOLERANCE)
+    args = parser.parse_args()
+
+    settings.EXPORT_MATCH_IOU = args.match_iou
+    settings.EXPORT_ACCURACY_TOLERANCE = args.tolerance
+    images = load_images(args.images, args.count, settings.INFERENCE_IMAGE_SIZE, settings.INFERENCE_IMAGE_SIZE)
+    if not args.images:
+        print("Obrazy syntetyczne - zgodność wykryć ma ograniczoną wartość, podaj --images")
+
+    reference_engine = InferenceEngine(args.weights)
+    reference, report = evaluate_runtime(reference_engine, images, conf_threshold=args.conf)
+    reports = {"torch": report}
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        exported = TrainingEngine().export_model(args.weights, output_dir, int8=not args.no_int8)
+        for runtime, path in exported.items():
+            engine = InferenceEngine(path, runtime=runtime, names=reference_engine.names)
+            _, reports[runtime] = evaluate_runtime(engine, images, reference, args.conf)
+
+    print(f"Obrazy: {len(images)}, tolerancja zgodności: {args.tolerance}")
+    print(f"{'środowisko':>10} {'p50 [ms]':>10} {'recall':>8} {'precyzja':>9} {'F1':>7} {'w tolerancji':>13}")
+    failed = False
+    for runtime, report in reports.items():
+        line = f"{runtime:>10} {report['latency_ms']:>10.1f}"
+        if "agreement" in report:
+            line += (
+                f" {report['recall']:>8.3f} {report['precision']:>9.3f} {report['agreement']:>7.3f}"
+                f" {'tak' if report['within_tolerance'] else 'NIE':>13}"
+            )
+            failed = failed or not report["within_tolerance"]
+        print(line)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
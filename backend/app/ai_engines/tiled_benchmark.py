@@ -0,0 +1,171 @@
+"""
+Porównanie detekcji kafelkowej z pojedynczym przebiegiem na przeskalowanym obrazie
+
+Dla każdego obrazu mierzy opóźnienie obu trybów, a przy podanym katalogu etykiet
+YOLO (<nazwa>.txt: klasa cx cy w h, znormalizowane) także czułość (recall) i precyzję
+przy IoU >= --match-iou, osobno dla małych obiektów (pole < 32x32 px).
+
+Uruchomienie (z katalogu backend):
+    python -m app.ai_engines.tiled_benchmark --weights yolov8n.pt --images /data/drone/images --labels /data/drone/labels
+"""
+import os
+import time
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import cv2
+from app.ai_engines.inference_engine import InferenceEngine
+from app.ai_engines.tiled_inference import TiledInference, tile_grid
+from app.ai_engines.benchmark import load_images, IMAGE_EXTENSIONS
+
+SMALL_OBJECT_AREA = 32 * 32
+
+
+def load_labels(labels_dir: str, image_name: str, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Wczytuje etykiety YOLO obrazu jako (ramki xyxy w pikselach, ID klas)"""
+    path = os.path.join(labels_dir, os.path.splitext(image_name)[0] + ".txt")
+    if not os.path.exists(path):
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int64)
+    rows = np.loadtxt(path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int64)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, rows[:, 0].astype(np.int64)
+
+
+def match(
+    gt_boxes: np.ndarray,
+    gt_classes: np.ndarray,
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float
+) -> np.ndarray:
+    """
+    Zachłanne dopasowanie wykryć do etykiet (od najwyższego wyniku, w obrębie klasy)
+
+    Returns:
+        Maska bool etykiet dopasowanych do któregoś wykrycia
+    """
+    matched = np.zeros(len(gt_boxes), dtype=bool)
+    if not len(gt_boxes) or not len(boxes):
+        return matched
+
+    inter_w = np.clip(np.minimum(gt_boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(gt_boxes[:, None, 0], boxes[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(gt_boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(gt_boxes[:, None, 1], boxes[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    gt_areas = (gt_boxes[:, 2] - gt_boxes[:, 0]) * (gt_boxes[:, 3] - gt_boxes[:, 1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    iou = inter / (gt_areas[:, None] + areas[None, :] - inter + 1e-9)
+    iou[gt_classes[:, None] != class_ids[None, :]] = 0.0
+
+    for detection in np.argsort(-scores):
+        candidates = np.where(~matched, iou[:, detection], 0.0)
+        best = int(candidates.argmax())
+        if candidates[best] >= iou_threshold:
+            matched[best] = True
+    return matched
+
+
+def evaluate(
+    predictor,
+    images: List[np.ndarray],
+    labels: Optional[List[Tuple[np.ndarray, np.ndarray]]],
+    conf_threshold: float,
+    match_iou: float,
+    warmup: int
+) -> Dict[str, Any]:
+    """Mierzy opóźnienie (p50/p95) i - przy etykietach - czułość i precyzję trybu detekcji"""
+    for image in images[:warmup]:
+        predictor.predict_arrays([image], conf_threshold)
+
+    latencies, detections = [], 0
+    gt_total = gt_small = hit_total = hit_small = true_positives = 0
+    for index, image in enumerate(images):
+        started = time.perf_counter()
+        boxes, scores, class_ids = predictor.predict_arrays([image], conf_threshold)[0]
+        latencies.append(time.perf_counter() - started)
+        detections += len(scores)
+
+        if labels is not None:
+            gt_boxes, gt_classes = labels[index]
+            matched = match(gt_boxes, gt_classes, boxes, scores, class_ids, match_iou)
+            small = (gt_boxes[:, 2] - gt_boxes[:, 0]) * (gt_boxes[:, 3] - gt_boxes[:, 1]) < SMALL_OBJECT_AREA
+            gt_total += len(gt_boxes)
+            gt_small += int(small.sum())
+            hit_total += int(matched.sum())
+            hit_small += int((matched & small).sum())
+            true_positives += int(matched.sum())
+
+    latencies = np.asarray(latencies)
+    report = {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "detections": detections,
+    }
+    if labels is not None:
+        report.update({
+            "recall": hit_total / gt_total if gt_total else float("nan"),
+            "recall_small": hit_small / gt_small if gt_small else float("nan"),
+            "precision": true_positives / detections if detections else float("nan"),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detekcja kafelkowa a przeskalowanie - opóźnienie i czułość")
+    parser.add_argument("--weights", required=True, help="Ścieżka do wag (.pt lub .onnx)")
+    parser.add_argument("--images", default=None, help="Katalog z obrazami (domyślnie obrazy syntetyczne)")
+    parser.add_argument("--labels", default=None, help="Katalog z etykietami YOLO (czułość i precyzja)")
+    parser.add_argument("--count", type=int, default=20, help="Maksymalna liczba obrazów")
+    parser.add_argument("--tile-size", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--merge-method", default="nms", choices=["nms", "wbf"])
+    parser.add_argument("--no-full-image", action="store_true", help="Bez przebiegu na całym obrazie")
+    parser.add_argument("--conf", type=float, default=0.25, help="Próg pewności")
+    parser.add_argument("--match-iou", type=float, default=0.5, help="IoU dopasowania do etykiet")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--width", type=int, default=8192, help="Szerokość obrazów syntetycznych")
+    parser.add_argument("--height", type=int, default=8192, help="Wysokość obrazów syntetycznych")
+    args = parser.parse_args()
+
+    engine = InferenceEngine(args.weights)
+    tiled = TiledInference(
+        engine, args.tile_size, args.overlap, full_image=not args.no_full_image, merge_method=args.merge_method
+    )
+
+    labels = None
+    if args.images:
+        names = sorted(f for f in os.listdir(args.images) if f.lower().endswith(IMAGE_EXTENSIONS))[:args.count]
+        images = [cv2.imread(os.path.join(args.images, name)) for name in names]
+        names, images = zip(*[(name, image) for name, image in zip(names, images) if image is not None])
+        images = list(images)
+        if args.labels:
+            labels = [
+                load_labels(args.labels, name, image.shape[1], image.shape[0]) for name, image in zip(names, images)
+            ]
+    else:
+        images = load_images(None, args.count, args.width, args.height)
+
+    height, width = images[0].shape[:2]
+    tiles = len(tile_grid(height, width, args.tile_size, args.overlap))
+    print(f"Obrazy: {len(images)} ({width}x{height}), kafelki na obraz: {tiles}")
+
+    results = {
+        "resize": evaluate(engine, images, labels, args.conf, args.match_iou, args.warmup),
+        "tiled": evaluate(tiled, images, labels, args.conf, args.match_iou, args.warmup),
+    }
+    header = f"{'tryb':>8} {'p50 [ms]':>10} {'p95 [ms]':>10} {'wykrycia':>10}"
+    if labels is not None:
+        header += f" {'recall':>8} {'recall<32':>10} {'precyzja':>9}"
+    print(header)
+    for mode, report in results.items():
+        line = f"{mode:>8} {report['p50_ms']:>10.1f} {report['p95_ms']:>10.1f} {report['detections']:>10}"
+        if labels is not None:
+            line += f" {report['recall']:>8.3f} {report['recall_small']:>10.3f} {report['precision']:>9.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
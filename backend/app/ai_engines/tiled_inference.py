@@ -0,0 +1,199 @@
+import logging
+from typing import List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.ai_engines.inference_engine import InferenceEngine
+
+logger = logging.getLogger(__name__)
+
+MERGE_METHODS = ("nms", "wbf")
+MATCH_METRICS = ("iou", "ios")
+
+
+def tile_grid(height: int, width: int, tile_size: int, overlap: float) -> np.ndarray:
+    """
+    Wyznacza siatkę kafelków pokrywającą obraz
+
+    Kolejne kafelki przesunięte są o tile_size * (1 - overlap), a ostatni w wierszu
+    i kolumnie dosunięty do krawędzi obrazu (bez kafelków wystających poza obraz).
+
+    Returns:
+        Tablica int (K, 4) kafelków (x1, y1, x2, y2)
+    """
+    step = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length: int) -> np.ndarray:
+        if length <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        return np.append(np.arange(0, length - tile_size, step), length - tile_size)
+
+    grid_y, grid_x = np.meshgrid(starts(height), starts(width), indexing="ij")
+    x1, y1 = grid_x.ravel(), grid_y.ravel()
+    return np.stack([x1, y1, np.minimum(x1 + tile_size, width), np.minimum(y1 + tile_size, height)], axis=1)
+
+
+def tiling_variant(
+    tile_size: Optional[int] = None,
+    overlap: Optional[float] = None,
+    full_image: Optional[bool] = None,
+    merge_method: Optional[str] = None,
+    merge_threshold: Optional[float] = None,
+    merge_metric: Optional[str] = None
+) -> str:
+    """Identyfikator ustawień detekcji kafelkowej (część klucza cache wyników)"""
+    tile_size = tile_size or settings.TILED_INFERENCE_TILE_SIZE
+    overlap = settings.TILED_INFERENCE_OVERLAP if overlap is None else overlap
+    full_image = settings.TILED_INFERENCE_FULL_IMAGE if full_image is None else full_image
+    merge_method = merge_method or settings.TILED_INFERENCE_MERGE_METHOD
+    merge_threshold = settings.TILED_INFERENCE_MERGE_THRESHOLD if merge_threshold is None else merge_threshold
+    merge_metric = merge_metric or settings.TILED_INFERENCE_MERGE_METRIC
+    return (
+        f"tiled{tile_size}x{overlap:.2f}{'f' if full_image else ''}"
+        f"-{merge_method}-{merge_metric}{merge_threshold:.2f}"
+    )
+
+
+def _overlap(box: np.ndarray, boxes: np.ndarray, metric: str) -> np.ndarray:
+    """Nakładanie się ramki z listą ramek: IoU lub IoS (przecięcie / pole mniejszej ramki)"""
+    inter_w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    inter = inter_w * inter_h
+    area = max(float((box[2] - box[0]) * (box[3] - box[1])), 0.0)
+    areas = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    if metric == "ios":
+        return inter / (np.minimum(area, areas) + 1e-9)
+    return inter / (area + areas - inter + 1e-9)
+
+
+def merge_detections(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    method: str = "nms",
+    match_threshold: float = 0.5,
+    metric: str = "ios",
+    max_detections: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Łączy wykrycia z nakładających się kafelków (w obrębie klasy)
+
+    nms - zostaje ramka o najwyższym wyniku, dopasowane ramki są odrzucane
+    wbf - ramka wynikowa to średnia dopasowanych ramek ważona wynikami (wynik: maksimum)
+
+    Metryka ios dopasowuje też fragmenty obiektu przyciętego na granicy kafelka,
+    których IoU z pełną ramką jest niskie.
+    """
+    if boxes.shape[0] == 0:
+        return boxes, scores, class_ids
+
+    # Przesunięcie ramek różnych klas - dopasowanie per klasa w jednym przebiegu
+    span = float(boxes.max() - boxes.min()) + 1.0
+    shifted = boxes + class_ids.astype(boxes.dtype)[:, None] * span
+    order = scores.argsort()[::-1]
+
+    keep, fused = [], []
+    while order.size > 0:
+        current, rest = order[0], order[1:]
+        overlap = _overlap(shifted[current], shifted[rest], metric)
+        matched = overlap > match_threshold
+        keep.append(current)
+        if method == "wbf":
+            members = np.concatenate([[current], rest[matched]])
+            weights = scores[members].astype(np.float64)
+            fused.append((boxes[members] * weights[:, None]).sum(axis=0) / weights.sum())
+        order = rest[~matched]
+        if max_detections and len(keep) >= max_detections:
+            break
+
+    keep = np.asarray(keep, dtype=np.int64)
+    merged_boxes = np.asarray(fused, dtype=boxes.dtype) if method == "wbf" else boxes[keep]
+    return merged_boxes, scores[keep], class_ids[keep]
+
+
+class TiledInference:
+    """
+    Detekcja na kafelkach obrazów wysokiej rozdzielczości (sliced inference)
+
+    Obraz dzielony jest na nakładające się kafelki tile_size x tile_size, które trafiają
+    do modelu partiami (predict_arrays silnika), a wykrycia przesuwane są do współrzędnych
+    obrazu i łączone na granicach kafelków. Opcjonalny dodatkowy przebieg na całym
+    przeskalowanym obrazie wykrywa obiekty większe od kafelka.
+    """
+
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        tile_size: Optional[int] = None,
+        overlap: Optional[float] = None,
+        full_image: Optional[bool] = None,
+        merge_method: Optional[str] = None,
+        merge_threshold: Optional[float] = None,
+        merge_metric: Optional[str] = None
+    ):
+        self.engine = engine
+        self.tile_size = tile_size or settings.TILED_INFERENCE_TILE_SIZE
+        self.overlap = settings.TILED_INFERENCE_OVERLAP if overlap is None else overlap
+        self.full_image = settings.TILED_INFERENCE_FULL_IMAGE if full_image is None else full_image
+        self.merge_method = merge_method or settings.TILED_INFERENCE_MERGE_METHOD
+        self.merge_threshold = settings.TILED_INFERENCE_MERGE_THRESHOLD if merge_threshold is None else merge_threshold
+        self.merge_metric = merge_metric or settings.TILED_INFERENCE_MERGE_METRIC
+        if self.merge_method not in MERGE_METHODS:
+            raise ValueError(f"Nieznana metoda łączenia wykryć: {self.merge_method}")
+        if self.merge_metric not in MATCH_METRICS:
+            raise ValueError(f"Nieznana metryka dopasowania: {self.merge_metric}")
+        if not 0 <= self.overlap < 1:
+            raise ValueError("Zakładka kafelków musi być z przedziału [0, 1)")
+
+    @property
+    def variant(self) -> str:
+        """Identyfikator ustawień (część klucza cache wyników)"""
+        return tiling_variant(
+            self.tile_size, self.overlap, self.full_image, self.merge_method, self.merge_threshold, self.merge_metric
+        )
+
+    def predict(
+        self,
+        image: np.ndarray,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Wykonuje detekcję kafelkową na obrazie BGR
+
+        Returns:
+            Krotka (ramki xyxy w pikselach obrazu, wyniki, ID klas)
+        """
+        height, width = image.shape[:2]
+        tiles = tile_grid(height, width, self.tile_size, self.overlap)
+        # Wycinki są widokami obrazu - kopia powstaje dopiero przy skalowaniu w preprocess
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles.tolist()]
+        offsets = tiles[:, :2].astype(np.float32)
+        if self.full_image and len(crops) > 1:
+            crops.append(image)
+            offsets = np.vstack([offsets, np.zeros((1, 2), dtype=np.float32)])
+
+        results = self.engine.predict_arrays(crops, conf_threshold, iou_threshold, batch_size)
+        counts = np.array([len(scores) for _, scores, _ in results])
+        if not counts.sum():
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        boxes = np.concatenate([boxes for boxes, _, _ in results]).astype(np.float32)
+        scores = np.concatenate([scores for _, scores, _ in results])
+        class_ids = np.concatenate([class_ids for _, _, class_ids in results])
+        boxes += np.tile(np.repeat(offsets, counts, axis=0), 2)
+
+        return merge_detections(
+            boxes, scores, class_ids, self.merge_method, self.merge_threshold, self.merge_metric,
+            settings.TILED_INFERENCE_MAX_DETECTIONS
+        )
+
+    def predict_arrays(
+        self,
+        images: List[np.ndarray],
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Detekcja kafelkowa dla listy obrazów (interfejs zgodny z InferenceEngine.predict_arrays)"""
+        return [self.predict(image, conf_threshold, iou_threshold, batch_size) for image in images]
@@ -1,12 +1,47 @@
 import os
+import time
 import logging
-from typing import Dict, Any, List
-import numpy as np
-import cv2
-import json
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.ai_engines.model_export import export_onnx, quantize_onnx, available_runtimes
 
 logger = logging.getLogger(__name__)
 
+
+def _metric_name(key: str) -> str:
+    """Skraca nazwy metryk ultralytics: metrics/mAP50-95(B) -> mAP50-95, val/box_loss -> val_box_loss"""
+    key = key.replace("metrics/", "").replace("(B)", "")
+    return key.replace("/", "_")
+
+
+def epoch_summary(trainer) -> Dict[str, Any]:
+    """Metryki zakończonej epoki: straty treningowe i walidacyjne, mAP, precyzja, czułość, lr"""
+    values = dict(trainer.label_loss_items(trainer.tloss, prefix="train"))
+    values.update(trainer.metrics or {})
+    metrics = {"epoch": trainer.epoch + 1}
+    for key, value in values.items():
+        metrics[_metric_name(key)] = round(float(value), 5)
+    # Łączne straty w nazwach używanych wcześniej w Training.results
+    metrics["loss"] = round(sum(v for k, v in metrics.items() if k.startswith("train_")), 5)
+    val_losses = [v for k, v in metrics.items() if k.startswith("val_")]
+    if val_losses:
+        metrics["val_loss"] = round(sum(val_losses), 5)
+    lr = getattr(trainer, "lr", None)
+    if lr:
+        metrics["lr"] = round(float(next(iter(lr.values()))), 8)
+    return metrics
+
+
+def _remove_callbacks(model, registered: List[Tuple[str, Callable]]):
+    """Usuwa callbacki dodane przez add_callback (starsze ultralytics rejestrują je globalnie)"""
+    registry = getattr(model, "callbacks", None)
+    if registry is None:
+        from ultralytics.yolo.utils.callbacks import default_callbacks as registry
+    for event, func in registered:
+        if func in registry.get(event, []):
+            registry[event].remove(func)
+
+
 class TrainingEngine:
     """Silnik do trenowania modeli detekcji obiektów"""
     
@@ -14,82 +49,118 @@ class TrainingEngine:
         self.models_dir = os.environ.get("MODELS_DIR", "/app/models")
         os.makedirs(self.models_dir, exist_ok=True)
     
-    def train(self, training_id: int, dataset_id: int, model_id: int, config: Dict[str, Any]) -> Dict[str, Any]:
+    def train(
+        self,
+        training_id: int,
+        data_yaml: str,
+        weights: str,
+        config: Dict[str, Any],
+        run_dir: str,
+        resume_from: Optional[str] = None,
+        on_epoch: Optional[Callable[[Dict[str, Any], int], None]] = None,
+        on_checkpoint: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, Any]:
         """
-        Trenuje model detekcji obiektów na podstawie podanego datasetu i konfiguracji
+        Trenuje model YOLO (ultralytics) na CPU
         
         Args:
             training_id: ID zadania trenowania
-            dataset_id: ID datasetu
-            model_id: ID modelu
-            config: Konfiguracja trenowania (epoki, batch size, learning rate, itp.)
+            data_yaml: Ścieżka do data.yaml przygotowanego datasetu
+            weights: Wagi początkowe (.pt)
+            config: Konfiguracja trenowania (epochs, batch_size, imgsz, lr0, patience)
+            run_dir: Katalog przebiegu (wagi last.pt/best.pt w run_dir/train/weights)
+            resume_from: Punkt kontrolny last.pt, od którego wznowić trenowanie
+            on_epoch: Wywoływane po każdej epoce z metrykami epoki i łączną liczbą epok
+            on_checkpoint: Wywoływane po zapisie last.pt ze ścieżką i numerem epoki
             
         Returns:
-            Dict zawierający wyniki trenowania
+            Dict zawierający metryki końcowe, metryki epok i ścieżki wag
         """
-        logger.info(f"Rozpoczęcie trenowania modelu {model_id} na datasecie {dataset_id}")
-        
-        # W rzeczywistej implementacji użylibyśmy biblioteki YOLO
-        # Na potrzeby przykładu zwracamy fikcyjne wyniki
-        
-        # Symulacja trenowania
-        epochs = config.get("epochs", 100)
-        batch_size = config.get("batch_size", 16)
-        
-        # Symulacja wyników trenowania
-        metrics = {
-            "epochs": epochs,
-            "batch_size": batch_size,
-            "final_loss": 0.0342,
-            "val_loss": 0.0456,
-            "mAP50": 0.892,
-            "mAP50-95": 0.724,
-            "precision": 0.86,
-            "recall": 0.83,
-            "training_time": 3600,  # w sekundach
-            "epoch_metrics": [
-                {"epoch": 1, "loss": 0.9876, "val_loss": 0.9234, "mAP50": 0.123},
-                {"epoch": int(epochs/4), "loss": 0.4567, "val_loss": 0.5432, "mAP50": 0.456},
-                {"epoch": int(epochs/2), "loss": 0.2345, "val_loss": 0.3456, "mAP50": 0.678},
-                {"epoch": int(epochs*3/4), "loss": 0.1234, "val_loss": 0.2345, "mAP50": 0.789},
-                {"epoch": epochs, "loss": 0.0342, "val_loss": 0.0456, "mAP50": 0.892}
-            ]
-        }
-        
-        # Symulacja zapisania modelu
-        model_path = os.path.join(self.models_dir, f"model_{model_id}_training_{training_id}.pt")
-        with open(f"{model_path}.json", "w") as f:
-            json.dump(metrics, f)
-            
-        logger.info(f"Zakończenie trenowania modelu {model_id}, wyniki zapisane w {model_path}")
+        from ultralytics import YOLO
+
+        epoch_metrics = []
+
+        def fit_epoch_end(trainer):
+            metrics = epoch_summary(trainer)
+            epoch_metrics.append(metrics)
+            if on_epoch:
+                on_epoch(metrics, trainer.epochs)
+
+        def model_save(trainer):
+            if on_checkpoint and os.path.exists(trainer.last):
+                on_checkpoint(str(trainer.last), trainer.epoch + 1)
+
+        if resume_from:
+            logger.info(f"Wznowienie trenowania {training_id} z punktu kontrolnego {resume_from}")
+            model = YOLO(resume_from)
+            overrides = {"resume": True, "data": data_yaml}
+        else:
+            logger.info(f"Rozpoczęcie trenowania {training_id} z wag {weights}")
+            model = YOLO(weights)
+            overrides = {
+                "data": data_yaml,
+                "epochs": int(config.get("epochs", settings.TRAINING_DEFAULT_EPOCHS)),
+                "batch": int(config.get("batch_size", 16)),
+                "imgsz": int(config.get("imgsz", settings.INFERENCE_IMAGE_SIZE)),
+                "patience": int(config.get("patience", 50)),
+                "device": "cpu",
+                "workers": settings.TRAINING_DATALOADER_WORKERS,
+                "project": run_dir,
+                "name": "train",
+                "exist_ok": True,
+                "plots": False,
+                "verbose": False,
+            }
+            if "lr0" in config:
+                overrides["lr0"] = float(config["lr0"])
+
+        registered = [("on_fit_epoch_end", fit_epoch_end), ("on_model_save", model_save)]
+        for event, func in registered:
+            model.add_callback(event, func)
+        started = time.perf_counter()
+        try:
+            model.train(**overrides)
+        finally:
+            _remove_callbacks(model, registered)
+
+        trainer = model.trainer
+        best = str(trainer.best) if os.path.exists(trainer.best) else str(trainer.last)
+        final = dict(epoch_metrics[-1]) if epoch_metrics else {}
+        final["training_time"] = round(time.perf_counter() - started, 1)
+
+        logger.info(f"Zakończenie trenowania {training_id}, najlepsze wagi w {best}")
         
         return {
             "status": "success",
-            "metrics": metrics,
-            "model_path": model_path
+            "metrics": final,
+            "epoch_metrics": epoch_metrics,
+            "model_path": best,
+            "last_checkpoint": str(trainer.last)
         }
     
-    def export_model(self, model_id: int, format: str) -> str:
+    def export_model(self, weights_path: str, output_dir: str, int8: bool = True) -> Dict[str, str]:
         """
-        Eksportuje model do określonego formatu
-        
+        Eksportuje wagi modelu do formatów uruchomieniowych CPU
+
         Args:
-            model_id: ID modelu
-            format: Format eksportu (onnx, tflite, itp.)
-            
+            weights_path: Ścieżka do wag PyTorch (.pt)
+            output_dir: Katalog na wyeksportowane pliki
+            int8: Czy dodatkowo utworzyć wariant ONNX z wagami INT8
+
         Returns:
-            Ścieżka do wyeksportowanego modelu
+            Dict środowisko uruchomieniowe -> ścieżka pliku (onnx, onnx-int8, openvino)
         """
-        logger.info(f"Eksportowanie modelu {model_id} do formatu {format}")
-        
-        # Symulacja eksportu modelu
-        export_path = os.path.join(self.models_dir, f"model_{model_id}.{format}")
-        
-        # W rzeczywistej implementacji użylibyśmy odpowiednich funkcji eksportu
-        # Na potrzeby przykładu tylko tworzymy pusty plik
-        with open(export_path, "w") as f:
-            f.write(f"Exported model {model_id} to {format}")
-            
-        logger.info(f"Model {model_id} wyeksportowany do {export_path}")
-        
-        return export_path
+        logger.info(f"Eksportowanie wag {weights_path} do ONNX")
+        os.makedirs(output_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(weights_path))[0]
+
+        onnx_path = export_onnx(weights_path, os.path.join(output_dir, f"{name}.onnx"))
+        exported = {"onnx": onnx_path}
+        if int8:
+            exported["onnx-int8"] = quantize_onnx(onnx_path, os.path.join(output_dir, f"{name}.int8.onnx"))
+        # OpenVINO wczytuje plik ONNX bezpośrednio - wystarczy, że biblioteka jest zainstalowana
+        if "openvino" in available_runtimes():
+            exported["openvino"] = onnx_path
+
+        logger.info(f"Wyeksportowano wagi {weights_path}: {', '.join(exported)}")
+        return exported
@@ -0,0 +1,196 @@
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import numpy as np
+import cv2
+from app.core.config import settings
+from app.core.detection_codec import VideoResults
+
+logger = logging.getLogger(__name__)
+
+# Znacznik końca strumienia w kolejkach między wątkami
+_END = object()
+
+
+class VideoPipeline:
+    """
+    Detekcja na klatkach wideo z nakładaniem dekodowania, inferencji i zapisu wyników
+
+    Wątek dekodujący czyta klatki przez cv2.VideoCapture (klatki pomijane przy
+    próbkowaniu tylko przesuwa - grab() bez dekodowania obrazu) i składa je w partie.
+    Inferencja działa w wątku wywołującym, a wątek zapisujący dokleja wyniki do
+    tablic kolumnowych. Kolejki między etapami są ograniczone (prefetch), więc
+    pamięć nie rośnie, gdy inferencja nie nadąża za dekodowaniem.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        stride: int = 1,
+        batch_size: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        self.predictor = predictor
+        self.stride = max(1, int(stride))
+        self.batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+        self.prefetch = prefetch or settings.VIDEO_PREFETCH_BATCHES
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.progress_callback = progress_callback
+
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._timings = {"decode": 0.0, "inference": 0.0, "write": 0.0}
+        self._columns: Dict[str, List[np.ndarray]] = {"frames": [], "boxes": [], "scores": [], "class_ids": []}
+        self._frames_processed = 0
+
+    def _put(self, target: queue.Queue, item):
+        """Wstawia element do kolejki, przerywając oczekiwanie po błędzie innego etapu"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue):
+        while True:
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _END
+
+    def _decode(self, capture: cv2.VideoCapture, frames_out: queue.Queue):
+        indices, frames = [], []
+        index = 0
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                if index % self.stride:
+                    ok, frame = capture.grab(), None
+                else:
+                    ok, frame = capture.read()
+                self._timings["decode"] += time.perf_counter() - started
+                if not ok:
+                    break
+                if frame is not None:
+                    indices.append(index)
+                    frames.append(frame)
+                    if len(frames) == self.batch_size:
+                        self._put(frames_out, (indices, frames))
+                        indices, frames = [], []
+                index += 1
+            if frames:
+                self._put(frames_out, (indices, frames))
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(frames_out, _END)
+
+    def _write(self, results_in: queue.Queue, expected_frames: int):
+        try:
+            while True:
+                item = self._get(results_in)
+                if item is _END:
+                    break
+                started = time.perf_counter()
+                indices, results = item
+                for frame_index, (boxes, scores, class_ids) in zip(indices, results):
+                    if len(scores):
+                        self._columns["frames"].append(np.full(len(scores), frame_index, dtype=np.uint32))
+                        self._columns["boxes"].append(np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+                        self._columns["scores"].append(np.asarray(scores, dtype=np.float32))
+                        self._columns["class_ids"].append(np.asarray(class_ids, dtype=np.uint16))
+                self._frames_processed += len(indices)
+                self._timings["write"] += time.perf_counter() - started
+                if self.progress_callback:
+                    self.progress_callback(self._frames_processed, expected_frames)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _concat(self, key: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        parts = self._columns[key]
+        return np.concatenate(parts) if parts else np.empty(shape, dtype=dtype)
+
+    def run(self, path: str, names: Dict[int, str]) -> Tuple[VideoResults, Dict[str, Any]]:
+        """
+        Przetwarza plik wideo
+
+        Returns:
+            Krotka (wyniki wszystkich przetworzonych klatek, statystyki przepustowości)
+        """
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError("Nie można otworzyć pliku wideo")
+        total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        video_fps = float(capture.get(cv2.CAP_PROP_FPS)) or None
+        expected_frames = -(-total_frames // self.stride) if total_frames else 0
+
+        frames_queue = queue.Queue(maxsize=self.prefetch)
+        results_queue = queue.Queue(maxsize=self.prefetch)
+        decoder = threading.Thread(target=self._decode, args=(capture, frames_queue), name="video-decode", daemon=True)
+        writer = threading.Thread(target=self._write, args=(results_queue, expected_frames), name="video-write", daemon=True)
+
+        started = time.perf_counter()
+        decoder.start()
+        writer.start()
+        try:
+            while True:
+                item = self._get(frames_queue)
+                if item is _END:
+                    break
+                indices, frames = item
+                inference_started = time.perf_counter()
+                results = self.predictor.predict_arrays(frames, self.conf_threshold, self.iou_threshold, self.batch_size)
+                self._timings["inference"] += time.perf_counter() - inference_started
+                self._put(results_queue, (indices, results))
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(results_queue, _END)
+            decoder.join()
+            writer.join()
+            capture.release()
+
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.perf_counter() - started
+        results = VideoResults(
+            self._concat("frames", np.uint32, (0,)),
+            self._concat("boxes", np.float32, (0, 4)),
+            self._concat("scores", np.float32, (0,)),
+            self._concat("class_ids", np.uint16, (0,)),
+            {},
+            self._frames_processed,
+            self.stride,
+            video_fps
+        )
+        results.names = {
+            int(class_id): names.get(int(class_id), str(int(class_id))) for class_id in np.unique(results.class_ids)
+        }
+        stats = {
+            "frames_total": total_frames,
+            "frames_processed": self._frames_processed,
+            "objects": len(results),
+            "video_fps": video_fps,
+            "throughput_fps": round(self._frames_processed / elapsed, 2) if elapsed > 0 else None,
+            "processing_time": round(elapsed, 3),
+            "decode_time": round(self._timings["decode"], 3),
+            "inference_time": round(self._timings["inference"], 3),
+            "write_time": round(self._timings["write"], 3),
+        }
+        logger.info(
+            f"Przetworzono {self._frames_processed} klatek wideo w {elapsed:.1f} s "
+            f"({stats['throughput_fps']} klatek/s, inferencja {stats['inference_time']} s)"
+        )
+        return results, stats
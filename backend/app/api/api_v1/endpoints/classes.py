@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db, get_or_404
 from app.schemas.schemas import ClassCreate, ClassResponse, ClassList
 from app.models.models import Class
 import logging
+from app.db.pagination import apaginate, iter_ndjson
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -30,26 +34,28 @@ def create_class(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia klasy: {str(e)}")
 
+@router.get("/stream")
+def stream_classes(db: Session = Depends(get_db)):
+    """Zwraca wszystkie klasy jako NDJSON (jeden obiekt JSON w wierszu)"""
+    return StreamingResponse(iter_ndjson(db, select(Class), Class, ClassResponse), media_type="application/x-ndjson")
+
 @router.get("/{class_id}", response_model=ClassResponse)
-def get_class(
+async def get_class(
     class_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Pobiera klasę po ID"""
-    class_obj = db.query(Class).filter(Class.id == class_id).first()
-    if not class_obj:
-        raise HTTPException(status_code=404, detail="Klasa nie znaleziona")
-    return class_obj
+    return await get_or_404(db, Class, class_id, "Klasa nie znaleziona")
 
 @router.get("/", response_model=ClassList)
-def get_classes(
+async def get_classes(
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę klas"""
-    classes = db.query(Class).offset(skip).limit(limit).all()
-    return {"items": classes, "total": len(classes)}
+    """Pobiera listę klas (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, select(Class), Class, limit, cursor, skip)
 
 @router.put("/{class_id}", response_model=ClassResponse)
 def update_class(
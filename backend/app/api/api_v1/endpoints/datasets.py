@@ -1,11 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
-from app.schemas.schemas import DatasetCreate, DatasetResponse, DatasetList
+from app.db.session import get_db, get_async_db, get_or_404
+from app.db.pagination import apaginate
+from app.schemas.schemas import (
+    DatasetCreate, DatasetResponse, DatasetList, DatasetImportCreate, DatasetExportCreate, TaskStatus,
+    DatasetImages, DatasetStatsResponse, DatasetStatsSummary
+)
 from app.models.models import Dataset
 import logging
 from app.services.dataset_service import DatasetService
+from app.services.dataset_stats_service import summary_query
+from app.worker.tasks import import_dataset as import_dataset_task, export_dataset as export_dataset_task
+from app.worker.celery import celery_app
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -19,25 +28,28 @@ def create_dataset(
     dataset_service = DatasetService(db)
     return dataset_service.create_dataset(dataset_data)
 
+@router.get("/stats/summary", response_model=DatasetStatsSummary)
+async def get_datasets_summary(db: AsyncSession = Depends(get_async_db)):
+    """Pobiera zsumowane statystyki wszystkich datasetów (dashboard)"""
+    return (await db.execute(summary_query())).one()._asdict()
+
 @router.get("/{dataset_id}", response_model=DatasetResponse)
-def get_dataset(
+async def get_dataset(
     dataset_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Pobiera dataset po ID"""
-    dataset_service = DatasetService(db)
-    return dataset_service.get_dataset(dataset_id)
+    return await get_or_404(db, Dataset, dataset_id, "Dataset nie znaleziony")
 
 @router.get("/", response_model=DatasetList)
-def get_datasets(
+async def get_datasets(
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę datasetów"""
-    dataset_service = DatasetService(db)
-    datasets = dataset_service.get_datasets(skip, limit)
-    return {"items": datasets, "total": len(datasets)}
+    """Pobiera listę datasetów (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, select(Dataset), Dataset, limit, cursor, skip)
 
 @router.put("/{dataset_id}", response_model=DatasetResponse)
 def update_dataset(
@@ -57,3 +69,91 @@ def delete_dataset(
     """Usuwa dataset"""
     dataset_service = DatasetService(db)
     return dataset_service.delete_dataset(dataset_id)
+
+@router.get("/{dataset_id}/stats", response_model=DatasetStatsResponse)
+def get_dataset_stats(
+    dataset_id: int,
+    db: Session = Depends(get_db)
+):
+    """Pobiera statystyki datasetu (liczności, rozkład klas, histogram rozmiarów ramek)"""
+    dataset_service = DatasetService(db)
+    return dataset_service.get_dataset_stats(dataset_id)
+
+@router.post("/{dataset_id}/images", response_model=dict)
+def add_images_to_dataset(
+    dataset_id: int,
+    images: DatasetImages,
+    db: Session = Depends(get_db)
+):
+    """Dodaje obrazy do datasetu"""
+    dataset_service = DatasetService(db)
+    return {"moved": dataset_service.add_images_to_dataset(dataset_id, images.image_ids)}
+
+@router.delete("/{dataset_id}/images", response_model=dict)
+def remove_images_from_dataset(
+    dataset_id: int,
+    images: DatasetImages,
+    db: Session = Depends(get_db)
+):
+    """Odłącza obrazy od datasetu"""
+    dataset_service = DatasetService(db)
+    return {"moved": dataset_service.remove_images_from_dataset(dataset_id, images.image_ids)}
+
+@router.post("/{dataset_id}/import", response_model=dict)
+def import_dataset(
+    dataset_id: int,
+    import_data: DatasetImportCreate,
+    db: Session = Depends(get_db)
+):
+    """Uruchamia import archiwum (YOLO, COCO, VOC) z bucketu datasets do datasetu"""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+
+    try:
+        task = import_dataset_task.delay(dataset_id, import_data.object_name, import_data.format or dataset.format)
+        return {
+            "task_id": task.id,
+            "status": "started",
+            "message": f"Rozpoczęto import {import_data.object_name} do datasetu {dataset_id}"
+        }
+    except Exception as e:
+        logger.error(f"Błąd podczas uruchamiania importu datasetu: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd podczas uruchamiania importu datasetu: {str(e)}")
+
+@router.post("/{dataset_id}/export", response_model=dict)
+def export_dataset(
+    dataset_id: int,
+    export_data: DatasetExportCreate,
+    db: Session = Depends(get_db)
+):
+    """Uruchamia eksport datasetu do archiwum YOLO/COCO/VOC (wynik: URL w statusie zadania)"""
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+
+    try:
+        task = export_dataset_task.delay(dataset_id, export_data.format or dataset.format, export_data.archive)
+        return {
+            "task_id": task.id,
+            "status": "started",
+            "message": f"Rozpoczęto eksport datasetu {dataset_id}"
+        }
+    except Exception as e:
+        logger.error(f"Błąd podczas uruchamiania eksportu datasetu: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd podczas uruchamiania eksportu datasetu: {str(e)}")
+
+@router.get("/tasks/{task_id}", response_model=TaskStatus)
+def get_dataset_task(task_id: str):
+    """Pobiera status zadania importu/eksportu datasetu"""
+    result = celery_app.AsyncResult(task_id)
+    if result.state == "PROGRESS":
+        return {"task_id": task_id, "status": "processing", "progress": result.info}
+    if result.state == "SUCCESS":
+        value = result.result or {}
+        if value.get("status") == "success":
+            return {"task_id": task_id, "status": "completed", "result": value.get("result")}
+        return {"task_id": task_id, "status": "failed", "result": value}
+    if result.state == "FAILURE":
+        return {"task_id": task_id, "status": "failed", "result": {"message": str(result.result)}}
+    return {"task_id": task_id, "status": result.state.lower()}
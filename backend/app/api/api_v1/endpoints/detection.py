@@ -1,11 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
-from app.schemas.schemas import DetectionCreate, DetectionResponse, DetectionList
-from app.services.detection_service import DetectionService
-from app.worker.tasks import process_detection
+from app.db.session import get_db, get_async_db, get_or_404
+from app.db.pagination import apaginate
+from app.models.models import Detection, Model
+from app.schemas.schemas import (
+    DetectionCreate, DetectionResponse, DetectionList, BulkDetectionCreate, BulkDetectionStatus, VideoDetectionResponse
+)
+from app.services.detection_service import DetectionService, msgpack_record
+from app.services.video_detection_service import VideoDetectionService
+from app.core.detection_codec import arrow_batch, iter_arrow_stream
+from app.ai_engines.model_registry import model_registry
+from app.ai_engines.micro_batcher import micro_batcher_pool, QueueFullError
+from app.worker.tasks import process_detection, process_detection_batch, process_video_detection
+from app.worker.celery import celery_app
+from app.worker.bulk_progress import bulk_job_key
+from app.core.config import settings
+from celery import group
+from celery.result import GroupResult
+from starlette.concurrency import run_in_threadpool
+import numpy as np
+import asyncio
+import time
+import cv2
+import json
+import uuid
 import logging
+import msgpack
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -14,41 +38,339 @@ logger = logging.getLogger(__name__)
 def create_detection(
     image_id: int = Form(...),
     model_id: int = Form(...),
+    conf_threshold: Optional[float] = Form(None, ge=0, le=1),
+    iou_threshold: Optional[float] = Form(None, ge=0, le=1),
+    tile_size: Optional[int] = Form(None, ge=64, le=4096),
+    tile_overlap: Optional[float] = Form(None, ge=0, lt=1),
     db: Session = Depends(get_db)
 ):
-    """Tworzy nowe zadanie detekcji obiektów"""
+    """
+    Tworzy nowe zadanie detekcji obiektów
+
+    Z tile_size obraz przetwarzany jest kafelkami o tym boku (zakładka tile_overlap) -
+    dla obrazów wysokiej rozdzielczości z małymi obiektami.
+
+    Jeśli wynik dla tej samej treści obrazu, modelu (i wersji) oraz progów jest w cache,
+    zwracany jest od razu, bez zadania Celery. Powtórzone żądanie w trakcie liczenia
+    wyniku zwraca ID już działającego zadania.
+    """
+    detection_service = DetectionService(db)
+    key, cached = detection_service.lookup_cached(
+        image_id, model_id, conf_threshold, iou_threshold, tile_size, tile_overlap
+    )
+    if cached is not None:
+        return {
+            "task_id": None,
+            "detection_id": cached["detection_id"],
+            "status": "completed",
+            "cached": True,
+            "results": cached["results"],
+            "message": f"Wynik detekcji dla obrazu {image_id} z modelem {model_id} pobrany z cache"
+        }
+
+    task_id = str(uuid.uuid4())
+    running = detection_service.cache.claim(key, task_id) if key else None
+    if running is not None:
+        return {
+            "task_id": running,
+            "status": "started",
+            "cached": False,
+            "message": f"Detekcja obrazu {image_id} z modelem {model_id} jest już w toku"
+        }
+
     try:
         # Uruchom zadanie asynchroniczne
-        task = process_detection.delay(image_id, model_id)
+        process_detection.apply_async(
+            args=[image_id, model_id, conf_threshold, iou_threshold],
+            kwargs={"claim_key": key, "tile_size": tile_size, "tile_overlap": tile_overlap},
+            task_id=task_id
+        )
         
         return {
-            "task_id": task.id,
+            "task_id": task_id,
             "status": "started",
+            "cached": False,
             "message": f"Rozpoczęto detekcję obiektów dla obrazu {image_id} z modelem {model_id}"
         }
     except Exception as e:
         logger.error(f"Błąd podczas tworzenia zadania detekcji: {str(e)}")
+        if key:
+            detection_service.cache.release(key)
         raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia zadania detekcji: {str(e)}")
 
+def _decode_image(data: bytes) -> np.ndarray:
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Nie można zdekodować obrazu")
+    return image
+
+@router.post("/infer")
+async def infer(
+    file: UploadFile = File(...),
+    model_id: int = Form(...),
+    conf_threshold: Optional[float] = Form(None, ge=0, le=1),
+    iou_threshold: Optional[float] = Form(None, ge=0, le=1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Synchroniczna detekcja na przesłanym obrazie (bez Celery i bez zapisu w bazie)
+
+    Współbieżne żądania do tego samego modelu łączone są w partie (INFER_MAX_BATCH_SIZE
+    obrazów lub INFER_MAX_WAIT_MS ms). Przy pełnej kolejce zwracany jest kod 429.
+    Odpowiedź zawiera czas oczekiwania w kolejce i czas obliczeń partii (także w nagłówku Server-Timing).
+    """
+    received = time.perf_counter()
+    model = await get_or_404(db, Model, model_id, "Model nie znaleziony")
+    data = await file.read(settings.INFER_MAX_IMAGE_BYTES + 1)
+    if len(data) > settings.INFER_MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Obraz przekracza dopuszczalny rozmiar")
+
+    conf_threshold, iou_threshold = DetectionService.resolve_thresholds(conf_threshold, iou_threshold)
+    try:
+        engine = await run_in_threadpool(model_registry.get, model)
+    except Exception as e:
+        logger.error(f"Błąd podczas ładowania modelu: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd podczas ładowania modelu: {str(e)}")
+    image = await run_in_threadpool(_decode_image, data)
+
+    try:
+        future = micro_batcher_pool.submit(model, engine, image, conf_threshold, iou_threshold)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=settings.INFER_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Przekroczono czas oczekiwania na wynik detekcji")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd podczas detekcji: {str(e)}")
+
+    timing = {
+        "queue_wait_ms": round(result["queue_wait"] * 1000, 2),
+        "compute_ms": round(result["compute"] * 1000, 2),
+        "total_ms": round((time.perf_counter() - received) * 1000, 2),
+        "batch_size": result["batch_size"],
+    }
+    return JSONResponse(
+        {
+            "model_id": model_id,
+            "image_size": [int(image.shape[1]), int(image.shape[0])],
+            "results": engine.to_objects(result["boxes"], result["scores"], result["class_ids"]),
+            "timing": timing,
+        },
+        headers={
+            "Server-Timing": (
+                f"queue;dur={timing['queue_wait_ms']}, compute;dur={timing['compute_ms']}, total;dur={timing['total_ms']}"
+            )
+        }
+    )
+
+@router.get("/infer/stats", response_model=dict)
+def get_infer_stats():
+    """Statystyki batchera synchronicznej detekcji w tym procesie API"""
+    return micro_batcher_pool.stats()
+
+@router.post("/bulk", response_model=dict)
+def create_bulk_detection(
+    bulk_data: BulkDetectionCreate,
+    db: Session = Depends(get_db)
+):
+    """Tworzy zadanie detekcji masowej dla datasetu lub listy obrazów"""
+    detection_service = DetectionService(db)
+    image_ids = detection_service.get_bulk_image_ids(bulk_data)
+    if not image_ids:
+        raise HTTPException(status_code=400, detail="Brak obrazów do przetworzenia")
+
+    try:
+        chunk_size = bulk_data.chunk_size or settings.DETECTION_CHUNK_SIZE
+        chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+
+        # Jedno zadanie Celery na partię obrazów, całość śledzona jednym ID grupy
+        job = group(
+            process_detection_batch.s(
+                chunk, bulk_data.model_id, bulk_data.conf_threshold, bulk_data.iou_threshold,
+                bulk_data.tile_size, bulk_data.tile_overlap
+            )
+            for chunk in chunks
+        ).apply_async()
+        job.save()
+        celery_app.backend.set(bulk_job_key(job.id), json.dumps({
+            "model_id": bulk_data.model_id,
+            "total_images": len(image_ids),
+            "total_chunks": len(chunks)
+        }))
+
+        return {
+            "job_id": job.id,
+            "status": "started",
+            "total_images": len(image_ids),
+            "total_chunks": len(chunks),
+            "message": f"Rozpoczęto detekcję masową {len(image_ids)} obrazów z modelem {bulk_data.model_id}"
+        }
+    except Exception as e:
+        logger.error(f"Błąd podczas tworzenia zadania detekcji masowej: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia zadania detekcji masowej: {str(e)}")
+
+@router.get("/bulk/{job_id}", response_model=BulkDetectionStatus)
+def get_bulk_detection(job_id: str):
+    """Pobiera zagregowany postęp zadania detekcji masowej"""
+    meta = celery_app.backend.get(bulk_job_key(job_id))
+    job = GroupResult.restore(job_id, app=celery_app)
+    if not meta or job is None:
+        raise HTTPException(status_code=404, detail="Zadanie detekcji masowej nie znalezione")
+    meta = json.loads(meta)
+
+    processed_images = failed_images = completed_chunks = failed_chunks = 0
+    for result in job.results:
+        if result.state == "PROGRESS":
+            processed_images += (result.info or {}).get("processed", 0)
+        elif result.state == "SUCCESS":
+            value = result.result or {}
+            if value.get("status") == "success":
+                completed_chunks += 1
+                processed_images += value["result"]["processed"]
+                failed_images += value["result"]["failed"]
+            else:
+                failed_chunks += 1
+                # Obrazy zatwierdzone przed błędem partii liczą się jako przetworzone, reszta jako nieudane
+                total = value.get("total", 0)
+                succeeded = value.get("processed", 0) - value.get("failed", 0)
+                processed_images += total
+                failed_images += total - succeeded
+        elif result.state == "FAILURE":
+            failed_chunks += 1
+
+    finished = completed_chunks + failed_chunks == meta["total_chunks"]
+    return {
+        "job_id": job_id,
+        "status": "completed" if finished else "processing",
+        "model_id": meta["model_id"],
+        "total_images": meta["total_images"],
+        "processed_images": processed_images,
+        "failed_images": failed_images,
+        "total_chunks": meta["total_chunks"],
+        "completed_chunks": completed_chunks,
+        "failed_chunks": failed_chunks,
+        "progress": round(processed_images / meta["total_images"], 4) if meta["total_images"] else 1.0
+    }
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/x-msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+@router.post("/video", response_model=dict)
+async def create_video_detection(
+    file: UploadFile = File(...),
+    model_id: int = Form(...),
+    frame_stride: int = Form(1, ge=1),
+    conf_threshold: Optional[float] = Form(None, ge=0, le=1),
+    iou_threshold: Optional[float] = Form(None, ge=0, le=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Przesyła plik wideo i uruchamia detekcję na jego klatkach
+
+    frame_stride - przetwarzana jest co n-ta klatka (pozostałe są pomijane bez dekodowania).
+    """
+    video_service = VideoDetectionService(db)
+    video_detection = await video_service.create_video_detection(file, model_id, frame_stride, conf_threshold, iou_threshold)
+    task = await run_in_threadpool(process_video_detection.delay, video_detection.id)
+    return {
+        "task_id": task.id,
+        "video_detection_id": video_detection.id,
+        "status": "started",
+        "message": f"Rozpoczęto detekcję wideo {video_detection.name} z modelem {model_id}"
+    }
+
+@router.get("/video/{video_detection_id}", response_model=VideoDetectionResponse)
+def get_video_detection(
+    video_detection_id: int,
+    db: Session = Depends(get_db)
+):
+    """Pobiera zadanie detekcji wideo (status, liczba klatek, przepustowość)"""
+    return VideoDetectionService(db).get_video_detection(video_detection_id)
+
+@router.get("/video/{video_detection_id}/results")
+def get_video_detection_results(
+    video_detection_id: int,
+    format: str = Query("ndjson", regex="^(ndjson|msgpack)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Zwraca wyniki detekcji wideo
+
+    ndjson - jeden wiersz na przetworzoną klatkę ({"frame", "time", "objects"});
+    msgpack - cały wynik kolumnowo (frame_indices uint32[n], boxes float32[n,4],
+    scores float32[n], class_ids uint16[n]).
+    """
+    video_service = VideoDetectionService(db)
+    results = video_service.load_results(video_service.get_video_detection(video_detection_id))
+    if format == "msgpack":
+        return Response(msgpack.packb(results.to_msgpack_dict(), use_bin_type=True), media_type=STREAM_MEDIA_TYPES["msgpack"])
+    return StreamingResponse(video_service.iter_frames_ndjson(results), media_type=STREAM_MEDIA_TYPES["ndjson"])
+
+@router.delete("/video/{video_detection_id}", response_model=bool)
+def delete_video_detection(
+    video_detection_id: int,
+    db: Session = Depends(get_db)
+):
+    """Usuwa zadanie detekcji wideo wraz z plikiem i wynikami"""
+    return VideoDetectionService(db).delete_video_detection(video_detection_id)
+
+@router.get("/stream")
+def stream_detections(
+    format: str = Query("ndjson", regex="^(ndjson|msgpack|arrow)$"),
+    model_id: Optional[int] = None,
+    image_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Zwraca zadania detekcji jako strumień
+
+    ndjson - jeden obiekt DetectionResponse w wierszu; msgpack - kolejne mapy z wynikami
+    jako surowe tablice little-endian (boxes float32[n,4], scores float32[n], class_ids uint16[n]);
+    arrow - strumień Arrow IPC z jednym wierszem na wykryty obiekt.
+    """
+    detection_service = DetectionService(db)
+    return StreamingResponse(
+        detection_service.stream_detections(format, model_id, image_id),
+        media_type=STREAM_MEDIA_TYPES[format]
+    )
+
+@router.get("/{detection_id}/results")
+async def get_detection_results(
+    detection_id: int,
+    format: str = Query("json", regex="^(json|msgpack|arrow)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Pobiera wyniki zadania detekcji w formacie JSON (jak DetectionResponse.results), msgpack lub Arrow"""
+    detection = await get_or_404(db, Detection, detection_id, "Zadanie detekcji nie znalezione")
+    if format == "msgpack":
+        return Response(msgpack.packb(msgpack_record(detection)), media_type=STREAM_MEDIA_TYPES["msgpack"])
+    if format == "arrow":
+        batch = arrow_batch([(detection.id, detection.image_id, detection.packed)])
+        return StreamingResponse(iter_arrow_stream([batch]), media_type=STREAM_MEDIA_TYPES["arrow"])
+    return JSONResponse(detection.results)
+
 @router.get("/{detection_id}", response_model=DetectionResponse)
-def get_detection(
+async def get_detection(
     detection_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Pobiera zadanie detekcji po ID"""
-    detection_service = DetectionService(db)
-    return detection_service.get_detection(detection_id)
+    return await get_or_404(db, Detection, detection_id, "Zadanie detekcji nie znalezione")
 
 @router.get("/", response_model=DetectionList)
-def get_detections(
+async def get_detections(
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę zadań detekcji"""
-    detection_service = DetectionService(db)
-    detections = detection_service.get_detections(skip, limit)
-    return {"items": detections, "total": len(detections)}
+    """Pobiera listę zadań detekcji (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, select(Detection), Detection, limit, cursor, skip)
 
 @router.delete("/{detection_id}", response_model=bool)
 def delete_detection(
@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db, get_or_404
+from app.db.pagination import apaginate
 from app.schemas.schemas import ImageCreate, ImageResponse, ImageList
 from app.models.models import Image
 import os
 import uuid
 import shutil
 import logging
-from app.services.image_service import ImageService
+from app.core.config import settings
+from app.services.image_service import ImageService, images_query
+from app.services.minio_service import minio_service
+from app.services.thumbnail_service import (
+    ThumbnailService, THUMBNAIL_FORMATS, thumbnail_object, thumbnail_etag, parse_byte_range, iter_object
+)
+from app.worker.tasks import generate_thumbnails
+from minio.error import S3Error
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -21,28 +32,114 @@ async def upload_image(
 ):
     """Przesyła nowy obraz"""
     image_service = ImageService(db)
-    return await image_service.upload_image(file, dataset_id)
+    image = await image_service.upload_image(file, dataset_id)
+    try:
+        await run_in_threadpool(generate_thumbnails.delay, [image.id])
+    except Exception as e:
+        # Obraz jest już zapisany - brakujące miniatury wygeneruje pierwsze żądanie /thumbnail
+        logger.warning(f"Nie udało się zlecić generowania miniatur obrazu {image.id}: {str(e)}")
+    return image
+
+@router.get("/stream")
+def stream_images(
+    dataset_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Zwraca wszystkie obrazy jako NDJSON (jeden obiekt JSON w wierszu)"""
+    image_service = ImageService(db)
+    return StreamingResponse(image_service.stream_images(dataset_id), media_type="application/x-ndjson")
 
 @router.get("/{image_id}", response_model=ImageResponse)
-def get_image(
+async def get_image(
     image_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Pobiera obraz po ID"""
-    image_service = ImageService(db)
-    return image_service.get_image(image_id)
+    return await get_or_404(db, Image, image_id, "Obraz nie znaleziony")
+
+@router.get("/{image_id}/thumbnail")
+def get_thumbnail(
+    image_id: int,
+    request: Request,
+    size: str = Query("medium"),
+    format: Optional[str] = Query(None, regex="^(webp|jpeg)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Zwraca miniaturę obrazu (WebP lub JPEG)
+
+    Bez parametru format WebP wybierany jest, gdy klient akceptuje image/webp.
+    Odpowiedź ma ETag i Cache-Control; If-None-Match zwraca 304, a nagłówek Range
+    fragment pliku (206).
+    """
+    if size not in settings.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"Nieznany rozmiar miniatury: {size}")
+    image_format = format or ("webp" if "image/webp" in request.headers.get("accept", "") else "jpeg")
+
+    image = ImageService(db).get_image(image_id)
+    etag = thumbnail_etag(image, size, image_format)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.THUMBNAIL_CACHE_MAX_AGE}",
+        "Vary": "Accept",
+        "Accept-Ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    thumbnail_service = ThumbnailService(db)
+    thumbnail_service.ensure(image)
+    try:
+        total = minio_service.client.stat_object(settings.IMAGES_BUCKET, thumbnail_object(image, size, image_format)).size
+    except S3Error as e:
+        if e.code != "NoSuchKey":
+            raise HTTPException(status_code=500, detail=f"Błąd podczas odczytu miniatury: {str(e)}")
+        # Pliki miniatur zniknęły (lub zmienił się ich prefiks) - generowanie od nowa
+        logger.warning(f"Brak miniatury {thumbnail_object(image, size, image_format)} - ponowne generowanie")
+        thumbnail_service.ensure(image, force=True)
+        try:
+            total = minio_service.client.stat_object(settings.IMAGES_BUCKET, thumbnail_object(image, size, image_format)).size
+        except S3Error:
+            raise HTTPException(status_code=404, detail="Miniatura nie znaleziona")
+        etag = thumbnail_etag(image, size, image_format)
+        headers["ETag"] = etag
+    object_name = thumbnail_object(image, size, image_format)
+    media_type = THUMBNAIL_FORMATS[image_format][1]
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = parse_byte_range(range_header, total)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{total}"})
+
+    if byte_range is None:
+        return StreamingResponse(
+            iter_object(settings.IMAGES_BUCKET, object_name),
+            media_type=media_type,
+            headers={**headers, "Content-Length": str(total)}
+        )
+    start, end = byte_range
+    return StreamingResponse(
+        iter_object(settings.IMAGES_BUCKET, object_name, start, end - start + 1),
+        status_code=206,
+        media_type=media_type,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{total}", "Content-Length": str(end - start + 1)}
+    )
 
 @router.get("/", response_model=ImageList)
-def get_images(
+async def get_images(
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
     dataset_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę obrazów"""
-    image_service = ImageService(db)
-    images = image_service.get_images(skip, limit, dataset_id)
-    return {"items": images, "total": len(images)}
+    """Pobiera listę obrazów (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, images_query(dataset_id), Image, limit, cursor, skip)
 
 @router.delete("/{image_id}", response_model=bool)
 def delete_image(
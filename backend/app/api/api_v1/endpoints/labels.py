@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
-from app.schemas.schemas import AnnotationCreate, AnnotationResponse, AnnotationList
+from app.db.session import get_db, get_async_db, get_or_404
+from app.db.pagination import apaginate
+from app.schemas.schemas import AnnotationCreate, AnnotationResponse, AnnotationList, AnnotationUpsert, ImageAnnotationsReplace
 from app.models.models import Annotation
+from app.services.label_service import LabelService, labels_query
 import logging
 
 router = APIRouter()
@@ -15,55 +19,69 @@ def create_label(
     db: Session = Depends(get_db)
 ):
     """Tworzy nową adnotację"""
-    try:
-        new_annotation = Annotation(
-            x=annotation_data.x,
-            y=annotation_data.y,
-            width=annotation_data.width,
-            height=annotation_data.height,
-            format=annotation_data.format,
-            image_id=annotation_data.image_id,
-            class_id=annotation_data.class_id
-        )
-        db.add(new_annotation)
-        db.commit()
-        db.refresh(new_annotation)
-        return new_annotation
-    except Exception as e:
-        logger.error(f"Błąd podczas tworzenia adnotacji: {str(e)}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia adnotacji: {str(e)}")
+    label_service = LabelService(db)
+    return label_service.create_label(annotation_data)
+
+@router.post("/bulk", response_model=AnnotationList)
+def create_labels(
+    annotations_data: List[AnnotationCreate],
+    db: Session = Depends(get_db)
+):
+    """Tworzy wiele adnotacji w jednej transakcji"""
+    label_service = LabelService(db)
+    annotations = label_service.create_multiple_labels(annotations_data)
+    return {"items": annotations, "total": len(annotations)}
+
+@router.put("/images", response_model=AnnotationList)
+def replace_images_labels(
+    images_data: List[ImageAnnotationsReplace],
+    db: Session = Depends(get_db)
+):
+    """Zastępuje adnotacje wielu obrazów w jednej transakcji i zwraca ich nowy stan"""
+    label_service = LabelService(db)
+    annotations = label_service.replace_annotations({item.image_id: item.annotations for item in images_data})
+    return {"items": annotations, "total": len(annotations)}
+
+@router.put("/images/{image_id}", response_model=AnnotationList)
+def replace_image_labels(
+    image_id: int,
+    annotations_data: List[AnnotationUpsert],
+    db: Session = Depends(get_db)
+):
+    """Zastępuje wszystkie adnotacje obrazu i zwraca ich nowy stan"""
+    label_service = LabelService(db)
+    annotations = label_service.replace_annotations({image_id: annotations_data})
+    return {"items": annotations, "total": len(annotations)}
+
+@router.get("/stream")
+def stream_labels(
+    image_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Zwraca wszystkie adnotacje jako NDJSON (jeden obiekt JSON w wierszu)"""
+    label_service = LabelService(db)
+    return StreamingResponse(label_service.stream_labels(image_id, class_id), media_type="application/x-ndjson")
 
 @router.get("/{annotation_id}", response_model=AnnotationResponse)
-def get_label(
+async def get_label(
     annotation_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Pobiera adnotację po ID"""
-    annotation = db.query(Annotation).filter(Annotation.id == annotation_id).first()
-    if not annotation:
-        raise HTTPException(status_code=404, detail="Adnotacja nie znaleziona")
-    return annotation
+    return await get_or_404(db, Annotation, annotation_id, "Adnotacja nie znaleziona")
 
 @router.get("/", response_model=AnnotationList)
-def get_labels(
+async def get_labels(
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
     image_id: Optional[int] = None,
     class_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę adnotacji"""
-    query = db.query(Annotation)
-    
-    if image_id is not None:
-        query = query.filter(Annotation.image_id == image_id)
-    
-    if class_id is not None:
-        query = query.filter(Annotation.class_id == class_id)
-    
-    annotations = query.offset(skip).limit(limit).all()
-    return {"items": annotations, "total": len(annotations)}
+    """Pobiera listę adnotacji (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, labels_query(image_id, class_id), Annotation, limit, cursor, skip)
 
 @router.put("/{annotation_id}", response_model=AnnotationResponse)
 def update_label(
@@ -72,21 +90,8 @@ def update_label(
     db: Session = Depends(get_db)
 ):
     """Aktualizuje adnotację"""
-    annotation = db.query(Annotation).filter(Annotation.id == annotation_id).first()
-    if not annotation:
-        raise HTTPException(status_code=404, detail="Adnotacja nie znaleziona")
-    
-    annotation.x = annotation_data.x
-    annotation.y = annotation_data.y
-    annotation.width = annotation_data.width
-    annotation.height = annotation_data.height
-    annotation.format = annotation_data.format
-    annotation.image_id = annotation_data.image_id
-    annotation.class_id = annotation_data.class_id
-    
-    db.commit()
-    db.refresh(annotation)
-    return annotation
+    label_service = LabelService(db)
+    return label_service.update_label(annotation_id, annotation_data)
 
 @router.delete("/{annotation_id}", response_model=bool)
 def delete_label(
@@ -94,10 +99,5 @@ def delete_label(
     db: Session = Depends(get_db)
 ):
     """Usuwa adnotację"""
-    annotation = db.query(Annotation).filter(Annotation.id == annotation_id).first()
-    if not annotation:
-        raise HTTPException(status_code=404, detail="Adnotacja nie znaleziona")
-    
-    db.delete(annotation)
-    db.commit()
-    return True
+    label_service = LabelService(db)
+    return label_service.delete_label(annotation_id)
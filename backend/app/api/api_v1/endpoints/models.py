@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import logging
+import redis
 
 from app.db.session import get_db
 from app.services.model_service import ModelService
 from app.schemas.schemas import ModelCreate, ModelResponse, ModelsResponse
+from app.worker.tasks import export_model
+from app.ai_engines.model_registry import fleet_stats
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=ModelResponse)
 def create_model(
@@ -29,6 +34,17 @@ def get_models(
     """
     return ModelService.get_models(db, skip, limit)
 
+@router.get("/registry/stats", response_model=dict)
+def get_registry_stats():
+    """
+    Pobiera liczniki rejestru modeli (trafienia, chybienia, usunięcia) zsumowane ze wszystkich procesów.
+    """
+    try:
+        return fleet_stats()
+    except redis.RedisError as e:
+        logger.error(f"Błąd podczas odczytu statystyk rejestru modeli: {str(e)}")
+        raise HTTPException(status_code=503, detail="Statystyki rejestru modeli są niedostępne")
+
 @router.get("/{model_id}", response_model=ModelResponse)
 def get_model(
     model_id: int,
@@ -59,6 +75,27 @@ def get_model_download_url(
     """
     return ModelService.get_model_download_url(db, model_id)
 
+@router.post("/{model_id}/export", response_model=dict)
+def create_model_export(
+    model_id: int,
+    int8: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Eksportuje model do ONNX (oraz ONNX INT8) w kolejce training.
+
+    Po zakończeniu Model.config["runtimes"] zawiera eksporty z opóźnieniem i zgodnością
+    wykryć z modelem PyTorch, a detekcja używa najszybszego dostępnego środowiska.
+    """
+    ModelService(db).get_model(model_id)
+    task = export_model.delay(model_id, int8)
+    return {
+        "task_id": task.id,
+        "model_id": model_id,
+        "status": "started",
+        "message": f"Rozpoczęto eksport modelu {model_id}"
+    }
+
 @router.get("/{model_id}/metrics")
 def get_model_metrics(
     model_id: int,
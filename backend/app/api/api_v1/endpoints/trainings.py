@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db, get_or_404
+from app.db.pagination import apaginate
+from app.models.models import Training
 from app.schemas.schemas import TrainingCreate, TrainingResponse, TrainingList
 from app.services.training_service import TrainingService
 from app.worker.tasks import train_model
@@ -34,25 +39,55 @@ def create_training(
         logger.error(f"Błąd podczas tworzenia zadania trenowania: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia zadania trenowania: {str(e)}")
 
-@router.get("/{training_id}", response_model=TrainingResponse)
-def get_training(
+@router.post("/{training_id}/resume", response_model=dict)
+def resume_training(
     training_id: int,
+    force: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Pobiera zadanie trenowania po ID"""
+    """
+    Wznawia przerwane trenowanie od ostatniego punktu kontrolnego
+
+    Zadanie w statusie processing (np. po awarii workera) wymaga force=true.
+    """
     training_service = TrainingService(db)
-    return training_service.get_training(training_id)
+    training = training_service.get_training(training_id)
+    if training.status == "completed":
+        raise HTTPException(status_code=409, detail="Trenowanie zostało już zakończone")
+    if training.status == "processing" and not force:
+        raise HTTPException(status_code=409, detail="Trenowanie jest w toku (użyj force=true, jeśli worker został przerwany)")
+
+    task = train_model.delay(training.id)
+    return {
+        "task_id": task.id,
+        "training_id": training.id,
+        "status": "started",
+        "message": f"Wznowiono trenowanie {training.id}"
+    }
+
+@router.get("/stream")
+def stream_trainings(db: Session = Depends(get_db)):
+    """Zwraca wszystkie zadania trenowania jako NDJSON (jeden obiekt JSON w wierszu)"""
+    training_service = TrainingService(db)
+    return StreamingResponse(training_service.stream_trainings(), media_type="application/x-ndjson")
+
+@router.get("/{training_id}", response_model=TrainingResponse)
+async def get_training(
+    training_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Pobiera zadanie trenowania po ID"""
+    return await get_or_404(db, Training, training_id, "Zadanie trenowania nie znalezione")
 
 @router.get("/", response_model=TrainingList)
-def get_trainings(
+async def get_trainings(
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Pobiera listę zadań trenowania"""
-    training_service = TrainingService(db)
-    trainings = training_service.get_trainings(skip, limit)
-    return {"items": trainings, "total": len(trainings)}
+    """Pobiera listę zadań trenowania (kolejną stronę wskazuje next_cursor)"""
+    return await apaginate(db, select(Training), Training, limit, cursor, skip)
 
 @router.delete("/{training_id}", response_model=bool)
 def delete_training(
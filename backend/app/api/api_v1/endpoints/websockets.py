@@ -1,66 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import get_db
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Optional
+from app.core.event_hub import event_hub
 import logging
 import json
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Przechowywanie aktywnych połączeń WebSocket
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+@router.websocket("/status")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    task_id: Optional[str] = None,
+    training_id: Optional[int] = None,
+    dataset_id: Optional[int] = None
+):
+    """
+    Endpoint WebSocket do monitorowania statusu zadań
 
-manager = ConnectionManager()
+    Subskrypcje można podać w adresie (?task_id=...&training_id=...&dataset_id=...)
+    lub wysłać wiadomością {"action": "subscribe", "topic": "task|training|dataset", "id": ...}
+    ("unsubscribe" - rezygnacja). Zdarzenia z workerów przychodzą przez Redis pub/sub.
+    """
+    await websocket.accept()
+    client = event_hub.register(websocket)
+    for topic, key in (("task", task_id), ("training", training_id), ("dataset", dataset_id)):
+        if key is not None:
+            event_hub.subscribe(client, topic, key)
 
-@router.websocket("/status")
-async def websocket_endpoint(websocket: WebSocket):
-    """Endpoint WebSocket do monitorowania statusu zadań"""
-    await manager.connect(websocket)
     try:
         while True:
             data = await websocket.receive_text()
             try:
                 message = json.loads(data)
-                # Tutaj można dodać logikę obsługi różnych typów wiadomości
-                await manager.send_personal_message(json.dumps({"status": "received", "message": message}), websocket)
             except json.JSONDecodeError:
-                await manager.send_personal_message(json.dumps({"status": "error", "message": "Invalid JSON"}), websocket)
+                client.offer(json.dumps({"status": "error", "message": "Invalid JSON"}))
+                continue
+
+            action = message.get("action") if isinstance(message, dict) else None
+            if action in ("subscribe", "unsubscribe"):
+                try:
+                    if action == "subscribe":
+                        event_hub.subscribe(client, message.get("topic"), message.get("id"))
+                    else:
+                        event_hub.unsubscribe(client, message.get("topic"), message.get("id"))
+                    client.offer(json.dumps({"status": f"{action}d", "topic": message.get("topic"), "id": message.get("id")}))
+                except ValueError as e:
+                    client.offer(json.dumps({"status": "error", "message": str(e)}))
+            else:
+                client.offer(json.dumps({"status": "received", "message": message}))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        await event_hub.remove(client)
 
 # Funkcja do wysyłania aktualizacji statusu do klientów
 async def send_status_update(task_id: str, status: str, data: dict = None):
     """
-    Wysyła aktualizację statusu zadania do wszystkich podłączonych klientów
-    
+    Wysyła aktualizację statusu zadania do klientów subskrybujących zadanie
+    (we wszystkich replikach API, przez Redis)
+
     Args:
         task_id: ID zadania
         status: Status zadania (started, processing, completed, failed)
         data: Dodatkowe dane do wysłania
     """
-    message = {
-        "task_id": task_id,
-        "status": status
-    }
-    
-    if data:
-        message["data"] = data
-        
-    await manager.broadcast(json.dumps(message))
+    await event_hub.publish("task", task_id, status, data)
@@ -10,6 +10,21 @@ class Settings(BaseSettings):
     
     # Ustawienia bazy danych
     DATABASE_URL: Optional[PostgresDsn] = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/yolo_coco")
+    ASYNC_DATABASE_URL: Optional[str] = None  # domyślnie DATABASE_URL ze sterownikiem asyncpg
+
+    # Pula połączeń (osobno dla każdego procesu i każdego silnika)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True  # sprawdzenie połączenia przed użyciem (zerwane połączenia po restarcie bazy)
+    DB_POOL_RECYCLE: int = 1800  # maksymalny wiek połączenia (s)
+    DB_POOL_TIMEOUT: int = 30  # czas oczekiwania na wolne połączenie (s)
+
+    @validator("ASYNC_DATABASE_URL", pre=True, always=True)
+    def assemble_async_database_url(cls, v: Optional[str], values: Dict[str, Any]) -> str:
+        if v:
+            return v
+        url = str(values.get("DATABASE_URL"))
+        return url.replace("postgresql+psycopg2://", "postgresql://", 1).replace("postgresql://", "postgresql+asyncpg://", 1)
     
     # Ustawienia Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
@@ -18,6 +33,16 @@ class Settings(BaseSettings):
     MINIO_ROOT_USER: str = os.getenv("MINIO_ROOT_USER", "minioadmin")
     MINIO_ROOT_PASSWORD: str = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
     MINIO_URL: str = os.getenv("MINIO_URL", "minio:9000")
+    MINIO_SECURE: bool = False
+    MINIO_PART_SIZE: int = 10 * 1024 * 1024  # rozmiar części przy przesyłaniu multipart (min. 5 MiB)
+    MINIO_MAX_POOL_CONNECTIONS: int = 32  # rozmiar puli połączeń urllib3 na host
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 300.0
+    IMAGES_BUCKET: str = "images"
+    MODELS_BUCKET: str = "models"
+    DATASETS_BUCKET: str = "datasets"
+    TEMP_BUCKET: str = "temp"
+    VIDEOS_BUCKET: str = "videos"
     
     # Ustawienia CORS
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
@@ -30,7 +55,119 @@ class Settings(BaseSettings):
     # Ustawienia YOLO
     DEFAULT_CONFIDENCE_THRESHOLD: float = 0.5
     DEFAULT_IOU_THRESHOLD: float = 0.45
-    
+    DEFAULT_MODEL_WEIGHTS: str = os.getenv("DEFAULT_MODEL_WEIGHTS", "yolov8n.pt")
+
+    # Ustawienia inferencji (CPU)
+    INFERENCE_IMAGE_SIZE: int = 640
+    INFERENCE_BATCH_SIZE: int = 8
+    INFERENCE_NUM_THREADS: int = 0  # 0 = domyślna liczba wątków biblioteki
+    INFERENCE_MAX_DETECTIONS: int = 300
+    INFERENCE_RUNTIME: str = "auto"  # auto (najszybszy dostępny eksport), torch, onnx, onnx-int8 lub openvino
+
+    # Eksport modeli (ONNX, ONNX INT8) i porównanie z modelem PyTorch
+    EXPORT_ONNX_OPSET: int = 12
+    EXPORT_INT8: bool = True  # dodatkowy wariant z kwantyzacją dynamiczną wag
+    EXPORT_VALIDATION_IMAGES: int = 32  # obrazy do pomiaru opóźnienia i zgodności wykryć
+    EXPORT_MATCH_IOU: float = 0.7  # IoU dopasowania wykryć eksportu do wykryć PyTorch
+    EXPORT_ACCURACY_TOLERANCE: float = 0.03  # dopuszczalny spadek zgodności wykryć (1 - F1)
+    TRAINING_AUTO_EXPORT: bool = True  # eksport modelu po zakończonym trenowaniu
+
+    # Detekcja kafelkowa (obrazy wysokiej rozdzielczości)
+    TILED_INFERENCE_TILE_SIZE: int = 640
+    TILED_INFERENCE_OVERLAP: float = 0.2  # zakładka sąsiednich kafelków (ułamek boku)
+    TILED_INFERENCE_FULL_IMAGE: bool = True  # dodatkowy przebieg na całym przeskalowanym obrazie
+    TILED_INFERENCE_MERGE_METHOD: str = "nms"  # nms lub wbf
+    TILED_INFERENCE_MERGE_METRIC: str = "ios"  # iou lub ios (przecięcie / pole mniejszej ramki)
+    TILED_INFERENCE_MERGE_THRESHOLD: float = 0.5
+    TILED_INFERENCE_MAX_DETECTIONS: int = 3000
+
+    # Detekcja wideo
+    VIDEO_PREFETCH_BATCHES: int = 4  # limit partii klatek oczekujących między etapami potoku
+    VIDEO_TMP_DIR: Optional[str] = None  # katalog na pobrany plik wideo (domyślnie katalog tymczasowy systemu)
+
+    # Synchroniczna detekcja (POST /detection/infer) - łączenie żądań w partie w procesie API
+    INFER_MAX_BATCH_SIZE: int = 8  # maksymalna liczba obrazów w partii
+    INFER_MAX_WAIT_MS: float = 10.0  # maksymalne oczekiwanie na dopełnienie partii od pierwszego żądania
+    INFER_MAX_QUEUE: int = 64  # limit żądań oczekujących na model - po przekroczeniu HTTP 429
+    INFER_TIMEOUT: float = 30.0  # maksymalny czas obsługi żądania (s) - po przekroczeniu HTTP 504
+    INFER_MAX_IMAGE_BYTES: int = 20 * 1024 ** 2
+    INFER_BATCHER_IDLE_TIMEOUT: float = 300.0  # zamknięcie wątku batchera po bezczynności (s)
+
+    # Rejestr modeli w procesie workera
+    MODEL_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    MODEL_WARMUP_IDS: List[int] = []  # np. MODEL_WARMUP_IDS='[1, 2]'
+    MODEL_REGISTRY_STATS_PREFIX: str = "model_registry:stats"  # liczniki floty w Redis (hash na model)
+
+    # Detekcja masowa
+    DETECTION_CHUNK_SIZE: int = 64  # liczba obrazów w jednym zadaniu Celery
+    DETECTION_DOWNLOAD_WORKERS: int = 8
+
+    # Import datasetów z archiwów
+    IMPORT_BATCH_SIZE: int = 128  # liczba obrazów przetwarzanych i wstawianych w jednej partii
+    IMPORT_ANNOTATION_BATCH_SIZE: int = 5000
+    IMPORT_HEADER_WORKERS: int = 4  # wątki odczytu nagłówków obrazów; 0 = odczyt w bieżącym wątku
+    IMPORT_UPLOAD_WORKERS: int = 16
+
+    # Eksport datasetów
+    EXPORT_BATCH_SIZE: int = 64  # liczba obrazów pobieranych z bazy i MinIO w jednej partii
+    EXPORT_DOWNLOAD_WORKERS: int = 8
+    EXPORT_URL_EXPIRES: int = 24 * 3600  # ważność URL do pobrania archiwum (s)
+
+    # Paginacja list
+    PAGINATION_MAX_LIMIT: int = 1000
+    PAGINATION_COUNT_CACHE_TTL: int = 30  # czas przechowywania wyników COUNT dla list z filtrami (s)
+    PAGINATION_ESTIMATE_MIN_ROWS: int = 100000  # powyżej tej liczby wierszy total jest szacowany z pg_class
+    PAGINATION_STREAM_BATCH_SIZE: int = 1000  # rozmiar partii w strumieniach NDJSON
+
+    # Kolejki Celery - limity czasu zadań (s)
+    DETECTION_SOFT_TIME_LIMIT: int = 540
+    DETECTION_TIME_LIMIT: int = 600
+    TRAINING_SOFT_TIME_LIMIT: int = 23 * 3600
+    TRAINING_TIME_LIMIT: int = 24 * 3600
+    DEFAULT_TASK_SOFT_TIME_LIMIT: int = 4 * 3600 - 60
+    DEFAULT_TASK_TIME_LIMIT: int = 4 * 3600
+    VIDEO_DETECTION_SOFT_TIME_LIMIT: int = 6 * 3600 - 60
+    VIDEO_DETECTION_TIME_LIMIT: int = 6 * 3600
+    CELERY_VISIBILITY_TIMEOUT: int = 3600  # musi przekraczać DETECTION_TIME_LIMIT (zadania acks_late)
+
+    # Zdarzenia postępu (Redis pub/sub) i WebSocket
+    EVENTS_CHANNEL_PREFIX: str = "events"
+    EVENTS_MIN_INTERVAL: float = 0.5  # minimalny odstęp zdarzeń postępu jednego zadania (s)
+    WS_CLIENT_QUEUE_SIZE: int = 256  # limit wiadomości oczekujących na wysłanie do jednego klienta
+    WS_DROP_POLICY: str = "drop_oldest"  # drop_oldest, drop_newest lub disconnect
+    WS_SEND_TIMEOUT: float = 10.0  # maksymalny czas wysyłki jednej wiadomości (s)
+    BULK_PROGRESS_TTL: int = 7 * 24 * 3600  # czas przechowywania liczników partii joba detekcji masowej (s)
+
+    # Trenowanie modeli (ultralytics, CPU)
+    TRAINING_DIR: str = "/app/data/trainings"  # lokalne datasety i przebiegi trenowania
+    TRAINING_DEFAULT_EPOCHS: int = 100
+    TRAINING_VAL_SPLIT: float = 0.2  # udział obrazów walidacyjnych (podział deterministyczny po ID)
+    TRAINING_DATALOADER_WORKERS: int = 2
+    TRAINING_DOWNLOAD_WORKERS: int = 8
+    TRAINING_CHECKPOINT_INTERVAL: int = 1  # co ile epok last.pt jest wysyłany do MinIO
+
+    # Lokalny cache obrazów dla workerów trenowania (adresowany treścią, LRU)
+    IMAGE_CACHE_DIR: str = "/app/data/image_cache"  # ten sam wolumen co TRAINING_DIR (twarde dowiązania)
+    IMAGE_CACHE_MAX_BYTES: int = 50 * 1024 ** 3
+
+    # Miniatury obrazów (rozmiar -> dłuższy bok w px)
+    THUMBNAIL_SIZES: Dict[str, int] = {"small": 160, "medium": 480, "large": 1280}
+    THUMBNAIL_QUALITY: int = 80
+    THUMBNAIL_WORKERS: int = 4
+    THUMBNAIL_BATCH_SIZE: int = 64  # liczba obrazów przetwarzanych w jednej partii zadania
+    THUMBNAIL_CACHE_MAX_AGE: int = 7 * 24 * 3600  # Cache-Control max-age odpowiedzi (s)
+
+    # Kolumnowe migawki adnotacji (AnnotationStore)
+    ANNOTATION_STORE_DIR: str = "/app/data/annotation_store"
+    ANNOTATION_STORE_WATERMARK_MARGIN: int = 300  # zapas przy wyszukiwaniu zmienionych adnotacji (s)
+
+    # Cache wyników detekcji (klucz: skrót treści obrazu, model, progi)
+    DETECTION_CACHE_ENABLED: bool = True
+    DETECTION_CACHE_PREFIX: str = "detcache"
+    DETECTION_CACHE_TTL: int = 7 * 24 * 3600  # czas życia wpisu w Redis, odnawiany przy trafieniu (s)
+    DETECTION_CACHE_DB_TTL: int = 30 * 24 * 3600  # czas ważności wpisu w tabeli detection_cache (s)
+    DETECTION_CACHE_PURGE_INTERVAL: int = 6 * 3600  # co ile Celery beat zleca purge_detection_cache (s)
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,396 @@
+"""
+Zwarty format binarny wyników detekcji
+
+Układ (little-endian):
+    nagłówek   "<4sIdH": magic b"DRP1", liczba obiektów n, processing_time (NaN = brak),
+               liczba nazw klas k
+    nazwy      k razy "<HH" (class_id, długość) + nazwa w UTF-8 - tylko klasy obecne w wyniku
+    boxes      float32[n, 4] (x1, y1, x2, y2)
+    scores     float32[n]
+    class_ids  uint16[n]
+
+Kolumny zapisane są kolejno, więc odczyt to widoki np.frombuffer bez kopiowania,
+a eksport do Arrow/msgpack nie wymaga budowania słowników dla każdego obiektu.
+"""
+import math
+import struct
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"DRP1"
+_HEADER = struct.Struct("<4sIdH")
+_NAME = struct.Struct("<HH")
+
+# Zaokrąglenia zgodne z formatem API (InferenceEngine.to_objects)
+CONFIDENCE_DECIMALS = 4
+BBOX_DECIMALS = 1
+
+
+class PackedResults:
+    """Wyniki detekcji jednego obrazu w postaci tablic kolumnowych"""
+
+    __slots__ = ("boxes", "scores", "class_ids", "names", "processing_time")
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        class_ids: np.ndarray,
+        names: Dict[int, str],
+        processing_time: Optional[float] = None
+    ):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.names = names
+        self.processing_time = processing_time
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        class_ids: np.ndarray,
+        names: Dict[int, str],
+        processing_time: Optional[float] = None
+    ) -> "PackedResults":
+        """Tworzy wynik z tablic silnika inferencji (names - pełny słownik klas modelu)"""
+        class_ids = np.asarray(class_ids, dtype=np.uint16)
+        present = {int(class_id): names.get(int(class_id), str(int(class_id))) for class_id in np.unique(class_ids)}
+        return cls(
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+            np.asarray(scores, dtype=np.float32),
+            class_ids,
+            present,
+            processing_time
+        )
+
+    @classmethod
+    def from_dict(cls, results: Dict[str, Any]) -> "PackedResults":
+        """
+        Tworzy wynik ze słownika w formacie API ({"objects": [...], "processing_time"})
+
+        Starsze wiersze nie mają class_id (tylko nazwę klasy) - dostają one stałe ID
+        według kolejności pierwszego wystąpienia nazwy, bez kolizji z ID zapisanymi jawnie.
+        Brak confidence zapisywany jest jako 0.
+        """
+        objects = results.get("objects") or []
+        names = {int(obj["class_id"]): str(obj.get("class", obj["class_id"])) for obj in objects if "class_id" in obj}
+        ids_by_name = {name: class_id for class_id, name in names.items()}
+        class_ids = []
+        for obj in objects:
+            if "class_id" in obj:
+                class_ids.append(int(obj["class_id"]))
+                continue
+            name = str(obj.get("class", ""))
+            if name not in ids_by_name:
+                class_id = len(ids_by_name)
+                while class_id in names:
+                    class_id += 1
+                ids_by_name[name] = class_id
+                names[class_id] = name
+            class_ids.append(ids_by_name[name])
+
+        return cls(
+            np.array([obj.get("bbox") or [0, 0, 0, 0] for obj in objects], dtype=np.float32).reshape(-1, 4),
+            np.array([obj.get("confidence") or 0.0 for obj in objects], dtype=np.float32),
+            np.array(class_ids, dtype=np.uint16),
+            names,
+            results.get("processing_time")
+        )
+
+    def to_bytes(self) -> bytes:
+        processing_time = math.nan if self.processing_time is None else float(self.processing_time)
+        parts = [_HEADER.pack(MAGIC, len(self), processing_time, len(self.names))]
+        for class_id, name in sorted(self.names.items()):
+            encoded = name.encode("utf-8")
+            parts.append(_NAME.pack(class_id, len(encoded)))
+            parts.append(encoded)
+        parts.append(np.ascontiguousarray(self.boxes, dtype="<f4").tobytes())
+        parts.append(np.ascontiguousarray(self.scores, dtype="<f4").tobytes())
+        parts.append(np.ascontiguousarray(self.class_ids, dtype="<u2").tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "PackedResults":
+        magic, count, processing_time, names_count = _HEADER.unpack_from(blob, 0)
+        if magic != MAGIC:
+            raise ValueError("Nieznany format wyników detekcji")
+        offset = _HEADER.size
+        names = {}
+        for _ in range(names_count):
+            class_id, length = _NAME.unpack_from(blob, offset)
+            offset += _NAME.size
+            names[class_id] = bytes(blob[offset:offset + length]).decode("utf-8")
+            offset += length
+
+        if count == 0:
+            return cls(
+                np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.uint16),
+                names, None if math.isnan(processing_time) else processing_time
+            )
+        boxes = np.frombuffer(blob, dtype="<f4", count=count * 4, offset=offset).reshape(count, 4)
+        offset += count * 16
+        scores = np.frombuffer(blob, dtype="<f4", count=count, offset=offset)
+        offset += count * 4
+        class_ids = np.frombuffer(blob, dtype="<u2", count=count, offset=offset)
+        return cls(boxes, scores, class_ids, names, None if math.isnan(processing_time) else processing_time)
+
+    def to_objects(self) -> List[Dict[str, Any]]:
+        """Zwraca listę obiektów w formacie API ({"class", "class_id", "confidence", "bbox"})"""
+        boxes = np.round(self.boxes.astype(np.float64), BBOX_DECIMALS).tolist()
+        scores = np.round(self.scores.astype(np.float64), CONFIDENCE_DECIMALS).tolist()
+        return [
+            {
+                "class": self.names.get(class_id, str(class_id)),
+                "class_id": class_id,
+                "confidence": score,
+                "bbox": box
+            }
+            for box, score, class_id in zip(boxes, scores, self.class_ids.tolist())
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"objects": self.to_objects(), "processing_time": self.processing_time}
+
+    def to_msgpack_dict(self) -> Dict[str, Any]:
+        """Wynik dla odpowiedzi msgpack - tablice jako surowe bajty little-endian"""
+        return {
+            "count": len(self),
+            "processing_time": self.processing_time,
+            "names": {str(class_id): name for class_id, name in self.names.items()},
+            "boxes": np.ascontiguousarray(self.boxes, dtype="<f4").tobytes(),
+            "scores": np.ascontiguousarray(self.scores, dtype="<f4").tobytes(),
+            "class_ids": np.ascontiguousarray(self.class_ids, dtype="<u2").tobytes(),
+        }
+
+
+def pack_results(results: Optional[Dict[str, Any]]) -> Optional[bytes]:
+    if results is None:
+        return None
+    return PackedResults.from_dict(results).to_bytes()
+
+
+def unpack_results(blob: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    if blob is None:
+        return None
+    return PackedResults.from_bytes(blob).to_dict()
+
+
+def load_packed(packed: Optional[bytes], legacy: Optional[Dict[str, Any]]) -> Optional[PackedResults]:
+    """Zwraca wynik z kolumny binarnej lub (dla starszych rekordów) z JSON"""
+    if packed is not None:
+        return PackedResults.from_bytes(packed)
+    if legacy is not None:
+        return PackedResults.from_dict(legacy)
+    return None
+
+
+# Wyniki detekcji wideo - wszystkie klatki w jednym pliku kolumnowym
+VIDEO_MAGIC = b"VRP1"
+_VIDEO_HEADER = struct.Struct("<4sIIIdH")
+
+
+class VideoResults:
+    """
+    Wyniki detekcji wszystkich przetworzonych klatek wideo w postaci tablic kolumnowych
+
+    Układ (little-endian):
+        nagłówek   "<4sIIIdH": magic b"VRP1", liczba obiektów n, liczba przetworzonych klatek,
+                   krok próbkowania klatek, fps wideo (NaN = brak), liczba nazw klas k
+        nazwy      jak w formacie DRP1
+        frames     uint32[n] - numer klatki obiektu (rosnąco)
+        boxes      float32[n, 4], scores float32[n], class_ids uint16[n]
+
+    Przetworzone klatki to 0, stride, 2 * stride, ... - klatki bez wykryć nie zajmują miejsca.
+    """
+
+    __slots__ = ("frame_indices", "boxes", "scores", "class_ids", "names", "frames", "stride", "fps")
+
+    def __init__(
+        self,
+        frame_indices: np.ndarray,
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        class_ids: np.ndarray,
+        names: Dict[int, str],
+        frames: int,
+        stride: int = 1,
+        fps: Optional[float] = None
+    ):
+        self.frame_indices = frame_indices
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.names = names
+        self.frames = frames
+        self.stride = stride
+        self.fps = fps
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def to_bytes(self) -> bytes:
+        fps = math.nan if self.fps is None else float(self.fps)
+        parts = [_VIDEO_HEADER.pack(VIDEO_MAGIC, len(self), self.frames, self.stride, fps, len(self.names))]
+        for class_id, name in sorted(self.names.items()):
+            encoded = name.encode("utf-8")
+            parts.append(_NAME.pack(class_id, len(encoded)))
+            parts.append(encoded)
+        parts.append(np.ascontiguousarray(self.frame_indices, dtype="<u4").tobytes())
+        parts.append(np.ascontiguousarray(self.boxes, dtype="<f4").tobytes())
+        parts.append(np.ascontiguousarray(self.scores, dtype="<f4").tobytes())
+        parts.append(np.ascontiguousarray(self.class_ids, dtype="<u2").tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "VideoResults":
+        magic, count, frames, stride, fps, names_count = _VIDEO_HEADER.unpack_from(blob, 0)
+        if magic != VIDEO_MAGIC:
+            raise ValueError("Nieznany format wyników detekcji wideo")
+        offset = _VIDEO_HEADER.size
+        names = {}
+        for _ in range(names_count):
+            class_id, length = _NAME.unpack_from(blob, offset)
+            offset += _NAME.size
+            names[class_id] = bytes(blob[offset:offset + length]).decode("utf-8")
+            offset += length
+
+        columns = []
+        for dtype, width in (("<u4", 1), ("<f4", 4), ("<f4", 1), ("<u2", 1)):
+            size = count * width
+            column = np.frombuffer(blob, dtype=dtype, count=size, offset=offset) if count else np.empty(0, dtype=dtype)
+            columns.append(column.reshape(count, 4) if width == 4 else column)
+            offset += size * np.dtype(dtype).itemsize
+        return cls(*columns, names, frames, stride, None if math.isnan(fps) else fps)
+
+    def iter_frames(self) -> Iterator[Tuple[int, PackedResults]]:
+        """Zwraca (numer klatki, wyniki klatki) dla każdej przetworzonej klatki"""
+        frame_numbers = np.arange(self.frames, dtype=np.int64) * self.stride
+        starts = np.searchsorted(self.frame_indices.astype(np.int64), frame_numbers)
+        ends = np.append(starts[1:], len(self))
+        for frame, start, end in zip(frame_numbers.tolist(), starts.tolist(), ends.tolist()):
+            yield frame, PackedResults(
+                self.boxes[start:end], self.scores[start:end], self.class_ids[start:end], self.names
+            )
+
+    def to_msgpack_dict(self) -> Dict[str, Any]:
+        """Wynik dla odpowiedzi msgpack - tablice jako surowe bajty little-endian"""
+        return {
+            "count": len(self),
+            "frames": self.frames,
+            "stride": self.stride,
+            "fps": self.fps,
+            "names": {str(class_id): name for class_id, name in self.names.items()},
+            "frame_indices": np.ascontiguousarray(self.frame_indices, dtype="<u4").tobytes(),
+            "boxes": np.ascontiguousarray(self.boxes, dtype="<f4").tobytes(),
+            "scores": np.ascontiguousarray(self.scores, dtype="<f4").tobytes(),
+            "class_ids": np.ascontiguousarray(self.class_ids, dtype="<u2").tobytes(),
+        }
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("detection_id", pa.int64()),
+        ("image_id", pa.int64()),
+        ("class_id", pa.uint16()),
+        ("class", pa.dictionary(pa.int32(), pa.string())),
+        ("confidence", pa.float32()),
+        ("x1", pa.float32()),
+        ("y1", pa.float32()),
+        ("x2", pa.float32()),
+        ("y2", pa.float32()),
+    ])
+
+
+def arrow_batch(rows: Iterable[Tuple[int, int, Optional[PackedResults]]]):
+    """
+    Buduje RecordBatch Arrow (jeden wiersz na wykryty obiekt) z wyników wielu detekcji
+
+    Kolumny składane są przez konkatenację tablic numpy - bez obiektów Pythona per ramka.
+    """
+    import pyarrow as pa
+
+    detection_ids, image_ids, boxes, scores, class_ids, label_indices = [], [], [], [], [], []
+    dictionary: Dict[str, int] = {}
+    for detection_id, image_id, packed in rows:
+        if packed is None or not len(packed):
+            continue
+        count = len(packed)
+        detection_ids.append(np.full(count, detection_id, dtype=np.int64))
+        image_ids.append(np.full(count, image_id, dtype=np.int64))
+        boxes.append(packed.boxes)
+        scores.append(packed.scores)
+        class_ids.append(packed.class_ids)
+        # Indeksy słownika nazw liczone per klasa, nie per ramka
+        unique, inverse = np.unique(packed.class_ids, return_inverse=True)
+        codes = np.array(
+            [dictionary.setdefault(packed.names.get(class_id, str(class_id)), len(dictionary)) for class_id in unique.tolist()],
+            dtype=np.int32
+        )
+        label_indices.append(codes[inverse])
+
+    if not scores:
+        return pa.RecordBatch.from_pylist([], schema=arrow_schema())
+
+    boxes = np.concatenate(boxes)
+    labels = pa.DictionaryArray.from_arrays(
+        pa.array(np.concatenate(label_indices)), pa.array(list(dictionary), type=pa.string())
+    )
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(np.concatenate(detection_ids)),
+            pa.array(np.concatenate(image_ids)),
+            pa.array(np.concatenate(class_ids)),
+            labels,
+            pa.array(np.concatenate(scores)),
+            pa.array(boxes[:, 0]),
+            pa.array(boxes[:, 1]),
+            pa.array(boxes[:, 2]),
+            pa.array(boxes[:, 3]),
+        ],
+        schema=arrow_schema()
+    )
+
+
+class _ChunkSink:
+    """Plik-bufor dla pyarrow.ipc - zebrane bajty odbierane są po każdej partii"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def iter_arrow_stream(batches: Iterable[Any]) -> Iterator[bytes]:
+    """Koduje kolejne RecordBatch jako strumień Arrow IPC (application/vnd.apache.arrow.stream)"""
+    import pyarrow as pa
+
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, arrow_schema())
+    yield sink.drain()
+    for batch in batches:
+        if batch.num_rows:
+            writer.write_batch(batch)
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
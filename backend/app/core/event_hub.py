@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.events import TOPICS, build_event, channel_name, parse_channel
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+Subscription = Tuple[str, str]
+
+
+class EventClient:
+    """
+    Połączenie WebSocket z własną ograniczoną kolejką i zadaniem wysyłającym
+
+    Rozsyłanie zdarzeń tylko wkłada wiadomość do kolejki klienta, więc wolny klient
+    nie blokuje pozostałych. Po zapełnieniu kolejki stosowana jest polityka:
+    drop_oldest (odrzuć najstarszą - klient dostaje najświeższy postęp),
+    drop_newest (odrzuć nową) lub disconnect (zamknij połączenie).
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, drop_policy: str):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=queue_size)
+        self.drop_policy = drop_policy
+        self.subscriptions: Set[Subscription] = set()
+        self.dropped = 0
+        self.closed = False
+        self.writer: Optional[asyncio.Task] = None
+
+    def offer(self, message: str) -> bool:
+        """Dodaje wiadomość do kolejki bez czekania; False oznacza, że klienta należy rozłączyć"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.drop_policy == "disconnect":
+            return False
+        self.dropped += 1
+        if self.drop_policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+        return True
+
+    async def run_writer(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    return
+                if self.dropped:
+                    dropped, self.dropped = self.dropped, 0
+                    await self._send(json.dumps({"status": "dropped", "count": dropped}))
+                await self._send(message)
+        except Exception as e:
+            # Zerwane połączenie lub przekroczony czas wysyłki - odbiornik zakończy sesję
+            logger.info(f"Zamknięto wysyłanie do klienta WebSocket: {str(e)}")
+            self.closed = True
+
+    async def _send(self, message: str):
+        await asyncio.wait_for(self.websocket.send_text(message), timeout=settings.WS_SEND_TIMEOUT)
+
+    async def close(self):
+        self.closed = True
+        # Wiadomość końcowa mimo pełnej kolejki
+        while True:
+            try:
+                self.queue.put_nowait(None)
+                break
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+        if self.writer is not None:
+            try:
+                await asyncio.wait_for(self.writer, timeout=settings.WS_SEND_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self.writer.cancel()
+
+
+class EventHub:
+    """
+    Rozsyła zdarzenia z kanałów Redis do klientów WebSocket bieżącego procesu API
+
+    Każda replika API subskrybuje wzorzec events:* jednym połączeniem i przekazuje
+    wiadomości tylko klientom, którzy zasubskrybowali dany temat i ID.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Subscription, Set[EventClient]] = defaultdict(set)
+        self._clients: Set[EventClient] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._redis: Optional[aioredis.Redis] = None
+
+    async def start(self):
+        self._redis = aioredis.from_url(settings.REDIS_URL)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        for client in list(self._clients):
+            await self.remove(client)
+        if self._redis is not None:
+            await self._redis.close()
+
+    def register(self, websocket: WebSocket) -> EventClient:
+        drop_policy = settings.WS_DROP_POLICY if settings.WS_DROP_POLICY in DROP_POLICIES else "drop_oldest"
+        client = EventClient(websocket, settings.WS_CLIENT_QUEUE_SIZE, drop_policy)
+        client.writer = asyncio.create_task(client.run_writer())
+        self._clients.add(client)
+        return client
+
+    async def remove(self, client: EventClient):
+        for subscription in client.subscriptions:
+            subscribers = self._subscribers.get(subscription)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscribers[subscription]
+        client.subscriptions.clear()
+        self._clients.discard(client)
+        await client.close()
+
+    def subscribe(self, client: EventClient, topic: str, key: Any):
+        if topic not in TOPICS:
+            raise ValueError(f"Nieznany temat: {topic}")
+        if key is None or key == "":
+            raise ValueError("Brak ID subskrypcji")
+        subscription = (topic, str(key))
+        client.subscriptions.add(subscription)
+        self._subscribers[subscription].add(client)
+
+    def unsubscribe(self, client: EventClient, topic: str, key: Any):
+        subscription = (topic, str(key))
+        client.subscriptions.discard(subscription)
+        subscribers = self._subscribers.get(subscription)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self._subscribers[subscription]
+
+    def dispatch(self, channel: str, message: str):
+        """Przekazuje wiadomość subskrybentom kanału (bez czekania na wysyłkę)"""
+        subscription = parse_channel(channel)
+        if subscription is None:
+            return
+        for client in list(self._subscribers.get(subscription, ())):
+            if not client.offer(message):
+                asyncio.create_task(self._disconnect_slow(client))
+
+    async def _disconnect_slow(self, client: EventClient):
+        logger.warning("Rozłączono klienta WebSocket z przepełnioną kolejką zdarzeń")
+        await self.remove(client)
+        try:
+            await client.websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def publish(self, topic: str, key: Any, status: str, data: Optional[Dict[str, Any]] = None):
+        """Publikuje zdarzenie z procesu API (trafia do wszystkich replik)"""
+        await self._redis.publish(channel_name(topic, key), build_event(topic, key, status, data))
+
+    async def _listen(self):
+        pattern = f"{settings.EVENTS_CHANNEL_PREFIX}:*"
+        delay = 1.0
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(pattern)
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel, data = message["channel"], message["data"]
+                    self.dispatch(
+                        channel.decode() if isinstance(channel, bytes) else channel,
+                        data.decode() if isinstance(data, bytes) else data
+                    )
+            except asyncio.CancelledError:
+                await pubsub.close()
+                raise
+            except Exception as e:
+                logger.error(f"Błąd subskrypcji zdarzeń Redis, ponowienie za {delay:.0f} s: {str(e)}")
+                await pubsub.close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+# Singleton instance (jeden hub na proces API)
+event_hub = EventHub()
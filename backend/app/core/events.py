@@ -0,0 +1,62 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Tematy zdarzeń - klienci WebSocket subskrybują pary (temat, ID)
+TOPICS = ("task", "training", "dataset")
+
+
+def channel_name(topic: str, key: Any) -> str:
+    return f"{settings.EVENTS_CHANNEL_PREFIX}:{topic}:{key}"
+
+
+def parse_channel(channel: str):
+    """Zwraca (temat, ID) z nazwy kanału lub None dla obcych kanałów"""
+    parts = channel.split(":", 2)
+    if len(parts) != 3 or parts[0] != settings.EVENTS_CHANNEL_PREFIX or parts[1] not in TOPICS:
+        return None
+    return parts[1], parts[2]
+
+
+def build_event(topic: str, key: Any, status: str, data: Optional[Dict[str, Any]] = None) -> str:
+    event = {"topic": topic, "id": str(key), "status": status, "timestamp": time.time()}
+    if data:
+        event["data"] = data
+    return json.dumps(event, default=str)
+
+
+def publish_event(topic: str, key: Any, status: str, data: Optional[Dict[str, Any]] = None):
+    """
+    Publikuje zdarzenie (np. postęp zadania) w kanale Redis events:<temat>:<ID>
+
+    Zdarzenia są ulotne - bez subskrybentów są odrzucane. Błąd publikacji jest tylko
+    logowany, aby problem z Redisem nie przerywał zadania.
+    """
+    try:
+        get_redis().publish(channel_name(topic, key), build_event(topic, key, status, data))
+    except redis.RedisError as e:
+        logger.warning(f"Nie udało się opublikować zdarzenia {topic}:{key}: {str(e)}")
+
+
+class ProgressPublisher:
+    """Ogranicza częstotliwość zdarzeń postępu (pierwsze i końcowe zdarzenie zawsze są wysyłane)"""
+
+    def __init__(self, topic: str, key: Any, min_interval: Optional[float] = None):
+        self.topic = topic
+        self.key = key
+        self.min_interval = settings.EVENTS_MIN_INTERVAL if min_interval is None else min_interval
+        self._last = 0.0
+
+    def __call__(self, data: Dict[str, Any], force: bool = False):
+        now = time.monotonic()
+        if force or now - self._last >= self.min_interval:
+            self._last = now
+            publish_event(self.topic, self.key, "processing", data)
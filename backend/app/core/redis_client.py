@@ -0,0 +1,25 @@
+import os
+import threading
+from typing import Optional
+
+import redis
+
+from app.core.config import settings
+
+_client: Optional[redis.Redis] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """
+    Zwraca synchroniczny klient Redis bieżącego procesu
+
+    Osobny klient na proces - połączenia nie mogą być współdzielone po fork() workera Celery.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+            _client_pid = os.getpid()
+        return _client
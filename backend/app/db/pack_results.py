@@ -0,0 +1,61 @@
+"""
+Konwersja wyników detekcji z JSON (detections.results) do formatu binarnego
+
+Rekordy przetwarzane są partiami po kluczu głównym, każda partia w osobnej krótkiej
+transakcji, więc konwersję można przerwać i wznowić. Po zakończeniu miejsce po
+kolumnie JSON odzyskuje VACUUM (lub VACUUM FULL przy wyłączności do tabeli).
+
+Użycie:
+    python -m app.db.pack_results --batch-size 5000
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, create_engine, select, update
+
+from app.core.config import settings
+from app.core.detection_codec import pack_results
+from app.models.models import Detection
+
+
+def pack_batch(connection, after_id: int, batch_size: int):
+    """Konwertuje jedną partię; zwraca (liczba rekordów, ostatnie ID)"""
+    rows = connection.execute(
+        select(Detection.id, Detection.results_json)
+        .where(Detection.id > after_id, Detection.results_packed.is_(None), Detection.results_json.isnot(None))
+        .order_by(Detection.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0, after_id
+
+    connection.execute(
+        update(Detection.__table__)
+        .where(Detection.__table__.c.id == bindparam("row_id"))
+        .values(results_packed=bindparam("packed"), results=None),
+        [{"row_id": row.id, "packed": pack_results(row.results_json)} for row in rows]
+    )
+    return len(rows), rows[-1].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Konwersja wyników detekcji JSON do formatu binarnego")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Liczba rekordów w jednej transakcji")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL)
+    converted, last_id = 0, 0
+    started = time.perf_counter()
+    while True:
+        with engine.begin() as connection:
+            count, last_id = pack_batch(connection, last_id, args.batch_size)
+        if not count:
+            break
+        converted += count
+        print(f"Skonwertowano {converted} rekordów (ostatnie ID {last_id})")
+
+    print(f"Zakończono: {converted} rekordów w {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
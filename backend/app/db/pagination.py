@@ -0,0 +1,226 @@
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+
+# Paginacja po kluczu (created_at, id) - od najnowszych rekordów. Zapytanie o kolejną
+# stronę korzysta z indeksu (created_at, id) niezależnie od głębokości, w przeciwieństwie
+# do OFFSET, który musi przeczytać i odrzucić wszystkie wcześniejsze wiersze.
+
+
+def encode_cursor(created_at: datetime, record_id: int) -> str:
+    """Koduje klucz ostatniego rekordu strony jako nieprzezroczysty kursor"""
+    payload = json.dumps([created_at.isoformat() if created_at else None, record_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Dekoduje kursor (HTTP 400 dla niepoprawnej wartości)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Niepoprawny kursor paginacji")
+
+
+def _keyset(stmt: Select, model, cursor: Optional[str]) -> Select:
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(created_at, record_id))
+    return stmt
+
+
+class _CountCache:
+    """Procesowa pamięć podręczna liczników COUNT(*) z czasem życia"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: Dict[Any, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key, value: int):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + settings.PAGINATION_COUNT_CACHE_TTL, value)
+
+
+_count_cache = _CountCache()
+
+_ESTIMATE_SQL = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)")
+
+
+def _count_key(stmt: Select):
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    return (str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items())))
+
+
+def _count_statement(stmt: Select) -> Select:
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+
+def _use_estimate(estimate: Optional[int]) -> bool:
+    return estimate is not None and estimate >= settings.PAGINATION_ESTIMATE_MIN_ROWS
+
+
+def count_total(db: Session, stmt: Select, model) -> Tuple[int, bool]:
+    """
+    Zwraca (liczba rekordów, czy wartość jest szacowana)
+
+    Bez filtrów dla dużych tabel używana jest statystyka planera (pg_class.reltuples),
+    aktualizowana przez ANALYZE/autovacuum. Z filtrami wykonywany jest COUNT(*),
+    którego wynik jest przechowywany przez PAGINATION_COUNT_CACHE_TTL sekund.
+    """
+    if stmt.whereclause is None:
+        estimate = db.execute(_ESTIMATE_SQL, {"table": model.__tablename__}).scalar()
+        if _use_estimate(estimate):
+            return int(estimate), True
+
+    key = _count_key(stmt)
+    total = _count_cache.get(key)
+    if total is None:
+        total = db.execute(_count_statement(stmt)).scalar()
+        _count_cache.set(key, total)
+    return total, False
+
+
+async def acount_total(db: AsyncSession, stmt: Select, model) -> Tuple[int, bool]:
+    """Asynchroniczny odpowiednik count_total"""
+    if stmt.whereclause is None:
+        estimate = (await db.execute(_ESTIMATE_SQL, {"table": model.__tablename__})).scalar()
+        if _use_estimate(estimate):
+            return int(estimate), True
+
+    key = _count_key(stmt)
+    total = _count_cache.get(key)
+    if total is None:
+        total = (await db.execute(_count_statement(stmt))).scalar()
+        _count_cache.set(key, total)
+    return total, False
+
+
+def _page_statement(stmt: Select, model, limit: int, cursor: Optional[str], skip: int) -> Select:
+    page_stmt = _keyset(stmt, model, cursor)
+    if skip and not cursor:
+        page_stmt = page_stmt.offset(skip)
+    # Jeden dodatkowy wiersz mówi, czy istnieje kolejna strona
+    return page_stmt.limit(limit + 1)
+
+
+def _page(items: List[Any], limit: int) -> Dict[str, Any]:
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return {"items": items, "next_cursor": next_cursor, "total": None, "total_estimated": False}
+
+
+def _clamp_limit(limit: int) -> int:
+    return max(1, min(limit, settings.PAGINATION_MAX_LIMIT))
+
+
+def paginate(
+    db: Session,
+    stmt: Select,
+    model,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    with_total: bool = True
+) -> Dict[str, Any]:
+    """
+    Zwraca stronę wyników: {"items", "next_cursor", "total", "total_estimated"}
+
+    Args:
+        stmt: select(model) z filtrami, bez sortowania
+        cursor: Kursor z poprzedniej strony (next_cursor)
+        skip: Przesunięcie OFFSET, zachowane dla zgodności wstecznej (ignorowane przy kursorze)
+    """
+    limit = _clamp_limit(limit)
+    page = _page(db.execute(_page_statement(stmt, model, limit, cursor, skip)).scalars().all(), limit)
+    if with_total:
+        page["total"], page["total_estimated"] = count_total(db, stmt, model)
+    return page
+
+
+async def apaginate(
+    db: AsyncSession,
+    stmt: Select,
+    model,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    with_total: bool = True
+) -> Dict[str, Any]:
+    """Asynchroniczny odpowiednik paginate"""
+    limit = _clamp_limit(limit)
+    result = await db.execute(_page_statement(stmt, model, limit, cursor, skip))
+    page = _page(result.scalars().all(), limit)
+    if with_total:
+        page["total"], page["total_estimated"] = await acount_total(db, stmt, model)
+    return page
+
+
+def iter_batches(
+    db: Session,
+    stmt: Select,
+    model,
+    batch_size: Optional[int] = None
+) -> Iterator[List[Any]]:
+    """
+    Przechodzi całą tabelę partiami (po kluczu), zwracając listy obiektów
+
+    Każda partia to osobne krótkie zapytanie, więc eksport nie trzyma otwartej
+    transakcji ani kursora przez cały czas przesyłania odpowiedzi.
+    """
+    batch_size = batch_size or settings.PAGINATION_STREAM_BATCH_SIZE
+    cursor = None
+    while True:
+        items = db.execute(_keyset(stmt, model, cursor).limit(batch_size)).scalars().all()
+        if not items:
+            return
+        yield items
+        if len(items) < batch_size:
+            return
+        cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        # Zakończ transakcję odczytu i zwolnij obiekty z mapy tożsamości sesji -
+        # strumień może obejmować miliony wierszy i trwać dowolnie długo
+        db.rollback()
+        db.expunge_all()
+
+
+def iter_ndjson(
+    db: Session,
+    stmt: Select,
+    model,
+    schema: Type[BaseModel],
+    batch_size: Optional[int] = None
+) -> Iterator[str]:
+    """Przechodzi całą tabelę partiami (po kluczu), zwracając wiersze NDJSON"""
+    for items in iter_batches(db, stmt, model, batch_size):
+        yield "".join(schema.from_orm(item).json() + "\n" for item in items)
@@ -0,0 +1,152 @@
+"""
+Regresja planów zapytań dla najczęstszych ścieżek dostępu
+
+Dla każdego zapytania z katalogu wykonywany jest EXPLAIN (FORMAT JSON) i sprawdzane,
+czy planer używa oczekiwanego indeksu zamiast skanu sekwencyjnego. Wymaga bazy
+PostgreSQL ze schematem po `alembic upgrade head` (DATABASE_URL).
+
+Użycie (lokalny Postgres, np. z docker-compose):
+    python -m app.db.query_plans --seed 200000
+
+Z --seed dane syntetyczne wstawiane są w transakcji, która jest wycofywana po
+sprawdzeniu planów - baza pozostaje bez zmian. Kod wyjścia 1 oznacza regresję.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import create_engine, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.models.models import Annotation, Detection, Image, Training
+
+PAGE = 101  # limit + 1, jak w app.db.pagination
+CURSOR = tuple_(text("'2030-01-01'::timestamptz"), 1000000000)
+PENDING_STATUSES = ("created", "processing")
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    statement: Any
+    index: str
+
+
+def _page(model, *filters):
+    stmt = select(model).where(*filters)
+    return stmt.order_by(model.created_at.desc(), model.id.desc()).limit(PAGE)
+
+
+CHECKS: List[PlanCheck] = [
+    PlanCheck("obrazy - strona listy", _page(Image), "ix_images_created_at_id"),
+    PlanCheck(
+        "obrazy - kolejna strona (kursor)",
+        _page(Image, tuple_(Image.created_at, Image.id) < CURSOR),
+        "ix_images_created_at_id"
+    ),
+    PlanCheck("obrazy datasetu - strona listy", _page(Image, Image.dataset_id == 1), "ix_images_dataset_id_created_at_id"),
+    PlanCheck("adnotacje obrazu", _page(Annotation, Annotation.image_id == 1), "ix_annotations_image_id_created_at_id"),
+    PlanCheck("adnotacje klasy", _page(Annotation, Annotation.class_id == 1), "ix_annotations_class_id_created_at_id"),
+    PlanCheck("detekcje obrazu", _page(Detection, Detection.image_id == 1), "ix_detections_image_id_created_at_id"),
+    PlanCheck("detekcje modelu", _page(Detection, Detection.model_id == 1), "ix_detections_model_id_created_at_id"),
+    PlanCheck(
+        "oczekujące detekcje (najstarsze)",
+        select(Detection).where(Detection.status.in_(PENDING_STATUSES)).order_by(Detection.created_at).limit(100),
+        "ix_detections_pending_created_at"
+    ),
+    PlanCheck(
+        "oczekujące trenowania (najstarsze)",
+        select(Training).where(Training.status.in_(PENDING_STATUSES)).order_by(Training.created_at).limit(100),
+        "ix_trainings_pending_created_at"
+    ),
+    PlanCheck("trenowania datasetu", select(Training).where(Training.dataset_id == 1), "ix_trainings_dataset_id"),
+]
+
+# Dane syntetyczne - rozkład zbliżony do produkcyjnego (wiele adnotacji na obraz,
+# niewielki odsetek oczekujących zadań)
+SEED_SQL = """
+INSERT INTO datasets (id, name, format) SELECT g, 'ds-' || g, 'YOLO' FROM generate_series(1000001, 1000050) g;
+INSERT INTO classes (id, name) SELECT g, 'cls-' || g FROM generate_series(1000001, 1000080) g;
+INSERT INTO models (id, name, status) SELECT g, 'model-' || g, 'trained' FROM generate_series(1000001, 1000005) g;
+INSERT INTO images (id, name, path, width, height, format, size, dataset_id, created_at)
+    SELECT g, 'img-' || g, 'img-' || g || '.jpg', 640, 480, 'jpg', 100000, 1000001 + g % 50,
+           now() - (g || ' seconds')::interval
+    FROM generate_series(1000001, 1000000 + :rows) g;
+INSERT INTO annotations (x, y, width, height, format, image_id, class_id, created_at)
+    SELECT 0.5, 0.5, 0.1, 0.1, 'YOLO', 1000001 + g % :rows, 1000001 + g % 80, now() - (g || ' seconds')::interval
+    FROM generate_series(1, 3 * :rows) g;
+INSERT INTO detections (status, image_id, model_id, created_at)
+    SELECT CASE WHEN g % 100 = 0 THEN 'created' ELSE 'completed' END, 1000001 + g % :rows, 1000001 + g % 5,
+           now() - (g || ' seconds')::interval
+    FROM generate_series(1, :rows) g;
+INSERT INTO trainings (name, status, dataset_id, model_id, created_at)
+    SELECT 'tr-' || g, CASE WHEN g % 200 = 0 THEN 'processing' ELSE 'completed' END, 1000001 + g % 50,
+           1000001 + g % 5, now() - (g || ' seconds')::interval
+    FROM generate_series(1, :rows / 20) g;
+"""
+
+
+def _walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(connection: Connection, statement) -> Dict[str, Any]:
+    """Zwraca plan zapytania (EXPLAIN FORMAT JSON) dla instrukcji SQLAlchemy"""
+    sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    return connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+
+
+def check_plan(plan: Dict[str, Any], index: str) -> Optional[str]:
+    """Zwraca opis problemu lub None, jeśli plan używa oczekiwanego indeksu"""
+    nodes = list(_walk(plan))
+    if any(node.get("Index Name") == index for node in nodes):
+        return None
+    used = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+    scans = sorted({node["Relation Name"] for node in nodes if node.get("Node Type") == "Seq Scan"})
+    return f"brak {index} (indeksy: {used or '-'}, Seq Scan: {scans or '-'})"
+
+
+def seed(connection: Connection, rows: int):
+    for statement in filter(str.strip, SEED_SQL.split(";")):
+        connection.execute(text(statement), {"rows": rows})
+    for table in ("datasets", "classes", "models", "images", "annotations", "detections", "trainings"):
+        connection.execute(text(f"ANALYZE {table}"))
+
+
+def run(rows: int = 0, verbose: bool = False) -> int:
+    engine = create_engine(str(settings.DATABASE_URL))
+    failures = 0
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            if rows:
+                seed(connection, rows)
+            for check in CHECKS:
+                plan = explain(connection, check.statement)
+                problem = check_plan(plan, check.index)
+                failures += problem is not None
+                print(f"{'OK  ' if problem is None else 'FAIL'} {check.name}" + (f": {problem}" if problem else ""))
+                if verbose or problem:
+                    print(json.dumps(plan, indent=2))
+        finally:
+            transaction.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sprawdzenie planów zapytań dla gorących ścieżek")
+    parser.add_argument("--seed", type=int, default=0, help="Liczba syntetycznych obrazów (0 = bez danych testowych)")
+    parser.add_argument("--verbose", action="store_true", help="Wypisz pełne plany")
+    args = parser.parse_args()
+
+    failures = run(args.seed, args.verbose)
+    print(f"\n{len(CHECKS) - failures}/{len(CHECKS)} zapytań używa oczekiwanych indeksów")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,28 @@
+from fastapi import HTTPException
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-# Tworzenie silnika SQLAlchemy
-engine = create_engine(str(settings.DATABASE_URL))
+# Wspólne ustawienia puli połączeń dla silnika synchronicznego i asynchronicznego
+POOL_OPTIONS = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+# Tworzenie silnika SQLAlchemy (Celery, zapisy i endpointy synchroniczne)
+engine = create_engine(str(settings.DATABASE_URL), **POOL_OPTIONS)
+
+# Silnik asynchroniczny (asyncpg) dla endpointów odczytu - nie zajmuje wątków z puli
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL, **POOL_OPTIONS)
 
 # Tworzenie sesji
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Bazowa klasa dla modeli
 Base = declarative_base()
@@ -19,3 +34,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Asynchroniczny odpowiednik get_db
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_or_404(db: AsyncSession, model, record_id: int, detail: str):
+    """Pobiera rekord po kluczu głównym lub zgłasza HTTP 404"""
+    record = await db.get(model, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return record
@@ -3,6 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.api.api_v1.api import api_router
 from app.core.config import settings
+from app.services.minio_service import minio_service
+from app.db.session import async_engine
+from app.core.event_hub import event_hub
+from starlette.concurrency import run_in_threadpool
 import logging
 
 # Konfiguracja loggera
@@ -30,6 +34,25 @@ app.add_middleware(
 # Dodanie routerów API
 app.include_router(api_router, prefix="/api/v1")
 
+# Jednorazowe sprawdzenie/utworzenie bucketów MinIO
+@app.on_event("startup")
+async def create_buckets():
+    await run_in_threadpool(minio_service.create_buckets)
+
+# Subskrypcja zdarzeń z workerów (Redis pub/sub) dla klientów WebSocket
+@app.on_event("startup")
+async def start_event_hub():
+    await event_hub.start()
+
+@app.on_event("shutdown")
+async def stop_event_hub():
+    await event_hub.stop()
+
+# Zamknięcie połączeń puli asynchronicznej
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
 # Endpoint zdrowia
 @app.get("/health")
 def health_check():
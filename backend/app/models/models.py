@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, JSON, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, JSON, Boolean, Text, Index, LargeBinary, BigInteger, text
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, expression
 from app.db.session import Base
+from app.core.detection_codec import PackedResults, load_packed
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        Index("ix_images_created_at_id", "created_at", "id"),
+        Index("ix_images_dataset_id_created_at_id", "dataset_id", "created_at", "id"),
+        # Obrazy oczekujące na miniatury - tylko niewielka część tabeli
+        Index("ix_images_pending_thumbnails", "dataset_id", "id", postgresql_where=text("NOT has_thumbnails")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -13,6 +20,10 @@ class Image(Base):
     height = Column(Integer)
     format = Column(String)
     size = Column(Integer)  # rozmiar w bajtach
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 treści pliku
+    is_labeled = Column(Boolean, nullable=False, default=False, server_default=expression.false())
+    has_thumbnails = Column(Boolean, nullable=False, default=False, server_default=expression.false())
+    thumbnail_key = Column(String(80), nullable=True)  # prefiks kluczy miniatur (thumbnails/<klucz>/...)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -24,6 +35,9 @@ class Image(Base):
 
 class Dataset(Base):
     __tablename__ = "datasets"
+    __table_args__ = (
+        Index("ix_datasets_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -35,9 +49,29 @@ class Dataset(Base):
     # Relacje
     images = relationship("Image", back_populates="dataset")
     trainings = relationship("Training", back_populates="dataset")
+    stats = relationship("DatasetStats", back_populates="dataset", uselist=False, cascade="all, delete-orphan")
+
+class DatasetStats(Base):
+    """Statystyki datasetu utrzymywane przyrostowo przy zapisach obrazów i adnotacji"""
+    __tablename__ = "dataset_stats"
+
+    dataset_id = Column(Integer, ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    images_count = Column(Integer, nullable=False, default=0)
+    labeled_images_count = Column(Integer, nullable=False, default=0)
+    annotations_count = Column(Integer, nullable=False, default=0)
+    class_counts = Column(JSON, nullable=False, default=dict)  # {class_id: liczba ramek}
+    box_size_histogram = Column(JSON, nullable=False, default=list)  # liczności w przedziałach BOX_SIZE_BINS
+    annotations_revision = Column(BigInteger, nullable=False, default=0, server_default="0")  # zwiększany przy każdym zapisie adnotacji
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relacje
+    dataset = relationship("Dataset", back_populates="stats")
 
 class Class(Base):
     __tablename__ = "classes"
+    __table_args__ = (
+        Index("ix_classes_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -50,6 +84,11 @@ class Class(Base):
 
 class Annotation(Base):
     __tablename__ = "annotations"
+    __table_args__ = (
+        Index("ix_annotations_created_at_id", "created_at", "id"),
+        Index("ix_annotations_image_id_created_at_id", "image_id", "created_at", "id"),
+        Index("ix_annotations_class_id_created_at_id", "class_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     x = Column(Float)  # współrzędna x lewego górnego rogu (lub środka dla YOLO)
@@ -88,6 +127,13 @@ class Model(Base):
 
 class Training(Base):
     __tablename__ = "trainings"
+    __table_args__ = (
+        Index("ix_trainings_created_at_id", "created_at", "id"),
+        Index("ix_trainings_dataset_id", "dataset_id"),
+        Index("ix_trainings_model_id", "model_id"),
+        # Kolejka zadań oczekujących - tylko niewielka część tabeli
+        Index("ix_trainings_pending_created_at", "created_at", postgresql_where=text("status IN ('created', 'processing')")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -108,9 +154,16 @@ class Training(Base):
 
 class Detection(Base):
     __tablename__ = "detections"
+    __table_args__ = (
+        Index("ix_detections_created_at_id", "created_at", "id"),
+        Index("ix_detections_image_id_created_at_id", "image_id", "created_at", "id"),
+        Index("ix_detections_model_id_created_at_id", "model_id", "created_at", "id"),
+        Index("ix_detections_pending_created_at", "created_at", postgresql_where=text("status IN ('created', 'processing')")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    results = Column(JSON, nullable=True)
+    results_packed = Column(LargeBinary, nullable=True)  # format z app.core.detection_codec
+    results_json = Column("results", JSON, nullable=True)  # rekordy sprzed wprowadzenia results_packed
     status = Column(String)  # created, processing, completed, failed
     error = Column(Text, nullable=True)
     processing_time = Column(Float, nullable=True)
@@ -122,3 +175,65 @@ class Detection(Base):
     image = relationship("Image", back_populates="detections")
     model_id = Column(Integer, ForeignKey("models.id"))
     model = relationship("Model", back_populates="detections")
+
+    @property
+    def packed(self) -> PackedResults:
+        """Wyniki jako tablice kolumnowe (bez budowania słowników obiektów)"""
+        return load_packed(self.results_packed, self.results_json)
+
+    @property
+    def results(self):
+        """Wyniki w formacie API ({"objects": [...], "processing_time"}), dekodowane przy odczycie"""
+        packed = self.packed
+        return packed.to_dict() if packed is not None else None
+
+    @results.setter
+    def results(self, value):
+        if isinstance(value, PackedResults):
+            self.results_packed = value.to_bytes()
+        else:
+            self.results_packed = PackedResults.from_dict(value).to_bytes() if value is not None else None
+        self.results_json = None
+
+class DetectionCacheEntry(Base):
+    """Trwała kopia cache wyników detekcji (źródło zapasowe dla Redis)"""
+    __tablename__ = "detection_cache"
+
+    key = Column(String, primary_key=True)  # skrót obrazu, model, wersja i progi
+    content_hash = Column(String(64), nullable=False, index=True)
+    model_id = Column(Integer, ForeignKey("models.id", ondelete="CASCADE"), nullable=False, index=True)
+    results_packed = Column(LargeBinary, nullable=False)  # format z app.core.detection_codec
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    # Relacje
+    detection_id = Column(Integer, ForeignKey("detections.id", ondelete="SET NULL"), nullable=True)
+
+class VideoDetection(Base):
+    """Zadanie detekcji na klatkach pliku wideo (wyniki klatek w buckecie videos)"""
+    __tablename__ = "video_detections"
+    __table_args__ = (
+        Index("ix_video_detections_created_at_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    path = Column(String)  # obiekt wideo w buckecie videos
+    size = Column(BigInteger, nullable=True)
+    status = Column(String)  # created, processing, completed, failed
+    error = Column(Text, nullable=True)
+    config = Column(JSON, nullable=True)  # frame_stride, conf_threshold, iou_threshold
+    frames_total = Column(Integer, nullable=True)
+    frames_processed = Column(Integer, nullable=True)
+    objects = Column(Integer, nullable=True)
+    video_fps = Column(Float, nullable=True)
+    throughput_fps = Column(Float, nullable=True)  # przetworzone klatki na sekundę
+    stats = Column(JSON, nullable=True)  # czasy dekodowania, inferencji i zapisu
+    results_path = Column(String, nullable=True)  # plik VideoResults (app.core.detection_codec)
+    processing_time = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relacje
+    model_id = Column(Integer, ForeignKey("models.id"))
+    model = relationship("Model")
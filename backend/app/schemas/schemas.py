@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -16,6 +16,9 @@ class ImageResponse(ImageBase):
     id: int
     path: str
     size: Optional[int] = None
+    content_hash: Optional[str] = None
+    is_labeled: bool = False
+    has_thumbnails: bool = False
     created_at: datetime
     updated_at: Optional[datetime] = None
     dataset_id: Optional[int] = None
@@ -25,7 +28,9 @@ class ImageResponse(ImageBase):
 
 class ImageList(BaseModel):
     items: List[ImageResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
 
 # Schematy dla datasetów
 class DatasetBase(BaseModel):
@@ -46,7 +51,50 @@ class DatasetResponse(DatasetBase):
 
 class DatasetList(BaseModel):
     items: List[DatasetResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
+
+class DatasetImages(BaseModel):
+    image_ids: List[int]
+
+class ClassCount(BaseModel):
+    class_id: int
+    name: Optional[str] = None
+    count: int
+
+class DatasetStatsResponse(BaseModel):
+    dataset_id: int
+    images_count: int
+    labeled_images_count: int
+    annotations_count: int
+    classes: List[ClassCount]
+    unclassified_count: int = 0  # adnotacje bez klasy (class_id NULL)
+    box_size_bins: List[float]  # granice przedziałów sqrt(pole ramki / pole obrazu)
+    box_size_histogram: List[int]
+    imbalance_ratio: Optional[float] = None
+    class_entropy: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
+class DatasetStatsSummary(BaseModel):
+    datasets_count: int
+    images_count: int
+    labeled_images_count: int
+    annotations_count: int
+
+class DatasetImportCreate(BaseModel):
+    object_name: str  # archiwum ZIP/tar w buckecie datasets
+    format: Optional[str] = None  # YOLO, COCO, VOC (domyślnie format datasetu)
+
+class DatasetExportCreate(BaseModel):
+    format: Optional[str] = None  # YOLO, COCO, VOC (domyślnie format datasetu)
+    archive: str = Field("zip", regex="^(zip|tar)$")
+
+class TaskStatus(BaseModel):
+    task_id: str
+    status: str
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
 
 # Schematy dla klas
 class ClassBase(BaseModel):
@@ -66,7 +114,9 @@ class ClassResponse(ClassBase):
 
 class ClassList(BaseModel):
     items: List[ClassResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
 
 # Schematy dla adnotacji
 class AnnotationBase(BaseModel):
@@ -91,7 +141,22 @@ class AnnotationResponse(AnnotationBase):
 
 class AnnotationList(BaseModel):
     items: List[AnnotationResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
+
+class AnnotationUpsert(BaseModel):
+    id: Optional[int] = None  # ID istniejącej adnotacji (brak = nowa adnotacja)
+    x: float
+    y: float
+    width: float
+    height: float
+    format: str
+    class_id: int
+
+class ImageAnnotationsReplace(BaseModel):
+    image_id: int
+    annotations: List[AnnotationUpsert]
 
 # Schematy dla modeli
 class ModelBase(BaseModel):
@@ -118,7 +183,9 @@ class ModelResponse(ModelBase):
 
 class ModelList(BaseModel):
     items: List[ModelResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
 
 # Schematy dla trenowania
 class TrainingBase(BaseModel):
@@ -146,7 +213,9 @@ class TrainingResponse(TrainingBase):
 
 class TrainingList(BaseModel):
     items: List[TrainingResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
 
 # Schematy dla detekcji
 class DetectionBase(BaseModel):
@@ -170,4 +239,55 @@ class DetectionResponse(DetectionBase):
 
 class DetectionList(BaseModel):
     items: List[DetectionResponse]
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False  # total z pg_class.reltuples zamiast COUNT
+    next_cursor: Optional[str] = None
+
+class VideoDetectionResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    model_id: int
+    status: str
+    error: Optional[str] = None
+    config: Optional[Dict[str, Any]] = None
+    frames_total: Optional[int] = None
+    frames_processed: Optional[int] = None
+    objects: Optional[int] = None
+    video_fps: Optional[float] = None
+    throughput_fps: Optional[float] = None
+    stats: Optional[Dict[str, Any]] = None
+    processing_time: Optional[float] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class BulkDetectionCreate(BaseModel):
+    model_id: int
+    dataset_id: Optional[int] = None
+    image_ids: Optional[List[int]] = None
+    chunk_size: Optional[int] = Field(None, ge=1, le=1000)
+    conf_threshold: Optional[float] = Field(None, ge=0, le=1)
+    iou_threshold: Optional[float] = Field(None, ge=0, le=1)
+    tile_size: Optional[int] = Field(None, ge=64, le=4096)  # detekcja kafelkowa (obrazy wysokiej rozdzielczości)
+    tile_overlap: Optional[float] = Field(None, ge=0, lt=1)
+
+    @root_validator
+    def check_source(cls, values):
+        if (values.get("dataset_id") is None) == (values.get("image_ids") is None):
+            raise ValueError("Należy podać dokładnie jedno z pól: dataset_id lub image_ids")
+        return values
+
+class BulkDetectionStatus(BaseModel):
+    job_id: str
+    status: str
+    model_id: int
+    total_images: int
+    processed_images: int
+    failed_images: int
+    total_chunks: int
+    completed_chunks: int
+    failed_chunks: int
+    progress: float
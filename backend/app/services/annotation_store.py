@@ -0,0 +1,310 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import Annotation, DatasetStats, Image
+from app.services.annotation_utils import to_xyxy
+
+logger = logging.getLogger(__name__)
+
+# Pliki migawki jednego datasetu (tablice .npy odczytywane przez mmap)
+COLUMNS = ("ids", "image_ids", "class_ids", "boxes")
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+# Partia przy pobieraniu pełnych wierszy adnotacji
+LOAD_BATCH_SIZE = 50000
+
+
+class ColumnarAnnotations:
+    """
+    Adnotacje datasetu w układzie kolumnowym (posortowane po ID adnotacji)
+
+    boxes - float32 (N, 4): (x1, y1, x2, y2) znormalizowane do wymiarów obrazu,
+    bez przycinania (ramki wychodzące poza obraz zachowują współrzędne > 1 lub < 0).
+    class_ids - ID klas z bazy (Class.id), nie indeksy modelu.
+    """
+
+    __slots__ = ("ids", "image_ids", "class_ids", "boxes", "revision")
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        image_ids: np.ndarray,
+        class_ids: np.ndarray,
+        boxes: np.ndarray,
+        revision: Optional[int] = None
+    ):
+        self.ids = ids
+        self.image_ids = image_ids
+        self.class_ids = class_ids
+        self.boxes = boxes
+        self.revision = revision
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls, revision: Optional[int] = None) -> "ColumnarAnnotations":
+        return cls(
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32),
+            np.empty((0, 4), dtype=np.float32), revision
+        )
+
+    def class_indices(self, classes: Optional[List[int]] = None) -> Tuple[np.ndarray, List[int]]:
+        """
+        Zwraca indeksy klas 0..K-1 (np. dla YOLO) i kolejność ID klas
+
+        Bez listy classes kolejność to posortowane ID klas występujących w datasecie.
+        Adnotacje klas spoza listy dostają indeks -1.
+        """
+        classes = np.unique(self.class_ids).tolist() if classes is None else list(classes)
+        if not classes:
+            return np.full(len(self), -1, dtype=np.int32), classes
+
+        order = np.asarray(classes, dtype=np.int64)
+        sorter = np.argsort(order)
+        position = np.minimum(np.searchsorted(order, self.class_ids, sorter=sorter), len(order) - 1)
+        indices = sorter[position]
+        return np.where(order[indices] == self.class_ids, indices, -1).astype(np.int32), classes
+
+    def yolo_boxes(self) -> np.ndarray:
+        """Ramki (cx, cy, w, h) przycięte do obrazu, float32"""
+        boxes = np.clip(self.boxes, 0.0, 1.0)
+        width = boxes[:, 2] - boxes[:, 0]
+        height = boxes[:, 3] - boxes[:, 1]
+        return np.stack([boxes[:, 0] + width / 2, boxes[:, 1] + height / 2, width, height], axis=1).astype(np.float32)
+
+    def group_by_image(self) -> Dict[int, np.ndarray]:
+        """Zwraca indeksy wierszy dla każdego obrazu"""
+        if not len(self):
+            return {}
+        order = np.argsort(self.image_ids, kind="stable")
+        image_ids, starts = np.unique(self.image_ids[order], return_index=True)
+        return {
+            int(image_id): rows
+            for image_id, rows in zip(image_ids.tolist(), np.split(order, starts[1:]))
+        }
+
+
+def normalized_boxes(
+    x: np.ndarray,
+    y: np.ndarray,
+    width: np.ndarray,
+    height: np.ndarray,
+    formats: np.ndarray,
+    image_width: np.ndarray,
+    image_height: np.ndarray
+) -> np.ndarray:
+    """Konwertuje adnotacje w mieszanych formatach do (x1, y1, x2, y2) znormalizowanych, float32"""
+    boxes = to_xyxy(x, y, width, height, formats, image_width, image_height)
+    scale_w = np.maximum(image_width, 1)
+    scale_h = np.maximum(image_height, 1)
+    return (boxes / np.stack([scale_w, scale_h, scale_w, scale_h], axis=1)).astype(np.float32)
+
+
+class AnnotationStore:
+    """
+    Kolumnowe migawki adnotacji datasetów (tablice .npy w ANNOTATION_STORE_DIR)
+
+    Migawka jest ważna, dopóki DatasetStats.annotations_revision (zwiększany przy każdym
+    zapisie adnotacji datasetu) się nie zmieni. Odświeżenie jest przyrostowe: z bazy
+    pobierane są ID i znaczniki czasu wszystkich adnotacji, a pełne wiersze tylko dla
+    nowych i zmienionych. Nowa wersja zapisywana jest w osobnym katalogu i podmieniana
+    atomowo dowiązaniem "current" - otwarte mapowania starszej wersji pozostają ważne.
+    """
+
+    def __init__(self, db: Session, root: Optional[str] = None):
+        self.db = db
+        self.root = root or settings.ANNOTATION_STORE_DIR
+
+    def _dataset_dir(self, dataset_id: int) -> str:
+        return os.path.join(self.root, str(dataset_id))
+
+    def _current_dir(self, dataset_id: int) -> str:
+        return os.path.join(self._dataset_dir(dataset_id), "current")
+
+    def _revision(self, dataset_id: int) -> Optional[int]:
+        return self.db.execute(
+            select(DatasetStats.annotations_revision).where(DatasetStats.dataset_id == dataset_id)
+        ).scalar_one_or_none()
+
+    def _read_manifest(self, dataset_id: int) -> Optional[dict]:
+        # Dowiązanie rozwiązywane raz - wszystkie pliki pochodzą z tej samej wersji
+        directory = os.path.realpath(self._current_dir(dataset_id))
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format_version") != FORMAT_VERSION:
+            return None
+        manifest["directory"] = directory
+        return manifest
+
+    def _open(self, manifest: dict) -> ColumnarAnnotations:
+        directory = manifest["directory"]
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in COLUMNS]
+        return ColumnarAnnotations(*arrays, revision=manifest["revision"])
+
+    def load(self, dataset_id: int, refresh: bool = True) -> ColumnarAnnotations:
+        """
+        Zwraca adnotacje datasetu (tablice mapowane z dysku)
+
+        Przy refresh=True nieaktualna migawka jest najpierw odświeżana.
+        """
+        manifest = self._read_manifest(dataset_id)
+        if refresh and (manifest is None or manifest["revision"] != self._revision(dataset_id)):
+            return self.refresh(dataset_id)
+        if manifest is None:
+            return ColumnarAnnotations.empty()
+        try:
+            return self._open(manifest)
+        except OSError:
+            # Wersja usunięta przez równoległe odświeżenie
+            if not refresh:
+                raise
+            return self.refresh(dataset_id)
+
+    def refresh(self, dataset_id: int, full: bool = False) -> ColumnarAnnotations:
+        """Odświeża migawkę datasetu (pod blokadą pliku - jedna aktualizacja naraz)"""
+        os.makedirs(self._dataset_dir(dataset_id), exist_ok=True)
+        with open(os.path.join(self._dataset_dir(dataset_id), ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Numer wersji odczytywany przed danymi - migawka jest co najmniej tak świeża
+            revision = self._revision(dataset_id)
+            manifest = None if full else self._read_manifest(dataset_id)
+            if manifest is not None and manifest["revision"] == revision:
+                return self._open(manifest)
+
+            started = self.db.execute(select(func.now())).scalar_one()
+            previous = self._open(manifest) if manifest is not None else None
+            watermark = datetime.fromisoformat(manifest["watermark"]) if manifest is not None else None
+            annotations = self._build(dataset_id, previous, watermark)
+            annotations.revision = revision
+
+            # Zmiany z transakcji rozpoczętych przed odczytem mogą mieć wcześniejsze znaczniki czasu
+            margin = timedelta(seconds=settings.ANNOTATION_STORE_WATERMARK_MARGIN)
+            self._write(dataset_id, annotations, {
+                "format_version": FORMAT_VERSION,
+                "revision": revision,
+                "watermark": (started - margin).isoformat(),
+                "count": len(annotations),
+                "built_at": started.isoformat(),
+            })
+            logger.info(
+                f"Odświeżono migawkę adnotacji datasetu {dataset_id}: {len(annotations)} ramek "
+                f"({'przyrostowo' if previous is not None else 'w całości'})"
+            )
+            return self._open(self._read_manifest(dataset_id))
+
+    def _build(
+        self,
+        dataset_id: int,
+        previous: Optional[ColumnarAnnotations],
+        watermark: Optional[datetime]
+    ) -> ColumnarAnnotations:
+        changed_at = func.coalesce(Annotation.updated_at, Annotation.created_at)
+        if previous is None:
+            return self._fetch(Image.dataset_id == dataset_id)
+
+        # ID wszystkich adnotacji datasetu i ID zmienionych od ostatniej migawki
+        rows = self.db.execute(
+            select(Annotation.id, changed_at >= watermark)
+            .join(Image, Annotation.image_id == Image.id)
+            .where(Image.dataset_id == dataset_id)
+        ).all()
+        current = np.array([row[0] for row in rows], dtype=np.int64)
+        modified = np.array([row[0] for row in rows if row[1]], dtype=np.int64)
+
+        # Nowe w datasecie (także przeniesione obrazy ze starszymi adnotacjami) i zmienione
+        fetch_ids = np.union1d(np.setdiff1d(current, previous.ids, assume_unique=True), modified)
+        keep = np.isin(previous.ids, current, assume_unique=True) & ~np.isin(previous.ids, fetch_ids, assume_unique=True)
+
+        fetched = [
+            self._fetch(Annotation.id.in_(chunk.tolist()))
+            for chunk in np.array_split(fetch_ids, max(1, -(-len(fetch_ids) // LOAD_BATCH_SIZE)))
+            if len(chunk)
+        ]
+        return _sorted_concat([_take(previous, keep)] + fetched)
+
+    def _fetch(self, *filters) -> ColumnarAnnotations:
+        result = self.db.execute(
+            select(
+                Annotation.id, Annotation.image_id, Annotation.class_id,
+                Annotation.x, Annotation.y, Annotation.width, Annotation.height, Annotation.format,
+                Image.width, Image.height
+            )
+            .join(Image, Annotation.image_id == Image.id)
+            .where(*filters)
+            .order_by(Annotation.id)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        parts = []
+        for partition in result.partitions():
+            columns = list(zip(*partition))
+            numeric = [np.nan_to_num(np.array(values, dtype=np.float64)) for values in columns[3:7]]
+            parts.append(ColumnarAnnotations(
+                np.array(columns[0], dtype=np.int64),
+                np.array(columns[1], dtype=np.int64),
+                np.array([value if value is not None else -1 for value in columns[2]], dtype=np.int32),
+                normalized_boxes(
+                    *numeric,
+                    np.array([value or "" for value in columns[7]]),
+                    np.array([value or 0 for value in columns[8]], dtype=np.float64),
+                    np.array([value or 0 for value in columns[9]], dtype=np.float64)
+                )
+            ))
+        return _sorted_concat(parts)
+
+    def _write(self, dataset_id: int, annotations: ColumnarAnnotations, manifest: dict):
+        dataset_dir = self._dataset_dir(dataset_id)
+        version = f"v-{uuid.uuid4().hex}"
+        directory = os.path.join(dataset_dir, version)
+        os.makedirs(directory)
+        for name in COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(annotations, name)))
+        with open(os.path.join(directory, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+
+        # Atomowa podmiana dowiązania, następnie usunięcie starszych wersji
+        link = os.path.join(dataset_dir, f".current-{version}")
+        os.symlink(version, link)
+        os.replace(link, self._current_dir(dataset_id))
+        for entry in os.listdir(dataset_dir):
+            if entry.startswith("v-") and entry != version:
+                shutil.rmtree(os.path.join(dataset_dir, entry), ignore_errors=True)
+
+    def drop(self, dataset_id: int):
+        """Usuwa migawkę datasetu (np. po usunięciu datasetu)"""
+        shutil.rmtree(self._dataset_dir(dataset_id), ignore_errors=True)
+
+
+def _take(annotations: ColumnarAnnotations, mask: np.ndarray) -> ColumnarAnnotations:
+    return ColumnarAnnotations(
+        annotations.ids[mask], annotations.image_ids[mask], annotations.class_ids[mask], annotations.boxes[mask]
+    )
+
+
+def _sorted_concat(parts: Iterable[ColumnarAnnotations]) -> ColumnarAnnotations:
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return ColumnarAnnotations.empty()
+    ids = np.concatenate([part.ids for part in parts])
+    order = np.argsort(ids, kind="stable")
+    return ColumnarAnnotations(
+        ids[order],
+        np.concatenate([part.image_ids for part in parts])[order],
+        np.concatenate([part.class_ids for part in parts])[order],
+        np.concatenate([part.boxes for part in parts])[order]
+    )
@@ -0,0 +1,57 @@
+import numpy as np
+
+# Annotation.format: YOLO przechowuje środek i rozmiar znormalizowane do [0, 1],
+# COCO i VOC - lewy górny róg i rozmiar w pikselach
+
+
+def to_xyxy(
+    x: np.ndarray,
+    y: np.ndarray,
+    width: np.ndarray,
+    height: np.ndarray,
+    formats: np.ndarray,
+    image_width: np.ndarray,
+    image_height: np.ndarray
+) -> np.ndarray:
+    """
+    Konwertuje adnotacje w mieszanych formatach do ramek (x1, y1, x2, y2) w pikselach
+
+    Args:
+        x, y, width, height: Współrzędne z kolumn Annotation
+        formats: Tablica formatów (Annotation.format) dla każdej adnotacji
+        image_width, image_height: Wymiary obrazu, do którego należy każda adnotacja
+
+    Returns:
+        Tablica (N, 4) float64
+    """
+    is_yolo = np.char.upper(formats.astype(str)) == "YOLO"
+    pixel_w = np.where(is_yolo, width * image_width, width)
+    pixel_h = np.where(is_yolo, height * image_height, height)
+    x1 = np.where(is_yolo, x * image_width - pixel_w / 2, x)
+    y1 = np.where(is_yolo, y * image_height - pixel_h / 2, y)
+    return np.stack([x1, y1, x1 + pixel_w, y1 + pixel_h], axis=1)
+
+
+def from_xyxy(boxes: np.ndarray, target_format: str, image_width: np.ndarray, image_height: np.ndarray) -> np.ndarray:
+    """
+    Konwertuje ramki (x1, y1, x2, y2) w pikselach do formatu docelowego
+
+    Returns:
+        Tablica (N, 4): YOLO - (cx, cy, w, h) znormalizowane, COCO - (x, y, w, h),
+        VOC - (xmin, ymin, xmax, ymax) w pikselach
+    """
+    target_format = target_format.upper()
+    if target_format == "VOC":
+        return boxes.copy()
+
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    if target_format == "COCO":
+        return np.stack([boxes[:, 0], boxes[:, 1], width, height], axis=1)
+
+    return np.stack([
+        (boxes[:, 0] + width / 2) / image_width,
+        (boxes[:, 1] + height / 2) / image_height,
+        width / image_width,
+        height / image_height
+    ], axis=1)
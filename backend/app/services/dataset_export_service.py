@@ -0,0 +1,307 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import List, Optional, Dict, Any, Callable, BinaryIO
+from app.models.models import Dataset, Image, Class, Annotation
+from app.core.config import settings
+from app.services.annotation_utils import to_xyxy, from_xyxy
+from app.services.minio_service import minio_service
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.sax.saxutils import escape
+import io
+import os
+import json
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("YOLO", "COCO", "VOC")
+ARCHIVE_TYPES = ("zip", "tar")
+
+
+class _ArchiveWriter:
+    """Zapis archiwum ZIP/tar do strumienia bez możliwości przewijania (potok do MinIO)"""
+
+    def __init__(self, fileobj: BinaryIO, archive_type: str):
+        self.archive_type = archive_type
+        if archive_type == "zip":
+            # Obrazy są już skompresowane - zapisujemy bez kompresji
+            self.archive = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self.archive = tarfile.open(fileobj=fileobj, mode="w|")
+
+    def add_bytes(self, name: str, data: bytes):
+        self.add_stream(name, io.BytesIO(data), len(data))
+
+    def add_stream(self, name: str, stream: BinaryIO, size: int):
+        if self.archive_type == "zip":
+            with self.archive.open(name, "w", force_zip64=True) as dest:
+                shutil.copyfileobj(stream, dest)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(datetime.now().timestamp())
+            self.archive.addfile(info, stream)
+
+    def close(self):
+        self.archive.close()
+
+
+class _ConcatReader(io.RawIOBase):
+    """Strumień odczytujący kolejno bajty i pliki tymczasowe (składanie JSON COCO)"""
+
+    def __init__(self, chunks: list):
+        self.chunks = [io.BytesIO(c) if isinstance(c, bytes) else c for c in chunks]
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.chunks:
+            n = self.chunks[0].readinto(buffer)
+            if n:
+                return n
+            self.chunks.pop(0)
+        return 0
+
+
+class DatasetExportService:
+    """Strumieniowy eksport datasetu do archiwum YOLO/COCO/VOC w buckecie datasets"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.images_exported = 0
+        self.annotations_exported = 0
+
+    def _get_classes(self, dataset_id: int) -> List[Class]:
+        """Zwraca klasy użyte w adnotacjach datasetu (posortowane po ID)"""
+        stmt = (
+            select(Class)
+            .where(Class.id.in_(
+                select(Annotation.class_id).join(Image, Annotation.image_id == Image.id).where(Image.dataset_id == dataset_id)
+            ))
+            .order_by(Class.id)
+        )
+        return list(self.db.execute(stmt).scalars())
+
+    def _iter_batches(self, dataset_id: int):
+        """
+        Iteruje po partiach obrazów datasetu wraz z ich adnotacjami
+
+        Obrazy i adnotacje czytane są kursorami po stronie serwera (yield_per),
+        posortowane po ID obrazu, i łączone przez scalanie strumieni.
+        """
+        batch_size = settings.EXPORT_BATCH_SIZE
+        images = self.db.execute(
+            select(Image).where(Image.dataset_id == dataset_id).order_by(Image.id)
+            .execution_options(yield_per=batch_size)
+        ).scalars()
+        annotations = iter(self.db.execute(
+            select(
+                Annotation.image_id, Annotation.class_id, Annotation.x, Annotation.y,
+                Annotation.width, Annotation.height, Annotation.format
+            )
+            .join(Image, Annotation.image_id == Image.id)
+            .where(Image.dataset_id == dataset_id)
+            .order_by(Annotation.image_id)
+            .execution_options(yield_per=batch_size * 16)
+        ))
+
+        pending = next(annotations, None)
+        for image_batch in images.partitions(batch_size):
+            last_id = image_batch[-1].id
+            batch_annotations = []
+            while pending is not None and pending.image_id <= last_id:
+                batch_annotations.append(pending)
+                pending = next(annotations, None)
+            yield image_batch, batch_annotations
+
+    def _convert(self, images: List[Image], annotations: list, export_format: str) -> Dict[int, List[tuple]]:
+        """Wektorowo konwertuje adnotacje partii do formatu docelowego, grupując je po ID obrazu"""
+        if not annotations:
+            return {}
+        sizes = {image.id: (image.width, image.height) for image in images}
+        image_ids = np.array([a.image_id for a in annotations])
+        class_ids = np.array([a.class_id for a in annotations])
+        coords = np.array([(a.x, a.y, a.width, a.height) for a in annotations], dtype=np.float64)
+        formats = np.array([a.format or "" for a in annotations])
+        widths = np.array([sizes[i][0] for i in image_ids], dtype=np.float64)
+        heights = np.array([sizes[i][1] for i in image_ids], dtype=np.float64)
+
+        boxes = to_xyxy(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], formats, widths, heights)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, widths[:, None])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, heights[:, None])
+        converted = from_xyxy(boxes, export_format, widths, heights)
+
+        grouped: Dict[int, List[tuple]] = {}
+        for image_id, class_id, box in zip(image_ids.tolist(), class_ids.tolist(), converted.tolist()):
+            grouped.setdefault(image_id, []).append((class_id, box))
+        return grouped
+
+    @staticmethod
+    def _voc_xml(file_name: str, image: Image, objects: List[tuple], class_names: Dict[int, str]) -> bytes:
+        parts = [
+            "<annotation>",
+            f"<filename>{escape(file_name)}</filename>",
+            f"<size><width>{image.width}</width><height>{image.height}</height><depth>3</depth></size>"
+        ]
+        for class_id, (xmin, ymin, xmax, ymax) in objects:
+            parts.append(
+                f"<object><name>{escape(class_names[class_id])}</name><difficult>0</difficult>"
+                f"<bndbox><xmin>{xmin:.1f}</xmin><ymin>{ymin:.1f}</ymin><xmax>{xmax:.1f}</xmax><ymax>{ymax:.1f}</ymax></bndbox></object>"
+            )
+        parts.append("</annotation>")
+        return "".join(parts).encode("utf-8")
+
+    def _write_archive(
+        self,
+        writer: _ArchiveWriter,
+        dataset_id: int,
+        export_format: str,
+        progress: Callable[[], None]
+    ):
+        classes = self._get_classes(dataset_id)
+        class_names = {c.id: c.name for c in classes}
+        class_index = {c.id: i for i, c in enumerate(classes)}
+        image_dir = {"YOLO": "images", "COCO": "images", "VOC": "JPEGImages"}[export_format]
+
+        if export_format == "YOLO":
+            names = [c.name for c in classes]
+            writer.add_bytes("classes.txt", "\n".join(names).encode("utf-8"))
+            data_yaml = f"path: .\ntrain: images\nval: images\nnc: {len(names)}\nnames: {json.dumps(names)}\n"
+            writer.add_bytes("data.yaml", data_yaml.encode("utf-8"))
+
+        # Sekcje JSON COCO buforowane są na dysku, nie w pamięci
+        coco_images = tempfile.TemporaryFile() if export_format == "COCO" else None
+        coco_annotations = tempfile.TemporaryFile() if export_format == "COCO" else None
+
+        with ThreadPoolExecutor(max_workers=settings.EXPORT_DOWNLOAD_WORKERS) as pool:
+            for images, annotations in self._iter_batches(dataset_id):
+                converted = self._convert(images, annotations, export_format)
+                blobs = pool.map(lambda image: minio_service.read_object(settings.IMAGES_BUCKET, image.path), images)
+
+                for image, data in zip(images, blobs):
+                    file_name = f"{image.id}_{image.name}"
+                    stem = os.path.splitext(file_name)[0]
+                    objects = converted.get(image.id, [])
+                    writer.add_bytes(f"{image_dir}/{file_name}", data)
+
+                    if export_format == "YOLO":
+                        lines = [f"{class_index[c]} {b[0]:.6f} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f}" for c, b in objects]
+                        writer.add_bytes(f"labels/{stem}.txt", "\n".join(lines).encode("utf-8"))
+                    elif export_format == "VOC":
+                        writer.add_bytes(f"Annotations/{stem}.xml", self._voc_xml(file_name, image, objects, class_names))
+                    else:
+                        separator = b"," if self.images_exported else b""
+                        coco_images.write(separator + json.dumps({
+                            "id": image.id, "file_name": file_name, "width": image.width, "height": image.height
+                        }).encode("utf-8"))
+                        for class_id, box in objects:
+                            separator = b"," if self.annotations_exported else b""
+                            coco_annotations.write(separator + json.dumps({
+                                "id": self.annotations_exported + 1, "image_id": image.id, "category_id": class_id,
+                                "bbox": [round(v, 2) for v in box], "area": round(box[2] * box[3], 2), "iscrowd": 0
+                            }).encode("utf-8"))
+                            self.annotations_exported += 1
+
+                    if export_format != "COCO":
+                        self.annotations_exported += len(objects)
+                    self.images_exported += 1
+                progress()
+
+        if export_format == "COCO":
+            categories = json.dumps([{"id": c.id, "name": c.name} for c in classes]).encode("utf-8")
+            parts = [b'{"images":[', coco_images, b'],"annotations":[', coco_annotations, b'],"categories":' + categories + b"}"]
+            size = sum(len(p) if isinstance(p, bytes) else p.tell() for p in parts)
+            for part in parts:
+                if not isinstance(part, bytes):
+                    part.seek(0)
+            writer.add_stream("annotations/instances.json", io.BufferedReader(_ConcatReader(parts)), size)
+            coco_images.close()
+            coco_annotations.close()
+
+    def export_dataset(
+        self,
+        dataset_id: int,
+        export_format: Optional[str] = None,
+        archive_type: str = "zip",
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Eksportuje dataset do archiwum w buckecie datasets
+
+        Archiwum jest zapisywane do potoku, z którego równolegle czyta przesyłanie
+        multipart do MinIO - zużycie pamięci nie zależy od rozmiaru datasetu.
+
+        Returns:
+            Dict z nazwą obiektu, tymczasowym URL i liczbą wyeksportowanych elementów
+        """
+        dataset = self.db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if not dataset:
+            raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+        export_format = (export_format or dataset.format or "YOLO").upper()
+        if export_format not in SUPPORTED_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Nieobsługiwany format eksportu: {export_format}")
+        if archive_type not in ARCHIVE_TYPES:
+            raise HTTPException(status_code=400, detail=f"Nieobsługiwany typ archiwum: {archive_type}")
+
+        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        object_name = f"exports/dataset_{dataset_id}_{export_format.lower()}_{timestamp}.{archive_type}"
+        read_fd, write_fd = os.pipe()
+        reader, sink = os.fdopen(read_fd, "rb"), os.fdopen(write_fd, "wb")
+        upload_error: List[Exception] = []
+
+        def upload():
+            try:
+                minio_service.client.put_object(
+                    settings.DATASETS_BUCKET,
+                    object_name,
+                    reader,
+                    length=-1,
+                    part_size=settings.MINIO_PART_SIZE,
+                    content_type="application/zip" if archive_type == "zip" else "application/x-tar"
+                )
+            except Exception as e:
+                upload_error.append(e)
+            finally:
+                # Zamknięcie odczytu przerywa zapis (BrokenPipeError), jeśli przesyłanie się nie powiodło
+                reader.close()
+
+        def progress():
+            if progress_callback:
+                progress_callback({"images": self.images_exported, "annotations": self.annotations_exported})
+
+        uploader = threading.Thread(target=upload, daemon=True)
+        uploader.start()
+        try:
+            writer = _ArchiveWriter(sink, archive_type)
+            self._write_archive(writer, dataset_id, export_format, progress)
+            writer.close()
+        except Exception:
+            sink.close()
+            uploader.join()
+            # Niepełne archiwum nie może zostać w buckecie
+            minio_service.delete_file(settings.DATASETS_BUCKET, object_name)
+            if upload_error:
+                raise upload_error[0]
+            raise
+        sink.close()
+        uploader.join()
+        if upload_error:
+            raise upload_error[0]
+
+        return {
+            "dataset_id": dataset_id,
+            "format": export_format,
+            "object_name": object_name,
+            "url": minio_service.get_dataset_url(object_name, expires=settings.EXPORT_URL_EXPIRES),
+            "images": self.images_exported,
+            "annotations": self.annotations_exported
+        }
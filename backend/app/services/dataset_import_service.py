@@ -0,0 +1,390 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
+from typing import List, Optional, Dict, Any, Tuple, Iterator, Callable
+from app.models.models import Dataset, Image, Class, Annotation
+from app.core.config import settings
+from app.services.image_utils import read_image_header, content_hash
+from app.services.minio_service import minio_service
+from app.services.dataset_stats_service import DatasetStatsService
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import posixpath
+import json
+import uuid
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import logging
+import xml.etree.ElementTree as ET
+import yaml
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("YOLO", "COCO", "VOC")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+ANNOTATION_EXTENSIONS = (".txt", ".names", ".xml", ".json", ".yaml", ".yml")
+
+def _read_header(data: bytes) -> Optional[Tuple[int, int, str]]:
+    """Odczytuje nagłówek obrazu z bajtów (None, gdy plik nie jest obsługiwanym obrazem)"""
+    try:
+        return read_image_header(io.BytesIO(data))
+    except Exception:
+        return None
+
+
+def _stem(name: str) -> str:
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _image_key(name: str) -> str:
+    """
+    Klucz obrazu: ścieżka w archiwum bez rozszerzenia, z katalogiem images zamienionym na labels
+
+    Dzięki temu train/images/x.jpg i train/labels/x.txt mają ten sam klucz,
+    a obrazy o tej samej nazwie w train/ i val/ się nie nadpisują.
+    """
+    parts = os.path.splitext(posixpath.normpath(name.replace("\\", "/")))[0].split("/")
+    for index in range(len(parts) - 2, -1, -1):
+        if parts[index] == "images":
+            parts[index] = "labels"
+            break
+    return "/".join(parts)
+
+
+class DatasetImportService:
+    """Import archiwów YOLO/COCO/VOC (ZIP/tar) z bucketu datasets do bazy danych i MinIO"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        # Mapowanie klucza obrazu (_image_key) -> (ID, szerokość, wysokość)
+        self.images_by_key: Dict[str, Tuple[int, int, int]] = {}
+        # Nazwa pliku bez rozszerzenia -> klucze obrazów (dopasowanie zapasowe, gdy nazwa jest unikalna)
+        self.keys_by_stem: Dict[str, List[str]] = {}
+        self.images_imported = 0
+        self.images_skipped = 0
+        self.annotations_imported = 0
+        self.annotations_skipped = 0
+        self.header_pool: Optional[ThreadPoolExecutor] = None
+        self.stats = DatasetStatsService(db)
+
+    def _iter_members(self, object_name: str) -> Iterator[Tuple[str, bytes]]:
+        """Strumieniowo iteruje po plikach archiwum zapisanego w buckecie datasets"""
+        response = minio_service.client.get_object(settings.DATASETS_BUCKET, object_name)
+        try:
+            if object_name.lower().endswith(".zip"):
+                # ZIP wymaga swobodnego dostępu (katalog centralny na końcu pliku)
+                with tempfile.TemporaryFile() as spool:
+                    shutil.copyfileobj(response, spool, length=settings.MINIO_PART_SIZE)
+                    spool.seek(0)
+                    with zipfile.ZipFile(spool) as archive:
+                        for info in archive.infolist():
+                            if not info.is_dir():
+                                yield info.filename, archive.read(info)
+            else:
+                with tarfile.open(fileobj=response, mode="r|*") as archive:
+                    for member in archive:
+                        if member.isfile():
+                            yield member.name, archive.extractfile(member).read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _read_headers(self, blobs: List[bytes]) -> List[Optional[Tuple[int, int, str]]]:
+        # Pula wątków, nie procesów - import działa w procesach demonicznych prefork Celery,
+        # które nie mogą tworzyć procesów potomnych; odczyt nagłówka nie dekoduje pikseli
+        if self.header_pool is not None:
+            return list(self.header_pool.map(_read_header, blobs))
+        return [_read_header(blob) for blob in blobs]
+
+    def _upload(self, item: Tuple[str, bytes, str]):
+        object_name, data, extension = item
+        minio_service.client.put_object(
+            settings.IMAGES_BUCKET,
+            object_name,
+            io.BytesIO(data),
+            length=len(data),
+            content_type=f"image/{extension}"
+        )
+
+    def _ingest_images(
+        self,
+        dataset_id: int,
+        batch: List[Tuple[str, bytes]],
+        upload_pool: ThreadPoolExecutor
+    ):
+        """Odczytuje nagłówki, równolegle przesyła obrazy do MinIO i wstawia partię rekordów Image"""
+        headers = self._read_headers([data for _, data in batch])
+
+        uploads = []
+        rows = []
+        keys = {}
+        for (name, data), header in zip(batch, headers):
+            if header is None:
+                self.images_skipped += 1
+                continue
+            width, height, _ = header
+            extension = os.path.splitext(name)[1].lstrip(".").lower()
+            object_name = f"{uuid.uuid4()}.{extension}"
+            uploads.append((object_name, data, extension))
+            keys[object_name] = name
+            rows.append({
+                "name": os.path.basename(name),
+                "path": object_name,
+                "width": width,
+                "height": height,
+                "format": extension,
+                "size": len(data),
+                "content_hash": content_hash(data),
+                "dataset_id": dataset_id
+            })
+
+        if not rows:
+            return
+
+        list(upload_pool.map(self._upload, uploads))
+
+        result = self.db.execute(insert(Image).returning(Image.id, Image.path), rows)
+        sizes = {row["path"]: (row["width"], row["height"]) for row in rows}
+        for image_id, path in result:
+            self._register_image(keys[path], (image_id, *sizes[path]))
+        self.stats.record_images((dataset_id, False) for _ in rows)
+        self.stats.flush()
+        self.db.commit()
+        self.images_imported += len(rows)
+
+    def _register_image(self, name: str, image: Tuple[int, int, int]):
+        key = _image_key(name)
+        if key in self.images_by_key:
+            logger.warning(f"Zduplikowany obraz w archiwum: {name} - adnotacje trafią do ostatniego z nich")
+        else:
+            self.keys_by_stem.setdefault(_stem(name), []).append(key)
+        self.images_by_key[key] = image
+
+    def _find_image(self, *names: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Obraz dla pliku adnotacji lub nazwy z adnotacji
+
+        Najpierw dopasowanie po kluczu (ścieżka względem równoległych katalogów images/labels),
+        potem po samej nazwie pliku - tylko gdy w archiwum jest jeden obraz o tej nazwie.
+        """
+        for name in names:
+            image = self.images_by_key.get(_image_key(name))
+            if image is not None:
+                return image
+        for name in names:
+            keys = self.keys_by_stem.get(_stem(name), [])
+            if len(keys) == 1:
+                return self.images_by_key[keys[0]]
+            if len(keys) > 1:
+                logger.warning(f"Niejednoznaczne dopasowanie adnotacji {name} - {len(keys)} obrazy o tej nazwie")
+        return None
+
+    def _get_or_create_classes(self, names: List[str]) -> Dict[str, int]:
+        """Zwraca mapowanie nazwa -> ID klasy, tworząc brakujące klasy jednym INSERT"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        existing = {row.name: row.id for row in self.db.query(Class.id, Class.name).filter(Class.name.in_(names))}
+        missing = [{"name": name} for name in names if name not in existing]
+        if missing:
+            for class_id, name in self.db.execute(insert(Class).returning(Class.id, Class.name), missing):
+                existing[name] = class_id
+        return existing
+
+    def _parse_yolo(self, files: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        class_names: List[str] = []
+        for name, data in files.items():
+            if os.path.basename(name) in ("classes.txt", "obj.names"):
+                class_names = [line.strip() for line in data.decode("utf-8").splitlines() if line.strip()]
+            elif name.lower().endswith((".yaml", ".yml")):
+                names = (yaml.safe_load(data) or {}).get("names")
+                if isinstance(names, dict):
+                    class_names = [names[k] for k in sorted(names)]
+                elif isinstance(names, list):
+                    class_names = names
+
+        annotations = []
+        for name, data in files.items():
+            if not name.lower().endswith(".txt") or os.path.basename(name) == "classes.txt":
+                continue
+            image = self._find_image(name)
+            if image is None:
+                continue
+            for line in data.decode("utf-8").splitlines():
+                values = line.split()
+                if not values:
+                    continue
+                try:
+                    if len(values) < 5:
+                        raise ValueError("za mało wartości")
+                    class_index = int(values[0])
+                    if class_index < 0:
+                        raise ValueError(f"ujemny indeks klasy {class_index}")
+                    coords = [float(v) for v in values[1:]]
+                except ValueError as e:
+                    logger.warning(f"Pominięto błędną linię adnotacji w {name}: {line!r} ({str(e)})")
+                    self.annotations_skipped += 1
+                    continue
+                if len(coords) > 4:
+                    # Segmentacja (wielokąt) - zapisywana jako otaczająca ramka
+                    xs, ys = coords[0::2], coords[1::2]
+                    coords = [(min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2, max(xs) - min(xs), max(ys) - min(ys)]
+                class_name = class_names[class_index] if class_index < len(class_names) else str(class_index)
+                annotations.append({
+                    "image_id": image[0], "class_name": class_name, "format": "YOLO",
+                    "x": coords[0], "y": coords[1], "width": coords[2], "height": coords[3]
+                })
+        return annotations
+
+    def _parse_coco(self, files: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        annotations = []
+        for name, data in files.items():
+            if not name.lower().endswith(".json"):
+                continue
+            coco = json.loads(data)
+            if "annotations" not in coco:
+                continue
+            categories = {c["id"]: c["name"] for c in coco.get("categories", [])}
+            coco_images = {}
+            for coco_image in coco.get("images", []):
+                image = self._find_image(coco_image["file_name"])
+                if image is not None:
+                    coco_images[coco_image["id"]] = image[0]
+            for ann in coco["annotations"]:
+                image_id = coco_images.get(ann["image_id"])
+                if image_id is None or not ann.get("bbox"):
+                    continue
+                x, y, width, height = ann["bbox"]
+                annotations.append({
+                    "image_id": image_id, "class_name": categories.get(ann["category_id"], str(ann["category_id"])),
+                    "format": "COCO", "x": x, "y": y, "width": width, "height": height
+                })
+        return annotations
+
+    def _parse_voc(self, files: Dict[str, bytes]) -> List[Dict[str, Any]]:
+        annotations = []
+        for name, data in files.items():
+            if not name.lower().endswith(".xml"):
+                continue
+            root = ET.fromstring(data)
+            filename = root.findtext("filename") or name
+            image = self._find_image(filename, name)
+            if image is None:
+                continue
+            for obj in root.iter("object"):
+                box = obj.find("bndbox")
+                if box is None:
+                    continue
+                try:
+                    xmin, ymin = float(box.findtext("xmin")), float(box.findtext("ymin"))
+                    xmax, ymax = float(box.findtext("xmax")), float(box.findtext("ymax"))
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Pominięto błędną ramkę adnotacji w {name}: {str(e)}")
+                    self.annotations_skipped += 1
+                    continue
+                annotations.append({
+                    "image_id": image[0], "class_name": obj.findtext("name", "").strip(), "format": "VOC",
+                    "x": xmin, "y": ymin, "width": xmax - xmin, "height": ymax - ymin
+                })
+        return annotations
+
+    def _insert_annotations(self, annotations: List[Dict[str, Any]], progress: Callable[[str], None]):
+        """Wstawia adnotacje partiami (executemany), tworząc brakujące klasy"""
+        class_ids = self._get_or_create_classes([ann["class_name"] for ann in annotations])
+        batch_size = settings.IMPORT_ANNOTATION_BATCH_SIZE
+        for start in range(0, len(annotations), batch_size):
+            rows = [
+                {
+                    "image_id": ann["image_id"], "class_id": class_ids[ann["class_name"]], "format": ann["format"],
+                    "x": ann["x"], "y": ann["y"], "width": ann["width"], "height": ann["height"]
+                }
+                for ann in annotations[start:start + batch_size]
+            ]
+            self.db.execute(insert(Annotation), rows)
+            labeled = self.db.execute(
+                update(Image)
+                .where(Image.id.in_({row["image_id"] for row in rows}), Image.is_labeled.is_(False))
+                .values(is_labeled=True)
+                .returning(Image.dataset_id, Image.is_labeled)
+                .execution_options(synchronize_session=False)
+            )
+            self.stats.record_labeled_changes(labeled)
+            self.stats.record_annotations(rows)
+            self.stats.flush()
+            self.db.commit()
+            self.annotations_imported += len(rows)
+            progress("annotations")
+
+    def import_archive(
+        self,
+        dataset_id: int,
+        object_name: str,
+        dataset_format: str,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Importuje archiwum datasetu z bucketu datasets
+
+        Args:
+            dataset_id: ID datasetu docelowego
+            object_name: Nazwa obiektu archiwum (ZIP lub tar, opcjonalnie skompresowany)
+            dataset_format: Format adnotacji (YOLO, COCO, VOC)
+            progress_callback: Funkcja wywoływana po każdej partii
+
+        Returns:
+            Dict z podsumowaniem importu
+        """
+        dataset_format = dataset_format.upper()
+        if dataset_format not in SUPPORTED_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Nieobsługiwany format datasetu: {dataset_format}")
+        if not self.db.query(Dataset.id).filter(Dataset.id == dataset_id).first():
+            raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+
+        def progress(stage: str):
+            if progress_callback:
+                progress_callback({
+                    "stage": stage,
+                    "images": self.images_imported,
+                    "skipped": self.images_skipped,
+                    "annotations": self.annotations_imported,
+                    "annotations_skipped": self.annotations_skipped
+                })
+
+        annotation_files: Dict[str, bytes] = {}
+        batch: List[Tuple[str, bytes]] = []
+        if settings.IMPORT_HEADER_WORKERS > 0:
+            self.header_pool = ThreadPoolExecutor(max_workers=settings.IMPORT_HEADER_WORKERS)
+        try:
+            with ThreadPoolExecutor(max_workers=settings.IMPORT_UPLOAD_WORKERS) as upload_pool:
+                for name, data in self._iter_members(object_name):
+                    lower = name.lower()
+                    if lower.endswith(IMAGE_EXTENSIONS):
+                        batch.append((name, data))
+                        if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                            self._ingest_images(dataset_id, batch, upload_pool)
+                            batch = []
+                            progress("images")
+                    elif lower.endswith(ANNOTATION_EXTENSIONS):
+                        # Pliki adnotacji są małe - przetwarzane po wczytaniu wszystkich obrazów
+                        annotation_files[name] = data
+
+                if batch:
+                    self._ingest_images(dataset_id, batch, upload_pool)
+                    progress("images")
+        finally:
+            if self.header_pool is not None:
+                self.header_pool.shutdown()
+
+        parser = {"YOLO": self._parse_yolo, "COCO": self._parse_coco, "VOC": self._parse_voc}[dataset_format]
+        self._insert_annotations(parser(annotation_files), progress)
+
+        return {
+            "dataset_id": dataset_id,
+            "images": self.images_imported,
+            "skipped": self.images_skipped,
+            "annotations": self.annotations_imported,
+            "annotations_skipped": self.annotations_skipped
+        }
@@ -1,247 +1,124 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-import json
+from sqlalchemy import select, update
 from typing import List, Optional, Dict, Any
+import logging
 
-from app.models.models import Dataset, Image
-from app.schemas.schemas import DatasetCreate, DatasetResponse, DatasetsResponse, DatasetWithStats
+from app.models.models import Dataset, Image, Annotation
+from app.schemas.schemas import DatasetCreate
+from app.services.dataset_stats_service import DatasetStatsService
+from app.services.annotation_store import AnnotationStore
+from app.db.pagination import paginate
+
+logger = logging.getLogger(__name__)
 
 class DatasetService:
-    @staticmethod
-    def create_dataset(db: Session, dataset: DatasetCreate) -> DatasetResponse:
-        """
-        Tworzy nowy zbiór danych.
-        """
+    def __init__(self, db: Session):
+        self.db = db
+        self.stats = DatasetStatsService(db)
+
+    def create_dataset(self, dataset: DatasetCreate) -> Dataset:
+        """Tworzy nowy zbiór danych"""
         try:
             db_dataset = Dataset(
                 name=dataset.name,
-                description=dataset.description
-            )
-            
-            db.add(db_dataset)
-            db.commit()
-            db.refresh(db_dataset)
-            
-            return DatasetResponse(
-                success=True,
-                message="Zbiór danych został pomyślnie utworzony",
-                data=db_dataset
-            )
-        except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas tworzenia zbioru danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def get_datasets(db: Session, skip: int = 0, limit: int = 100) -> DatasetsResponse:
-        """
-        Pobiera listę zbiorów danych.
-        """
-        try:
-            total = db.query(Dataset).count()
-            datasets = db.query(Dataset).offset(skip).limit(limit).all()
-            
-            return DatasetsResponse(
-                success=True,
-                message=f"Znaleziono {len(datasets)} zbiorów danych",
-                data=datasets,
-                total=total
-            )
-        except Exception as e:
-            return DatasetsResponse(
-                success=False,
-                message=f"Błąd podczas pobierania zbiorów danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def get_dataset(db: Session, dataset_id: int) -> DatasetResponse:
-        """
-        Pobiera zbiór danych o podanym ID.
-        """
-        try:
-            dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not dataset:
-                return DatasetResponse(
-                    success=False,
-                    message=f"Zbiór danych o ID {dataset_id} nie został znaleziony"
-                )
-            
-            return DatasetResponse(
-                success=True,
-                message="Zbiór danych został znaleziony",
-                data=dataset
-            )
-        except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas pobierania zbioru danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def update_dataset(db: Session, dataset_id: int, dataset: DatasetCreate) -> DatasetResponse:
-        """
-        Aktualizuje zbiór danych o podanym ID.
-        """
-        try:
-            db_dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not db_dataset:
-                return DatasetResponse(
-                    success=False,
-                    message=f"Zbiór danych o ID {dataset_id} nie został znaleziony"
-                )
-            
-            db_dataset.name = dataset.name
-            db_dataset.description = dataset.description
-            
-            db.commit()
-            db.refresh(db_dataset)
-            
-            return DatasetResponse(
-                success=True,
-                message=f"Zbiór danych o ID {dataset_id} został zaktualizowany",
-                data=db_dataset
-            )
-        except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas aktualizacji zbioru danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def delete_dataset(db: Session, dataset_id: int) -> DatasetResponse:
-        """
-        Usuwa zbiór danych o podanym ID.
-        """
-        try:
-            db_dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not db_dataset:
-                return DatasetResponse(
-                    success=False,
-                    message=f"Zbiór danych o ID {dataset_id} nie został znaleziony"
-                )
-            
-            db.delete(db_dataset)
-            db.commit()
-            
-            return DatasetResponse(
-                success=True,
-                message=f"Zbiór danych o ID {dataset_id} został usunięty"
+                description=dataset.description,
+                format=dataset.format
             )
+            self.db.add(db_dataset)
+            self.db.commit()
+            self.db.refresh(db_dataset)
+            return db_dataset
         except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas usuwania zbioru danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def get_dataset_with_stats(db: Session, dataset_id: int) -> Dict[str, Any]:
-        """
-        Pobiera zbiór danych wraz ze statystykami.
-        """
+            logger.error(f"Błąd podczas tworzenia zbioru danych: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia zbioru danych: {str(e)}")
+
+    def get_dataset(self, dataset_id: int) -> Dataset:
+        """Pobiera zbiór danych po ID"""
+        dataset = self.db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if not dataset:
+            raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+        return dataset
+
+    def get_datasets(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Pobiera stronę listy zbiorów danych (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, select(Dataset), Dataset, limit, cursor, skip)
+
+    def update_dataset(self, dataset_id: int, data: Dict[str, Any]) -> Dataset:
+        """Aktualizuje zbiór danych"""
+        dataset = self.get_dataset(dataset_id)
         try:
-            dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not dataset:
-                raise HTTPException(status_code=404, detail=f"Zbiór danych o ID {dataset_id} nie został znaleziony")
-            
-            # Liczba obrazów w zbiorze danych
-            images_count = db.query(Image).filter(Image.dataset_id == dataset_id).count()
-            
-            # Liczba oznaczonych obrazów w zbiorze danych
-            labeled_images_count = db.query(Image).filter(
-                Image.dataset_id == dataset_id,
-                Image.is_labeled == True
-            ).count()
-            
-            dataset_with_stats = DatasetWithStats(
-                id=dataset.id,
-                name=dataset.name,
-                description=dataset.description,
-                created_at=dataset.created_at,
-                updated_at=dataset.updated_at,
-                images_count=images_count,
-                labeled_images_count=labeled_images_count
-            )
-            
-            return {
-                "success": True,
-                "message": "Zbiór danych został znaleziony",
-                "data": dataset_with_stats
-            }
-        except HTTPException as e:
-            raise e
+            for key, value in data.items():
+                setattr(dataset, key, value)
+            self.db.commit()
+            self.db.refresh(dataset)
+            return dataset
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Błąd podczas pobierania zbioru danych: {str(e)}")
-    
-    @staticmethod
-    def add_images_to_dataset(db: Session, dataset_id: int, image_ids: List[int]) -> DatasetResponse:
-        """
-        Dodaje obrazy do zbioru danych.
-        """
+            logger.error(f"Błąd podczas aktualizacji zbioru danych: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas aktualizacji zbioru danych: {str(e)}")
+
+    def delete_dataset(self, dataset_id: int) -> bool:
+        """Usuwa zbiór danych (obrazy pozostają, bez przypisanego datasetu)"""
+        dataset = self.get_dataset(dataset_id)
         try:
-            dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not dataset:
-                return DatasetResponse(
-                    success=False,
-                    message=f"Zbiór danych o ID {dataset_id} nie został znaleziony"
-                )
-            
-            for image_id in image_ids:
-                image = db.query(Image).filter(Image.id == image_id).first()
-                
-                if image:
-                    image.dataset_id = dataset_id
-            
-            db.commit()
-            
-            return DatasetResponse(
-                success=True,
-                message=f"Obrazy zostały dodane do zbioru danych o ID {dataset_id}",
-                data=dataset
-            )
+            self.db.delete(dataset)
+            self.db.commit()
+            AnnotationStore(self.db).drop(dataset_id)
+            return True
         except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas dodawania obrazów do zbioru danych: {str(e)}"
-            )
-    
-    @staticmethod
-    def remove_images_from_dataset(db: Session, dataset_id: int, image_ids: List[int]) -> DatasetResponse:
-        """
-        Usuwa obrazy ze zbioru danych.
-        """
+            logger.error(f"Błąd podczas usuwania zbioru danych: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas usuwania zbioru danych: {str(e)}")
+
+    def get_dataset_stats(self, dataset_id: int) -> Dict[str, Any]:
+        """Pobiera statystyki zbioru danych z tabeli dataset_stats"""
+        return self.stats.get_stats(dataset_id)
+
+    def _move_images(self, image_ids: List[int], dataset_id: Optional[int], source_dataset_id: Optional[int] = None) -> int:
+        """Przenosi obrazy do datasetu (lub usuwa przypisanie), aktualizując statystyki obu stron"""
+        query = select(Image.id, Image.dataset_id, Image.is_labeled).where(
+            Image.id.in_(set(image_ids)), Image.dataset_id.is_distinct_from(dataset_id)
+        )
+        if source_dataset_id is not None:
+            query = query.where(Image.dataset_id == source_dataset_id)
+        images = self.db.execute(query).all()
+        if not images:
+            return 0
+
+        moved_ids = [image.id for image in images]
+        annotations = [
+            dict(row) for row in self.db.execute(
+                select(*Annotation.__table__.columns).where(Annotation.image_id.in_(moved_ids))
+            ).mappings()
+        ]
+
         try:
-            dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
-            
-            if not dataset:
-                return DatasetResponse(
-                    success=False,
-                    message=f"Zbiór danych o ID {dataset_id} nie został znaleziony"
-                )
-            
-            for image_id in image_ids:
-                image = db.query(Image).filter(
-                    Image.id == image_id,
-                    Image.dataset_id == dataset_id
-                ).first()
-                
-                if image:
-                    image.dataset_id = None
-            
-            db.commit()
-            
-            return DatasetResponse(
-                success=True,
-                message=f"Obrazy zostały usunięte ze zbioru danych o ID {dataset_id}",
-                data=dataset
-            )
+            self.stats.record_annotations(annotations, sign=-1)
+            self.stats.record_images([(image.dataset_id, image.is_labeled) for image in images], sign=-1)
+            self.db.execute(
+                update(Image)
+                .where(Image.id.in_(moved_ids))
+                .values(dataset_id=dataset_id)
+                .execution_options(synchronize_session=False)
+            )
+            self.stats.record_annotations(annotations)
+            self.stats.record_images([(dataset_id, image.is_labeled) for image in images])
+            self.stats.flush()
+            self.db.commit()
+            return len(moved_ids)
         except Exception as e:
-            return DatasetResponse(
-                success=False,
-                message=f"Błąd podczas usuwania obrazów ze zbioru danych: {str(e)}"
-            )
+            logger.error(f"Błąd podczas przenoszenia obrazów: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas przenoszenia obrazów: {str(e)}")
+
+    def add_images_to_dataset(self, dataset_id: int, image_ids: List[int]) -> int:
+        """Dodaje obrazy do zbioru danych, zwraca liczbę przeniesionych obrazów"""
+        self.get_dataset(dataset_id)
+        return self._move_images(image_ids, dataset_id)
+
+    def remove_images_from_dataset(self, dataset_id: int, image_ids: List[int]) -> int:
+        """Usuwa obrazy ze zbioru danych, zwraca liczbę odłączonych obrazów"""
+        self.get_dataset(dataset_id)
+        return self._move_images(image_ids, None, source_dataset_id=dataset_id)
@@ -0,0 +1,329 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.models import Annotation, Class, Dataset, DatasetStats, Image
+from app.services.annotation_utils import to_xyxy
+from app.services.annotation_store import AnnotationStore, ColumnarAnnotations
+
+logger = logging.getLogger(__name__)
+
+# Przedziały względnego rozmiaru ramki: sqrt(pole ramki / pole obrazu)
+BOX_SIZE_BINS = (0.0, 0.02, 0.05, 0.1, 0.2, 0.4, 0.7, 1.0)
+_HISTOGRAM_EDGES = np.array(BOX_SIZE_BINS[:-1] + (np.inf,))
+
+# Rozmiar partii przy pełnym przeliczaniu statystyk
+REBUILD_BATCH_SIZE = 50000
+
+
+def box_size_histogram(
+    x: np.ndarray,
+    y: np.ndarray,
+    width: np.ndarray,
+    height: np.ndarray,
+    formats: np.ndarray,
+    image_width: np.ndarray,
+    image_height: np.ndarray
+) -> np.ndarray:
+    """Zlicza ramki w przedziałach BOX_SIZE_BINS (ramki większe niż obraz trafiają do ostatniego)"""
+    boxes = to_xyxy(x, y, width, height, formats, image_width, image_height)
+    box_area = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    image_area = np.maximum(image_width * image_height, 1)
+    counts, _ = np.histogram(np.sqrt(box_area / image_area), bins=_HISTOGRAM_EDGES)
+    return counts
+
+
+def normalized_box_size_histogram(boxes: np.ndarray) -> np.ndarray:
+    """Jak box_size_histogram, dla ramek (x1, y1, x2, y2) znormalizowanych do wymiarów obrazu"""
+    boxes = boxes.astype(np.float64)
+    box_area = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    counts, _ = np.histogram(np.sqrt(box_area), bins=_HISTOGRAM_EDGES)
+    return counts
+
+
+class _Delta:
+    """Przyrost statystyk jednego datasetu"""
+
+    def __init__(self):
+        self.images = 0
+        self.labeled_images = 0
+        self.annotations = 0
+        self.class_counts: Dict[str, int] = defaultdict(int)
+        self.histogram = np.zeros(len(BOX_SIZE_BINS) - 1, dtype=np.int64)
+        # Zapis adnotacji (także bez zmiany liczników, np. przesunięcie ramki)
+        self.annotations_touched = False
+
+    def is_empty(self) -> bool:
+        return (
+            not self.images and not self.labeled_images and not self.annotations
+            and not any(self.class_counts.values()) and not self.histogram.any()
+        )
+
+
+class DatasetStatsService:
+    """
+    Utrzymuje tabelę dataset_stats
+
+    Serwisy zapisujące obrazy i adnotacje zgłaszają zmiany metodami record_*, a przed
+    zatwierdzeniem transakcji wywołują flush(), który nakłada zebrane przyrosty pod
+    blokadą wiersza (SELECT ... FOR UPDATE), w tej samej transakcji co zapis danych.
+    Brakujący wiersz statystyk jest tworzony i przeliczany w całości.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._pending: Dict[int, _Delta] = defaultdict(_Delta)
+
+    def record_images(self, rows: Iterable[Tuple[Optional[int], bool]], sign: int = 1):
+        """Rejestruje dodanie (sign=1) lub usunięcie (sign=-1) obrazów: wiersze (dataset_id, is_labeled)"""
+        for dataset_id, is_labeled in rows:
+            if dataset_id is None:
+                continue
+            delta = self._pending[dataset_id]
+            delta.images += sign
+            if is_labeled:
+                delta.labeled_images += sign
+
+    def record_labeled_changes(self, rows: Iterable[Tuple[Optional[int], bool]]):
+        """Rejestruje zmiany Image.is_labeled: wiersze (dataset_id, nowa wartość is_labeled)"""
+        for dataset_id, is_labeled in rows:
+            if dataset_id is not None:
+                self._pending[dataset_id].labeled_images += 1 if is_labeled else -1
+
+    def record_annotations(self, annotations: List[Dict[str, Any]], sign: int = 1):
+        """
+        Rejestruje dodanie (sign=1) lub usunięcie (sign=-1) adnotacji
+
+        Dataset i wymiary obrazu pobierane są jednym zapytaniem w momencie wywołania,
+        więc przy przenoszeniu obrazów między datasetami metodę należy wywołać przed
+        i po zmianie Image.dataset_id.
+        """
+        if not annotations:
+            return
+
+        images = {
+            row.id: row for row in self.db.execute(
+                select(Image.id, Image.dataset_id, Image.width, Image.height)
+                .where(Image.id.in_({ann["image_id"] for ann in annotations}))
+            )
+        }
+        by_dataset: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for ann in annotations:
+            image = images.get(ann["image_id"])
+            if image is not None and image.dataset_id is not None:
+                by_dataset[image.dataset_id].append(ann)
+
+        for dataset_id, rows in by_dataset.items():
+            delta = self._pending[dataset_id]
+            delta.annotations_touched = True
+            delta.annotations += sign * len(rows)
+            for ann in rows:
+                delta.class_counts[str(ann["class_id"])] += sign
+
+            def column(name):
+                return np.array([ann[name] or 0 for ann in rows], dtype=np.float64)
+
+            delta.histogram += sign * box_size_histogram(
+                column("x"), column("y"), column("width"), column("height"),
+                np.array([ann["format"] or "" for ann in rows]),
+                np.array([images[ann["image_id"]].width or 0 for ann in rows], dtype=np.float64),
+                np.array([images[ann["image_id"]].height or 0 for ann in rows], dtype=np.float64)
+            )
+
+    def flush(self):
+        """Nakłada zebrane przyrosty (w kolejności ID datasetu, aby uniknąć zakleszczeń)"""
+        pending, self._pending = self._pending, defaultdict(_Delta)
+        for dataset_id in sorted(pending):
+            delta = pending[dataset_id]
+            if not delta.is_empty() or delta.annotations_touched:
+                self._apply(dataset_id, delta)
+
+    def _apply(self, dataset_id: int, delta: _Delta):
+        created = self.db.execute(
+            insert(DatasetStats)
+            .values(dataset_id=dataset_id, class_counts={}, box_size_histogram=[])
+            .on_conflict_do_nothing(index_elements=[DatasetStats.dataset_id])
+        ).rowcount
+        stats = self.db.execute(
+            select(DatasetStats)
+            .where(DatasetStats.dataset_id == dataset_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one()
+
+        if delta.annotations_touched:
+            # Unieważnia migawki AnnotationStore datasetu
+            stats.annotations_revision += 1
+
+        if created:
+            # Nowy wiersz: przeliczenie widzi już zmiany bieżącej transakcji
+            self._compute(stats)
+            return
+
+        stats.images_count += delta.images
+        stats.labeled_images_count += delta.labeled_images
+        stats.annotations_count += delta.annotations
+
+        # Nowe obiekty JSON, aby SQLAlchemy wykrył zmianę kolumn
+        class_counts = dict(stats.class_counts or {})
+        for class_id, count in delta.class_counts.items():
+            class_counts[class_id] = class_counts.get(class_id, 0) + count
+            if class_counts[class_id] <= 0:
+                del class_counts[class_id]
+        stats.class_counts = class_counts
+
+        histogram = np.zeros_like(delta.histogram)
+        histogram[:len(stats.box_size_histogram or [])] = stats.box_size_histogram or []
+        stats.box_size_histogram = np.maximum(histogram + delta.histogram, 0).tolist()
+        self.db.flush()
+
+    def _compute(self, stats: DatasetStats, annotations: Optional[ColumnarAnnotations] = None):
+        """Przelicza statystyki datasetu od zera (z migawki AnnotationStore, jeśli podana)"""
+        dataset_id = stats.dataset_id
+        stats.images_count, stats.labeled_images_count = self.db.execute(
+            select(func.count(Image.id), func.count(Image.id).filter(Image.is_labeled.is_(True)))
+            .where(Image.dataset_id == dataset_id)
+        ).one()
+
+        if annotations is not None:
+            class_ids, counts = np.unique(annotations.class_ids, return_counts=True)
+            # -1 w migawce oznacza adnotację bez klasy (NULL), jak klucz "None" w zapytaniu SQL
+            stats.class_counts = {
+                str(class_id if class_id >= 0 else None): count
+                for class_id, count in zip(class_ids.tolist(), counts.tolist())
+            }
+            stats.annotations_count = len(annotations)
+            stats.box_size_histogram = normalized_box_size_histogram(annotations.boxes).tolist()
+            self.db.flush()
+            return
+
+        stats.class_counts = {
+            str(class_id): count for class_id, count in self.db.execute(
+                select(Annotation.class_id, func.count(Annotation.id))
+                .join(Image, Annotation.image_id == Image.id)
+                .where(Image.dataset_id == dataset_id)
+                .group_by(Annotation.class_id)
+            )
+        }
+        stats.annotations_count = sum(stats.class_counts.values())
+
+        histogram = np.zeros(len(BOX_SIZE_BINS) - 1, dtype=np.int64)
+        result = self.db.execute(
+            select(
+                Annotation.x, Annotation.y, Annotation.width, Annotation.height, Annotation.format,
+                Image.width, Image.height
+            )
+            .join(Image, Annotation.image_id == Image.id)
+            .where(Image.dataset_id == dataset_id)
+            .execution_options(yield_per=REBUILD_BATCH_SIZE)
+        )
+        for partition in result.partitions():
+            columns = list(zip(*partition))
+            numeric = [np.array(values, dtype=np.float64) for values in columns[:4]]
+            histogram += box_size_histogram(
+                *[np.nan_to_num(values) for values in numeric],
+                np.array([value or "" for value in columns[4]]),
+                np.array(columns[5], dtype=np.float64),
+                np.array(columns[6], dtype=np.float64)
+            )
+        stats.box_size_histogram = histogram.tolist()
+        self.db.flush()
+
+    def rebuild(self, dataset_id: int) -> DatasetStats:
+        """Przelicza statystyki datasetu od zera (np. po ręcznych zmianach w bazie)"""
+        self.db.execute(
+            insert(DatasetStats)
+            .values(dataset_id=dataset_id, class_counts={}, box_size_histogram=[])
+            .on_conflict_do_nothing(index_elements=[DatasetStats.dataset_id])
+        )
+        stats = self.db.execute(
+            select(DatasetStats).where(DatasetStats.dataset_id == dataset_id).with_for_update()
+        ).scalar_one()
+
+        # Pod blokadą wiersza statystyk migawka obejmuje wszystkie zatwierdzone zapisy datasetu
+        try:
+            annotations = AnnotationStore(self.db).refresh(dataset_id)
+        except OSError as e:
+            logger.warning(f"Migawka adnotacji niedostępna, przeliczanie z bazy: {str(e)}")
+            annotations = None
+        self._compute(stats, annotations)
+        self.db.commit()
+        return stats
+
+    def get_stats(self, dataset_id: int) -> Dict[str, Any]:
+        """Zwraca statystyki datasetu (jeden odczyt wiersza; brakujący wiersz jest przeliczany)"""
+        if not self.db.query(Dataset.id).filter(Dataset.id == dataset_id).first():
+            raise HTTPException(status_code=404, detail="Dataset nie znaleziony")
+
+        stats = self.db.get(DatasetStats, dataset_id)
+        if stats is None:
+            try:
+                stats = self.rebuild(dataset_id)
+            except Exception as e:
+                logger.error(f"Błąd podczas przeliczania statystyk datasetu: {str(e)}")
+                self.db.rollback()
+                raise HTTPException(status_code=500, detail=f"Błąd podczas przeliczania statystyk datasetu: {str(e)}")
+
+        # Klucz "None" to adnotacje bez klasy - raportowane osobno, poza rozkładem klas
+        class_counts = dict(stats.class_counts or {})
+        unclassified_count = class_counts.pop(str(None), 0)
+        class_counts = {int(class_id): count for class_id, count in class_counts.items()}
+        names = dict(self.db.query(Class.id, Class.name).filter(Class.id.in_(class_counts))) if class_counts else {}
+
+        return {
+            "dataset_id": dataset_id,
+            "images_count": stats.images_count,
+            "labeled_images_count": stats.labeled_images_count,
+            "annotations_count": stats.annotations_count,
+            "classes": [
+                {"class_id": class_id, "name": names.get(class_id), "count": count}
+                for class_id, count in sorted(class_counts.items(), key=lambda item: -item[1])
+            ],
+            "unclassified_count": unclassified_count,
+            "box_size_bins": list(BOX_SIZE_BINS),
+            "box_size_histogram": stats.box_size_histogram or [],
+            **class_imbalance(list(class_counts.values())),
+            "updated_at": stats.updated_at,
+        }
+
+    def get_summary(self) -> Dict[str, int]:
+        """Sumuje statystyki wszystkich datasetów (odczyt tabeli dataset_stats, bez skanowania obrazów)"""
+        return self.db.execute(summary_query()).one()._asdict()
+
+
+def summary_query():
+    """Zapytanie sumujące statystyki wszystkich datasetów"""
+    return select(
+        func.count(DatasetStats.dataset_id).label("datasets_count"),
+        func.coalesce(func.sum(DatasetStats.images_count), 0).label("images_count"),
+        func.coalesce(func.sum(DatasetStats.labeled_images_count), 0).label("labeled_images_count"),
+        func.coalesce(func.sum(DatasetStats.annotations_count), 0).label("annotations_count")
+    )
+
+
+def class_imbalance(counts: List[int]) -> Dict[str, Optional[float]]:
+    """
+    Miary niezbalansowania klas
+
+    imbalance_ratio - stosunek liczności najczęstszej do najrzadszej klasy,
+    class_entropy - entropia rozkładu klas znormalizowana do [0, 1] (1 - rozkład równomierny).
+    """
+    counts = [count for count in counts if count > 0]
+    if not counts:
+        return {"imbalance_ratio": None, "class_entropy": None}
+    if len(counts) == 1:
+        return {"imbalance_ratio": 1.0, "class_entropy": 1.0}
+
+    total = sum(counts)
+    entropy = -sum(count / total * math.log(count / total) for count in counts)
+    return {
+        "imbalance_ratio": max(counts) / min(counts),
+        "class_entropy": entropy / math.log(len(counts)),
+    }
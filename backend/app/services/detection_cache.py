@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+import struct
+
+import redis
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.detection_codec import unpack_results
+from app.models.models import DetectionCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    content_hash: str,
+    model,
+    conf_threshold: float,
+    iou_threshold: float,
+    variant: Optional[str] = None
+) -> str:
+    """
+    Klucz wyniku detekcji: treść obrazu, model z wersją, progi i tryb inferencji
+
+    Zmiana wersji modelu (np. po trenowaniu) lub progów daje nowy klucz, więc wpisy
+    nie wymagają jawnego unieważniania - stare wygasają po TTL. variant rozróżnia
+    tryby inferencji (np. ustawienia detekcji kafelkowej).
+    """
+    key = (
+        f"{settings.DETECTION_CACHE_PREFIX}:{content_hash}:{model.id}:{model.version or ''}"
+        f":{conf_threshold:.4f}:{iou_threshold:.4f}"
+    )
+    return f"{key}:{variant}" if variant else key
+
+
+# Wartość w Redis: ID detekcji (-1 = brak) i wynik w formacie detection_codec
+_DETECTION_ID = struct.Struct("<q")
+
+
+def _encode(detection_id: Optional[int], packed: bytes) -> bytes:
+    return _DETECTION_ID.pack(-1 if detection_id is None else detection_id) + bytes(packed)
+
+
+def _decode(raw: bytes) -> Dict[str, Any]:
+    (detection_id,) = _DETECTION_ID.unpack_from(raw, 0)
+    return {
+        "detection_id": None if detection_id < 0 else detection_id,
+        "results": unpack_results(raw[_DETECTION_ID.size:])
+    }
+
+
+class DetectionCache:
+    """
+    Cache wyników detekcji adresowany treścią obrazu
+
+    Wpisy (ID detekcji i spakowany wynik) trzymane są w Redis z TTL odnawianym przy
+    trafieniu; przy ograniczonej pamięci Redis usuwa najdawniej używane klucze z TTL
+    (polityka volatile-lru). Tabela detection_cache jest trwałą kopią - trafienie
+    w bazie ponownie zapisuje wpis w Redis. Błędy Redis są tylko logowane.
+    """
+
+    def __init__(self, db: Optional[Session] = None):
+        # Bez sesji dostępne są tylko operacje na Redis (np. release)
+        self.db = db
+        self.redis = get_redis()
+
+    @staticmethod
+    def _inflight_key(key: str) -> str:
+        return f"{key}:inflight"
+
+    def _db_cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=settings.DETECTION_CACHE_DB_TTL)
+
+    def _redis_set(self, entries: Dict[str, bytes]):
+        if not entries:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value in entries.items():
+                pipe.setex(key, settings.DETECTION_CACHE_TTL, value)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się zapisać wyników detekcji w Redis: {str(e)}")
+
+    def _db_get(self, keys: List[str]) -> Dict[str, bytes]:
+        """Zwraca wpisy z bazy zakodowane jak w Redis"""
+        rows = (
+            self.db.query(DetectionCacheEntry.key, DetectionCacheEntry.detection_id, DetectionCacheEntry.results_packed)
+            .filter(DetectionCacheEntry.key.in_(keys), DetectionCacheEntry.created_at >= self._db_cutoff())
+            .all()
+        )
+        return {row.key: _encode(row.detection_id, row.results_packed) for row in rows}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Zwraca wpis {"detection_id", "results"} lub None"""
+        try:
+            raw = self.redis.getex(key, ex=settings.DETECTION_CACHE_TTL)
+            if raw is not None:
+                return _decode(raw)
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się odczytać cache detekcji z Redis: {str(e)}")
+
+        found = self._db_get([key])
+        self._redis_set(found)
+        return _decode(found[key]) if key in found else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Zwraca znalezione wpisy dla listy kluczy (jedno MGET i jedno zapytanie do bazy)"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        found = {}
+        try:
+            for key, raw in zip(keys, self.redis.mget(keys)):
+                if raw is not None:
+                    found[key] = raw
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się odczytać cache detekcji z Redis: {str(e)}")
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            from_db = self._db_get(missing)
+            self._redis_set(from_db)
+            found.update(from_db)
+        return {key: _decode(raw) for key, raw in found.items()}
+
+    def set_many(self, entries: List[Dict[str, Any]]):
+        """
+        Zapisuje wyniki detekcji (słowniki z polami key, content_hash, model_id,
+        detection_id, results_packed, created_at)
+
+        Wiersze bazy dodawane są w transakcji wywołującego, a Redis zapisywany od razu.
+        """
+        if not entries:
+            return
+        rows = {entry["key"]: entry for entry in entries}
+        stmt = insert(DetectionCacheEntry).values(list(rows.values()))
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[DetectionCacheEntry.key],
+            set_={
+                "results_packed": stmt.excluded.results_packed,
+                "detection_id": stmt.excluded.detection_id,
+                "created_at": stmt.excluded.created_at,
+            }
+        ))
+        self._redis_set({
+            key: _encode(entry["detection_id"], entry["results_packed"]) for key, entry in rows.items()
+        })
+
+    def set(self, key: str, content_hash: str, model_id: int, detection_id: Optional[int], results_packed: bytes):
+        self.set_many([{
+            "key": key,
+            "content_hash": content_hash,
+            "model_id": model_id,
+            "detection_id": detection_id,
+            "results_packed": results_packed,
+            "created_at": datetime.now(timezone.utc),
+        }])
+
+    def claim(self, key: str, task_id: str) -> Optional[str]:
+        """
+        Rejestruje zadanie liczące wynik dla klucza
+
+        Returns:
+            None, jeśli zadanie zostało zarejestrowane, lub ID zadania, które już liczy ten wynik
+        """
+        try:
+            inflight = self._inflight_key(key)
+            if self.redis.set(inflight, task_id, nx=True, ex=settings.DETECTION_TIME_LIMIT):
+                return None
+            running = self.redis.get(inflight)
+            return running.decode() if running is not None else None
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się zarejestrować zadania detekcji w Redis: {str(e)}")
+            return None
+
+    def release(self, key: str):
+        try:
+            self.redis.delete(self._inflight_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się zwolnić zadania detekcji w Redis: {str(e)}")
+
+    def purge_expired(self) -> int:
+        """Usuwa z bazy wpisy starsze niż DETECTION_CACHE_DB_TTL"""
+        result = self.db.execute(
+            delete(DetectionCacheEntry).where(DetectionCacheEntry.created_at < self._db_cutoff())
+        )
+        self.db.commit()
+        return result.rowcount
@@ -1,23 +1,69 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select
+from typing import List, Optional, Callable, Dict, Any, Iterator, Tuple
 from app.db.session import get_db
-from app.schemas.schemas import DetectionCreate, DetectionResponse, DetectionList
-from app.models.models import Detection, Image
+from app.schemas.schemas import DetectionCreate, DetectionResponse, DetectionList, BulkDetectionCreate
+from app.models.models import Detection, Image, Model
 import os
-import uuid
-import shutil
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import numpy as np
 import cv2
-from app.ai_engines.training_engine import TrainingEngine
+import msgpack
+from app.services.minio_service import minio_service
+from app.core.config import settings
+from app.ai_engines.model_registry import model_registry
+from app.ai_engines.tiled_inference import TiledInference, tiling_variant
+from app.db.pagination import paginate, iter_batches, iter_ndjson
+from app.services.detection_cache import DetectionCache, cache_key
+from app.services.image_utils import content_hash
+from app.core.detection_codec import PackedResults, arrow_batch, iter_arrow_stream
 
 logger = logging.getLogger(__name__)
 
+# Formaty strumienia wyników detekcji
+STREAM_FORMATS = ("ndjson", "msgpack", "arrow")
+
+def detections_query(model_id: Optional[int] = None, image_id: Optional[int] = None):
+    """Zapytanie listy detekcji z opcjonalnym filtrem modelu i obrazu"""
+    query = select(Detection)
+    if model_id is not None:
+        query = query.where(Detection.model_id == model_id)
+    if image_id is not None:
+        query = query.where(Detection.image_id == image_id)
+    return query
+
+def msgpack_record(detection: Detection) -> Dict[str, Any]:
+    """Rekord detekcji dla msgpack: pola DetectionResponse, wyniki jako surowe tablice"""
+    packed = detection.packed
+    return {
+        "id": detection.id,
+        "image_id": detection.image_id,
+        "model_id": detection.model_id,
+        "status": detection.status,
+        "error": detection.error,
+        "processing_time": detection.processing_time,
+        "created_at": detection.created_at.isoformat() if detection.created_at else None,
+        "completed_at": detection.completed_at.isoformat() if detection.completed_at else None,
+        "results": packed.to_msgpack_dict() if packed is not None else None,
+    }
+
+class BatchDetectionError(Exception):
+    """Błąd detekcji partii obrazów z licznikami obrazów zatwierdzonych przed błędem"""
+
+    def __init__(self, message: str, processed: int, failed: int):
+        super().__init__(message)
+        self.processed = processed
+        self.failed = failed
+
+
 class DetectionService:
     def __init__(self, db: Session):
         self.db = db
-        self.training_engine = TrainingEngine()
+        self.cache = DetectionCache(db)
 
     def create_detection(self, detection_data: DetectionCreate) -> Detection:
         """Tworzy nowe zadanie detekcji w bazie danych"""
@@ -43,9 +89,34 @@ class DetectionService:
             raise HTTPException(status_code=404, detail="Zadanie detekcji nie znalezione")
         return detection
 
-    def get_detections(self, skip: int = 0, limit: int = 100) -> List[Detection]:
-        """Pobiera listę zadań detekcji"""
-        return self.db.query(Detection).offset(skip).limit(limit).all()
+    def get_detections(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Pobiera stronę listy zadań detekcji (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, select(Detection), Detection, limit, cursor, skip)
+
+    def stream_detections(
+        self,
+        stream_format: str = "ndjson",
+        model_id: Optional[int] = None,
+        image_id: Optional[int] = None
+    ) -> Iterator[Any]:
+        """
+        Zwraca detekcje jako strumień NDJSON, msgpack (kolejne mapy) lub Arrow IPC
+
+        msgpack i Arrow korzystają bezpośrednio ze spakowanych tablic wyników -
+        Arrow zawiera jeden wiersz na wykryty obiekt.
+        """
+        query = detections_query(model_id, image_id)
+        if stream_format == "msgpack":
+            return (
+                b"".join(msgpack.packb(msgpack_record(item)) for item in items)
+                for items in iter_batches(self.db, query, Detection)
+            )
+        if stream_format == "arrow":
+            return iter_arrow_stream(
+                arrow_batch((item.id, item.image_id, item.packed) for item in items)
+                for items in iter_batches(self.db, query, Detection)
+            )
+        return iter_ndjson(self.db, query, Detection, DetectionResponse)
 
     def update_detection(self, detection_id: int, detection_data: dict) -> Detection:
         """Aktualizuje zadanie detekcji"""
@@ -65,13 +136,221 @@ class DetectionService:
         self.db.commit()
         return True
         
-    def process_detection(self, image_id: int, model_id: int) -> dict:
-        """Przetwarza zadanie detekcji"""
-        # Pobierz obraz
+    def load_image(self, image: Image) -> np.ndarray:
+        """Pobiera obraz z MinIO i dekoduje go do tablicy BGR"""
+        return self.load_image_data(image)[0]
+
+    def load_image_data(self, image: Image) -> Tuple[np.ndarray, str]:
+        """Pobiera obraz z MinIO i zwraca tablicę BGR oraz skrót SHA-256 pliku"""
+        data = minio_service.read_object(settings.IMAGES_BUCKET, image.path)
+        decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if decoded is None:
+            raise ValueError(f"Nie można zdekodować obrazu {image.path}")
+        return decoded, content_hash(data)
+
+    @staticmethod
+    def resolve_thresholds(conf_threshold: Optional[float], iou_threshold: Optional[float]) -> Tuple[float, float]:
+        return (
+            settings.DEFAULT_CONFIDENCE_THRESHOLD if conf_threshold is None else conf_threshold,
+            settings.DEFAULT_IOU_THRESHOLD if iou_threshold is None else iou_threshold,
+        )
+
+    def _cache_key(
+        self, image: Image, model: Model, conf_threshold: float, iou_threshold: float, variant: Optional[str] = None
+    ) -> Optional[str]:
+        if not settings.DETECTION_CACHE_ENABLED or not image.content_hash:
+            return None
+        return cache_key(image.content_hash, model, conf_threshold, iou_threshold, variant)
+
+    @staticmethod
+    def _variant(tile_size: Optional[int], tile_overlap: Optional[float]) -> Optional[str]:
+        """Wariant klucza cache - tylko dla detekcji kafelkowej"""
+        return tiling_variant(tile_size, tile_overlap) if tile_size else None
+
+    @staticmethod
+    def _predictor(engine, tile_size: Optional[int], tile_overlap: Optional[float]):
+        """Silnik inferencji lub (gdy podano tile_size) detekcja kafelkowa na tym silniku"""
+        return TiledInference(engine, tile_size, tile_overlap) if tile_size else engine
+
+    def _get_image_and_model(self, image_id: int, model_id: int) -> Tuple[Image, Model]:
         image = self.db.query(Image).filter(Image.id == image_id).first()
         if not image:
             raise HTTPException(status_code=404, detail="Obraz nie znaleziony")
-        
+        model = self.db.query(Model).filter(Model.id == model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+        return image, model
+
+    def lookup_cached(
+        self,
+        image_id: int,
+        model_id: int,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        tile_size: Optional[int] = None,
+        tile_overlap: Optional[float] = None
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Sprawdza cache wyników przed zleceniem detekcji
+
+        Returns:
+            Krotka (klucz cache, wpis {"detection_id", "results"}); klucz jest None,
+            gdy obraz nie ma jeszcze skrótu treści (zostanie policzony przez worker)
+        """
+        image, model = self._get_image_and_model(image_id, model_id)
+        key = self._cache_key(
+            image, model, *self.resolve_thresholds(conf_threshold, iou_threshold), self._variant(tile_size, tile_overlap)
+        )
+        if key is None:
+            return None, None
+        return key, self.cache.get(key)
+
+    def get_bulk_image_ids(self, bulk_data: BulkDetectionCreate) -> List[int]:
+        """Zwraca ID obrazów objętych detekcją masową (z datasetu lub z listy)"""
+        if not self.db.query(Model.id).filter(Model.id == bulk_data.model_id).first():
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+
+        if bulk_data.dataset_id is not None:
+            rows = self.db.query(Image.id).filter(Image.dataset_id == bulk_data.dataset_id).order_by(Image.id).all()
+            return [row.id for row in rows]
+
+        return list(dict.fromkeys(bulk_data.image_ids))
+
+    def _try_load_image(self, image: Image) -> Optional[Tuple[np.ndarray, str]]:
+        try:
+            return self.load_image_data(image)
+        except Exception as e:
+            logger.error(f"Błąd podczas pobierania obrazu {image.id}: {str(e)}")
+            return None
+
+    def process_detection_batch(
+        self,
+        image_ids: List[int],
+        model_id: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        tile_size: Optional[int] = None,
+        tile_overlap: Optional[float] = None
+    ) -> dict:
+        """
+        Przetwarza detekcję dla partii obrazów w jednym zadaniu
+
+        Model pobierany jest raz, obrazy ściągane równolegle, a inferencja i zapis
+        wyników odbywają się w partiach po INFERENCE_BATCH_SIZE obrazów. Obrazy
+        z wynikiem w cache są pomijane (bez pobierania i bez nowego rekordu Detection).
+        Z tile_size każdy obraz przetwarzany jest kafelkami (TiledInference).
+        """
+        model = self.db.query(Model).filter(Model.id == model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+        conf_threshold, iou_threshold = self.resolve_thresholds(conf_threshold, iou_threshold)
+
+        images = self.db.query(Image).filter(Image.id.in_(image_ids)).all()
+        total = len(image_ids)
+        processed = total - len(images)
+        failed = processed
+
+        variant = self._variant(tile_size, tile_overlap)
+        keys = {image.id: self._cache_key(image, model, conf_threshold, iou_threshold, variant) for image in images}
+        cached = self.cache.get_many(key for key in keys.values() if key)
+        pending = [image for image in images if keys[image.id] not in cached]
+        processed += len(images) - len(pending)
+        if progress_callback and len(pending) < len(images):
+            progress_callback(processed, total)
+
+        try:
+            engine = model_registry.get(model) if pending else None
+            predictor = self._predictor(engine, tile_size, tile_overlap) if pending else None
+            batch_size = settings.INFERENCE_BATCH_SIZE
+
+            with ThreadPoolExecutor(max_workers=settings.DETECTION_DOWNLOAD_WORKERS) as pool:
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
+                    decoded = list(pool.map(self._try_load_image, batch))
+                    loaded = [(image, *data) for image, data in zip(batch, decoded) if data is not None]
+
+                    started = time.perf_counter()
+                    arrays = predictor.predict_arrays([array for _, array, _ in loaded], conf_threshold, iou_threshold) if loaded else []
+                    # Czas partii rozkładany jest równo na obrazy
+                    processing_time = round((time.perf_counter() - started) / max(len(loaded), 1), 4)
+                    completed_at = datetime.now(timezone.utc)
+
+                    packed = [
+                        PackedResults.from_arrays(boxes, scores, class_ids, engine.names, processing_time).to_bytes()
+                        for boxes, scores, class_ids in arrays
+                    ]
+                    detections = [
+                        Detection(
+                            image_id=image.id,
+                            model_id=model_id,
+                            status="completed",
+                            results_packed=image_packed,
+                            processing_time=processing_time,
+                            completed_at=completed_at
+                        )
+                        for (image, _, _), image_packed in zip(loaded, packed)
+                    ]
+                    failures = [
+                        Detection(image_id=image.id, model_id=model_id, status="failed", error="Nie można pobrać obrazu")
+                        for image, data in zip(batch, decoded) if data is None
+                    ]
+                    self.db.add_all(detections + failures)
+                    self.db.flush()
+
+                    entries = []
+                    for (image, _, digest), detection in zip(loaded, detections):
+                        # Uzupełnienie skrótu obrazów sprzed wprowadzenia content_hash
+                        if image.content_hash != digest:
+                            image.content_hash = digest
+                        if settings.DETECTION_CACHE_ENABLED:
+                            entries.append({
+                                "key": cache_key(digest, model, conf_threshold, iou_threshold, variant),
+                                "content_hash": digest,
+                                "model_id": model_id,
+                                "detection_id": detection.id,
+                                "results_packed": detection.results_packed,
+                                "created_at": completed_at,
+                            })
+                    self.cache.set_many(entries)
+                    self.db.commit()
+
+                    processed += len(batch)
+                    failed += len(batch) - len(loaded)
+                    if progress_callback:
+                        progress_callback(processed, total)
+
+        except Exception as e:
+            # Partie zatwierdzone przed błędem pozostają w bazie - zadanie raportuje ich liczniki
+            raise BatchDetectionError(str(e), processed, failed) from e
+
+        return {"model_id": model_id, "processed": processed, "failed": failed, "cached": len(images) - len(pending)}
+
+    def process_detection(
+        self,
+        image_id: int,
+        model_id: int,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None,
+        tile_size: Optional[int] = None,
+        tile_overlap: Optional[float] = None
+    ) -> dict:
+        """
+        Przetwarza zadanie detekcji
+
+        Wynik z cache (ten sam plik, model, wersja, progi i ustawienia kafelków) zwracany
+        jest bez inferencji i bez tworzenia nowego rekordu Detection. Z tile_size obraz
+        przetwarzany jest kafelkami (obrazy wysokiej rozdzielczości).
+        """
+        image, model = self._get_image_and_model(image_id, model_id)
+        conf_threshold, iou_threshold = self.resolve_thresholds(conf_threshold, iou_threshold)
+        variant = self._variant(tile_size, tile_overlap)
+
+        key = self._cache_key(image, model, conf_threshold, iou_threshold, variant)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return {**cached["results"], "detection_id": cached["detection_id"], "cached": True}
+
         # Utwórz zadanie detekcji
         detection_data = DetectionCreate(image_id=image_id, model_id=model_id)
         detection = self.create_detection(detection_data)
@@ -80,26 +359,34 @@ class DetectionService:
         self.update_detection(detection.id, {"status": "processing"})
         
         try:
-            # Tutaj logika detekcji obiektów
-            # W rzeczywistej implementacji użylibyśmy modelu YOLO
-            # Na potrzeby przykładu zwracamy fikcyjne wyniki
-            
-            results = {
-                "objects": [
-                    {"class": "person", "confidence": 0.95, "bbox": [10, 20, 100, 200]},
-                    {"class": "car", "confidence": 0.87, "bbox": [150, 30, 250, 180]},
-                ],
-                "processing_time": 0.45
-            }
+            started = time.perf_counter()
+            engine = model_registry.get(model)
+            array, digest = self.load_image_data(image)
+            predictor = self._predictor(engine, tile_size, tile_overlap)
+            boxes, scores, class_ids = predictor.predict_arrays([array], conf_threshold, iou_threshold)[0]
+            processing_time = round(time.perf_counter() - started, 4)
+            packed = PackedResults.from_arrays(boxes, scores, class_ids, engine.names, processing_time)
+            results = packed.to_dict()
+
+            # Uzupełnienie skrótu obrazów sprzed wprowadzenia content_hash
+            if image.content_hash != digest:
+                image.content_hash = digest
+            if settings.DETECTION_CACHE_ENABLED:
+                self.cache.set(
+                    cache_key(digest, model, conf_threshold, iou_threshold, variant), digest, model_id, detection.id, packed.to_bytes()
+                )
             
             # Aktualizacja statusu i wyników
             self.update_detection(detection.id, {
                 "status": "completed",
-                "results": results
+                "results": packed,
+                "processing_time": processing_time,
+                "completed_at": datetime.now(timezone.utc)
             })
             
-            return results
+            return {**results, "detection_id": detection.id, "cached": False}
         except Exception as e:
             logger.error(f"Błąd podczas detekcji: {str(e)}")
+            self.db.rollback()
             self.update_detection(detection.id, {"status": "failed", "error": str(e)})
             raise HTTPException(status_code=500, detail=f"Błąd podczas detekcji: {str(e)}")
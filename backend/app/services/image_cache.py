@@ -0,0 +1,156 @@
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.services.minio_service import minio_service
+from concurrent.futures import ThreadPoolExecutor
+import os
+import uuid
+import errno
+import fcntl
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """
+    Lokalny cache obrazów z MinIO adresowany treścią (SHA-256 pliku)
+
+    Pliki leżą w <root>/objects/<2 znaki>/<klucz>. Czas modyfikacji pliku odnawiany jest
+    przy każdym użyciu i służy jako znacznik LRU. Po przekroczeniu budżetu MAX_BYTES
+    usuwane są najdawniej używane pliki - z pominięciem plików, do których istnieją
+    twarde dowiązania (st_nlink > 1), bo używa ich przygotowany dataset i usunięcie
+    nie zwolniłoby miejsca.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or settings.IMAGE_CACHE_DIR
+        self.max_bytes = settings.IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.objects_dir = os.path.join(self.root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(content_hash: Optional[str], object_name: str) -> str:
+        """Klucz wpisu - skrót treści lub (dla obrazów bez skrótu) skrót nazwy obiektu"""
+        if content_hash:
+            return content_hash
+        return "obj-" + hashlib.sha256(object_name.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[-2:], key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Zwraca ścieżkę pliku z cache (odnawiając znacznik LRU) lub None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, key: str, object_name: str, bucket: Optional[str] = None) -> str:
+        """Zwraca ścieżkę pliku z cache, pobierając go z MinIO przy chybieniu"""
+        path = self.get(key)
+        if path is not None:
+            with self._lock:
+                self.hits += 1
+            return path
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            minio_service.client.fget_object(bucket or settings.IMAGES_BUCKET, object_name, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.misses += 1
+        return path
+
+    def fetch_many(self, items: Iterable[Tuple[str, str]], workers: Optional[int] = None) -> Dict[str, str]:
+        """
+        Pobiera równolegle brakujące obiekty (pary (klucz, nazwa obiektu w buckecie images))
+
+        Nie usuwa plików ponad budżet - wywołujący woła evict() po utworzeniu dowiązań,
+        aby świeżo pobrane pliki nie zostały usunięte przed użyciem.
+
+        Returns:
+            Dict klucz -> ścieżka pliku w cache
+        """
+        items = list(dict(items).items())
+        with ThreadPoolExecutor(max_workers=workers or settings.TRAINING_DOWNLOAD_WORKERS) as pool:
+            paths = list(pool.map(lambda item: self.fetch(*item), items))
+        return {key: path for (key, _), path in zip(items, paths)}
+
+    def link(self, key: str, destination: str):
+        """
+        Tworzy widok pliku z cache pod ścieżką destination
+
+        Twarde dowiązanie (ten sam wolumen), a przy innym systemie plików dowiązanie symboliczne.
+        """
+        source = self.path(key)
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            os.symlink(source, destination)
+
+    def _entries(self) -> List[Tuple[float, int, int, str]]:
+        """Lista (mtime, rozmiar, liczba dowiązań, ścieżka) plików w cache"""
+        entries = []
+        for directory, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, stat.st_nlink, path))
+        return entries
+
+    def evict(self) -> int:
+        """Usuwa najdawniej używane pliki ponad budżet; zwraca liczbę zwolnionych bajtów"""
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._entries()
+            total = sum(size for _, size, _, _ in entries)
+            if total <= self.max_bytes:
+                return 0
+
+            # Usuwamy do 90% budżetu, aby nie skanować katalogu przy każdym kolejnym pobraniu
+            target = int(self.max_bytes * 0.9)
+            freed = 0
+            for _, size, links, path in sorted(entries):
+                if total - freed <= target:
+                    break
+                if links > 1:
+                    continue
+                try:
+                    os.remove(path)
+                    freed += size
+                except FileNotFoundError:
+                    pass
+
+        logger.info(f"Cache obrazów: zwolniono {freed} B (zajętość {total - freed} B, budżet {self.max_bytes} B)")
+        return freed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "files": len(entries),
+            "current_bytes": sum(size for _, size, _, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
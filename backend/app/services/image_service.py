@@ -1,63 +1,72 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select
+from typing import List, Optional, Dict, Any, Iterator
 from app.db.session import get_db
 from app.schemas.schemas import ImageCreate, ImageResponse, ImageList
-from app.models.models import Image
-import os
+from app.models.models import Image, Annotation
 import uuid
-import shutil
 import logging
-from minio import Minio
+from PIL import UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
-import cv2
-import numpy as np
+from app.services.image_utils import read_image_header, get_stream_size, HashingReader
+from app.services.minio_service import minio_service
+from app.services.dataset_stats_service import DatasetStatsService
+from app.services.thumbnail_service import ThumbnailService
+from app.db.pagination import paginate, iter_ndjson
 
 logger = logging.getLogger(__name__)
 
+def images_query(dataset_id: Optional[int] = None):
+    """Zapytanie listy obrazów (wspólne dla sesji synchronicznej i asynchronicznej)"""
+    query = select(Image)
+    if dataset_id is not None:
+        query = query.where(Image.dataset_id == dataset_id)
+    return query
+
 class ImageService:
     def __init__(self, db: Session):
         self.db = db
-        self.upload_dir = settings.UPLOAD_DIR
-        os.makedirs(self.upload_dir, exist_ok=True)
-        
-        # Inicjalizacja klienta MinIO
-        self.minio_client = Minio(
-            settings.MINIO_URL,
-            access_key=settings.MINIO_ROOT_USER,
-            secret_key=settings.MINIO_ROOT_PASSWORD,
-            secure=False
-        )
         
-        # Upewnij się, że bucket istnieje
-        if not self.minio_client.bucket_exists("images"):
-            self.minio_client.make_bucket("images")
-            self.minio_client.set_bucket_policy("images", '{"Version":"2012-10-17","Statement":[{"Effect":"Allow","Principal":{"AWS":["*"]},"Action":["s3:GetObject"],"Resource":["arn:aws:s3:::images/*"]}]}')
+        # Współdzielony klient MinIO (buckety tworzone są raz przy starcie aplikacji)
+        self.minio_client = minio_service.client
+        self.stats = DatasetStatsService(db)
 
     async def upload_image(self, file: UploadFile, dataset_id: Optional[int] = None) -> Image:
-        """Przesyła nowy obraz"""
+        """
+        Przesyła nowy obraz
+
+        Plik jest strumieniowany bezpośrednio do MinIO (multipart dla dużych plików),
+        skrót SHA-256 liczony w trakcie tego samego odczytu, a wymiary odczytywane
+        są z nagłówka obrazu. Blokujące wywołania SDK i bazy
+        danych wykonywane są w puli wątków, aby nie blokować pętli zdarzeń.
+        """
+        file_extension = file.filename.split(".")[-1].lower()
+        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+
         try:
-            # Generuj unikalną nazwę pliku
-            file_extension = file.filename.split(".")[-1]
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            file_path = os.path.join(self.upload_dir, unique_filename)
-            
-            # Zapisz plik lokalnie
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Odczytaj wymiary obrazu
-            img = cv2.imread(file_path)
-            height, width = img.shape[:2]
-            
+            width, height, _ = await run_in_threadpool(read_image_header, file.file)
+        except UnidentifiedImageError:
+            raise HTTPException(status_code=400, detail="Przesłany plik nie jest obsługiwanym obrazem")
+
+        uploaded = False
+        try:
+            size = get_stream_size(file.file)
+            reader = HashingReader(file.file)
+
             # Prześlij plik do MinIO
-            self.minio_client.fput_object(
-                "images", 
-                unique_filename, 
-                file_path,
+            await run_in_threadpool(
+                self.minio_client.put_object,
+                settings.IMAGES_BUCKET,
+                unique_filename,
+                reader,
+                length=size,
+                part_size=settings.MINIO_PART_SIZE,
                 content_type=f"image/{file_extension}"
             )
-            
+            uploaded = True
+
             # Utwórz rekord w bazie danych
             new_image = Image(
                 name=file.filename,
@@ -65,25 +74,27 @@ class ImageService:
                 width=width,
                 height=height,
                 format=file_extension,
-                size=os.path.getsize(file_path),
+                size=size,
+                content_hash=reader.hexdigest(),
                 dataset_id=dataset_id
             )
-            
-            self.db.add(new_image)
-            self.db.commit()
-            self.db.refresh(new_image)
-            
-            # Usuń lokalny plik po przesłaniu do MinIO
-            os.remove(file_path)
-            
-            return new_image
+            return await run_in_threadpool(self._save_image, new_image)
         except Exception as e:
             logger.error(f"Błąd podczas przesyłania obrazu: {str(e)}")
             self.db.rollback()
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            if uploaded:
+                await run_in_threadpool(self.minio_client.remove_object, settings.IMAGES_BUCKET, unique_filename)
             raise HTTPException(status_code=500, detail=f"Błąd podczas przesyłania obrazu: {str(e)}")
 
+    def _save_image(self, image: Image) -> Image:
+        self.db.add(image)
+        self.db.flush()
+        self.stats.record_images([(image.dataset_id, False)])
+        self.stats.flush()
+        self.db.commit()
+        self.db.refresh(image)
+        return image
+
     def get_image(self, image_id: int) -> Image:
         """Pobiera obraz po ID"""
         image = self.db.query(Image).filter(Image.id == image_id).first()
@@ -91,14 +102,13 @@ class ImageService:
             raise HTTPException(status_code=404, detail="Obraz nie znaleziony")
         return image
 
-    def get_images(self, skip: int = 0, limit: int = 100, dataset_id: Optional[int] = None) -> List[Image]:
-        """Pobiera listę obrazów"""
-        query = self.db.query(Image)
-        
-        if dataset_id is not None:
-            query = query.filter(Image.dataset_id == dataset_id)
-        
-        return query.offset(skip).limit(limit).all()
+    def get_images(self, skip: int = 0, limit: int = 100, dataset_id: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Pobiera stronę listy obrazów (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, images_query(dataset_id), Image, limit, cursor, skip)
+
+    def stream_images(self, dataset_id: Optional[int] = None) -> Iterator[str]:
+        """Zwraca wszystkie obrazy jako strumień NDJSON"""
+        return iter_ndjson(self.db, images_query(dataset_id), Image, ImageResponse)
 
     def delete_image(self, image_id: int) -> bool:
         """Usuwa obraz"""
@@ -106,8 +116,19 @@ class ImageService:
         
         try:
             # Usuń plik z MinIO
-            self.minio_client.remove_object("images", image.path)
+            self.minio_client.remove_object(settings.IMAGES_BUCKET, image.path)
+            ThumbnailService(self.db).delete(image)
             
+            # Odejmij obraz i jego adnotacje od statystyk datasetu
+            annotations = [
+                dict(row) for row in self.db.execute(
+                    select(*Annotation.__table__.columns).where(Annotation.image_id == image.id)
+                ).mappings()
+            ]
+            self.stats.record_annotations(annotations, sign=-1)
+            self.stats.record_images([(image.dataset_id, image.is_labeled)], sign=-1)
+            self.stats.flush()
+
             # Usuń rekord z bazy danych
             self.db.delete(image)
             self.db.commit()
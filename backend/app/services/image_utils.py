@@ -0,0 +1,63 @@
+import hashlib
+import os
+from typing import BinaryIO, Tuple
+from PIL import Image as PILImage
+
+# Wartości znacznika EXIF Orientation oznaczające obrót o 90/270 stopni
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def read_image_header(stream: BinaryIO) -> Tuple[int, int, str]:
+    """
+    Odczytuje wymiary i format obrazu z nagłówka pliku, bez dekodowania pikseli
+
+    Wymiary uwzględniają orientację EXIF (tak jak cv2.imread). Pozycja strumienia
+    jest przywracana po odczycie.
+
+    Returns:
+        Krotka (szerokość, wysokość, format)
+    """
+    position = stream.tell()
+    try:
+        with PILImage.open(stream) as img:
+            width, height = img.size
+            image_format = (img.format or "").lower()
+            if img.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+                width, height = height, width
+    finally:
+        stream.seek(position)
+    return width, height, image_format
+
+
+def get_stream_size(stream: BinaryIO) -> int:
+    """Zwraca rozmiar strumienia w bajtach, przywracając jego pozycję"""
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+class HashingReader:
+    """
+    Opakowanie strumienia liczące SHA-256 odczytanych danych
+
+    Pozwala wyznaczyć skrót treści pliku w trakcie jednokrotnego przesyłania do MinIO.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self._hash.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    """Zwraca skrót SHA-256 (hex) treści pliku"""
+    return hashlib.sha256(data).hexdigest()
@@ -1,284 +1,251 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-import json
-from typing import List, Optional, Dict, Any
+from sqlalchemy import insert, update, delete, exists, select
+from typing import List, Optional, Iterable, Dict, Any, Iterator
+import logging
 
-from app.models.models import Label, Image, ObjectClass
-from app.schemas.schemas import LabelCreate, LabelResponse, LabelsResponse
+from app.models.models import Annotation, Image, Class
+from app.schemas.schemas import AnnotationCreate, AnnotationUpsert, AnnotationResponse
+from app.db.pagination import paginate, iter_ndjson
+from app.services.dataset_stats_service import DatasetStatsService
+
+logger = logging.getLogger(__name__)
+
+# Pola adnotacji porównywane przy wyznaczaniu różnic
+ANNOTATION_FIELDS = ("x", "y", "width", "height", "format", "class_id")
+
+def labels_query(image_id: Optional[int] = None, class_id: Optional[int] = None):
+    """Zapytanie listy adnotacji (wspólne dla sesji synchronicznej i asynchronicznej)"""
+    query = select(Annotation)
+
+    if image_id is not None:
+        query = query.where(Annotation.image_id == image_id)
+
+    if class_id is not None:
+        query = query.where(Annotation.class_id == class_id)
+
+    return query
 
 class LabelService:
-    @staticmethod
-    def create_label(db: Session, label: LabelCreate) -> LabelResponse:
-        """
-        Tworzy nową etykietę dla obrazu.
-        """
+    def __init__(self, db: Session):
+        self.db = db
+        self.stats = DatasetStatsService(db)
+
+    def _check_images_exist(self, image_ids: Iterable[int]):
+        """Sprawdza jednym zapytaniem, czy wszystkie obrazy istnieją"""
+        image_ids = set(image_ids)
+        found = {row.id for row in self.db.query(Image.id).filter(Image.id.in_(image_ids))}
+        missing = sorted(image_ids - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Obrazy nie znalezione: {missing}")
+
+    def _check_classes_exist(self, class_ids: Iterable[int]):
+        """Sprawdza jednym zapytaniem, czy wszystkie klasy istnieją"""
+        class_ids = set(class_ids)
+        found = {row.id for row in self.db.query(Class.id).filter(Class.id.in_(class_ids))}
+        missing = sorted(class_ids - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Klasy nie znalezione: {missing}")
+
+    def _refresh_is_labeled(self, image_ids: Iterable[int]):
+        """Ustawia Image.is_labeled na podstawie istnienia adnotacji (jeden UPDATE) i rejestruje zmiany w statystykach"""
+        has_annotations = exists().where(Annotation.image_id == Image.id)
+        changed = self.db.execute(
+            update(Image)
+            .where(Image.id.in_(set(image_ids)), Image.is_labeled.is_distinct_from(has_annotations))
+            .values(is_labeled=has_annotations)
+            .returning(Image.dataset_id, Image.is_labeled)
+            .execution_options(synchronize_session=False)
+        )
+        self.stats.record_labeled_changes(changed)
+
+    def create_label(self, label: AnnotationCreate) -> Dict[str, Any]:
+        """Tworzy nową adnotację"""
+        return self.create_multiple_labels([label])[0]
+
+    def get_label(self, annotation_id: int) -> Annotation:
+        """Pobiera adnotację po ID"""
+        annotation = self.db.query(Annotation).filter(Annotation.id == annotation_id).first()
+        if not annotation:
+            raise HTTPException(status_code=404, detail="Adnotacja nie znaleziona")
+        return annotation
+
+    def get_labels(
+        self,
+        image_id: Optional[int] = None,
+        class_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Pobiera stronę listy adnotacji (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, labels_query(image_id, class_id), Annotation, limit, cursor, skip)
+
+    def stream_labels(self, image_id: Optional[int] = None, class_id: Optional[int] = None) -> Iterator[str]:
+        """Zwraca wszystkie adnotacje jako strumień NDJSON"""
+        return iter_ndjson(self.db, labels_query(image_id, class_id), Annotation, AnnotationResponse)
+
+    def update_label(self, annotation_id: int, label: AnnotationCreate) -> Annotation:
+        """Aktualizuje adnotację"""
+        annotation = self.get_label(annotation_id)
+        self._check_images_exist([label.image_id])
+        self._check_classes_exist([label.class_id])
+
         try:
-            # Sprawdzenie, czy obraz istnieje
-            image = db.query(Image).filter(Image.id == label.image_id).first()
-            if not image:
-                return LabelResponse(
-                    success=False,
-                    message=f"Obraz o ID {label.image_id} nie został znaleziony"
-                )
-            
-            # Sprawdzenie, czy klasa istnieje
-            object_class = db.query(ObjectClass).filter(ObjectClass.id == label.class_id).first()
-            if not object_class:
-                return LabelResponse(
-                    success=False,
-                    message=f"Klasa o ID {label.class_id} nie została znaleziona"
-                )
-            
-            # Konwersja współrzędnych do formatu JSON
-            coordinates_json = json.dumps(label.coordinates)
-            
-            # Utworzenie etykiety
-            db_label = Label(
-                image_id=label.image_id,
-                class_id=label.class_id,
-                type=label.type,
-                coordinates=coordinates_json,
-                confidence=label.confidence
-            )
-            
-            db.add(db_label)
-            db.commit()
-            db.refresh(db_label)
-            
-            # Oznaczenie obrazu jako oznaczonego
-            image.is_labeled = True
-            db.commit()
-            
-            return LabelResponse(
-                success=True,
-                message="Etykieta została pomyślnie utworzona",
-                data=db_label
-            )
+            previous = {column.name: getattr(annotation, column.name) for column in Annotation.__table__.columns}
+            self.stats.record_annotations([previous], sign=-1)
+            for key, value in label.dict().items():
+                setattr(annotation, key, value)
+            self.db.flush()
+            self.stats.record_annotations([label.dict()])
+            self._refresh_is_labeled({previous["image_id"], label.image_id})
+            self.stats.flush()
+            self.db.commit()
+            self.db.refresh(annotation)
+            return annotation
         except Exception as e:
-            return LabelResponse(
-                success=False,
-                message=f"Błąd podczas tworzenia etykiety: {str(e)}"
-            )
-    
-    @staticmethod
-    def get_labels(db: Session, image_id: Optional[int] = None, class_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> LabelsResponse:
-        """
-        Pobiera listę etykiet.
-        """
+            logger.error(f"Błąd podczas aktualizacji adnotacji: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas aktualizacji adnotacji: {str(e)}")
+
+    def delete_label(self, annotation_id: int) -> bool:
+        """Usuwa adnotację i oznacza obraz jako nieoznaczony, jeśli nie ma już adnotacji"""
+        annotation = self.get_label(annotation_id)
+        image_id = annotation.image_id
+
         try:
-            query = db.query(Label)
-            
-            if image_id is not None:
-                query = query.filter(Label.image_id == image_id)
-            
-            if class_id is not None:
-                query = query.filter(Label.class_id == class_id)
-            
-            total = query.count()
-            labels = query.offset(skip).limit(limit).all()
-            
-            # Konwersja współrzędnych z formatu JSON
-            for label in labels:
-                label.coordinates = json.loads(label.coordinates)
-            
-            return LabelsResponse(
-                success=True,
-                message=f"Znaleziono {len(labels)} etykiet",
-                data=labels,
-                total=total
+            self.stats.record_annotations(
+                [{column.name: getattr(annotation, column.name) for column in Annotation.__table__.columns}],
+                sign=-1
             )
+            self.db.delete(annotation)
+            self.db.flush()
+            self._refresh_is_labeled([image_id])
+            self.stats.flush()
+            self.db.commit()
+            return True
         except Exception as e:
-            return LabelsResponse(
-                success=False,
-                message=f"Błąd podczas pobierania etykiet: {str(e)}"
-            )
-    
-    @staticmethod
-    def get_label(db: Session, label_id: int) -> LabelResponse:
+            logger.error(f"Błąd podczas usuwania adnotacji: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas usuwania adnotacji: {str(e)}")
+
+    def create_multiple_labels(self, labels: List[AnnotationCreate]) -> List[Dict[str, Any]]:
         """
-        Pobiera etykietę o podanym ID.
+        Tworzy wiele adnotacji jednocześnie w jednej transakcji
+
+        Istnienie obrazów i klas sprawdzane jest jednym zapytaniem IN dla każdej tabeli,
+        adnotacje wstawiane są jednym INSERT ... RETURNING (executemany), a Image.is_labeled
+        ustawiane jednym UPDATE. Zwracane są wiersze z RETURNING, więc nie trzeba
+        odświeżać utworzonych obiektów po zatwierdzeniu transakcji.
         """
+        if not labels:
+            return []
+
+        image_ids = {label.image_id for label in labels}
+        self._check_images_exist(image_ids)
+        self._check_classes_exist(label.class_id for label in labels)
+
         try:
-            label = db.query(Label).filter(Label.id == label_id).first()
-            
-            if not label:
-                return LabelResponse(
-                    success=False,
-                    message=f"Etykieta o ID {label_id} nie została znaleziona"
-                )
-            
-            # Konwersja współrzędnych z formatu JSON
-            label.coordinates = json.loads(label.coordinates)
-            
-            return LabelResponse(
-                success=True,
-                message="Etykieta została znaleziona",
-                data=label
+            created = [
+                dict(row) for row in self.db.execute(
+                    insert(Annotation).returning(*Annotation.__table__.columns),
+                    [label.dict() for label in labels]
+                ).mappings()
+            ]
+
+            labeled = self.db.execute(
+                update(Image)
+                .where(Image.id.in_(image_ids), Image.is_labeled.is_(False))
+                .values(is_labeled=True)
+                .returning(Image.dataset_id, Image.is_labeled)
+                .execution_options(synchronize_session=False)
             )
+            self.stats.record_labeled_changes(labeled)
+            self.stats.record_annotations(created)
+            self.stats.flush()
+            self.db.commit()
+            return created
         except Exception as e:
-            return LabelResponse(
-                success=False,
-                message=f"Błąd podczas pobierania etykiety: {str(e)}"
-            )
-    
-    @staticmethod
-    def update_label(db: Session, label_id: int, label: LabelCreate) -> LabelResponse:
+            logger.error(f"Błąd podczas tworzenia adnotacji: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia adnotacji: {str(e)}")
+
+    def replace_annotations(self, annotations_by_image: Dict[int, List[AnnotationUpsert]]) -> List[Dict[str, Any]]:
         """
-        Aktualizuje etykietę o podanym ID.
+        Zastępuje wszystkie adnotacje podanych obrazów w jednej transakcji
+
+        Nowy stan porównywany jest z istniejącymi wierszami: adnotacje z ID są
+        aktualizowane (tylko jeśli się zmieniły), bez ID - wstawiane, a brakujące
+        w żądaniu - usuwane. Każda z operacji wykonywana jest jednym zapytaniem.
+
+        Returns:
+            Aktualne adnotacje podanych obrazów
         """
-        try:
-            db_label = db.query(Label).filter(Label.id == label_id).first()
-            
-            if not db_label:
-                return LabelResponse(
-                    success=False,
-                    message=f"Etykieta o ID {label_id} nie została znaleziona"
-                )
-            
-            # Sprawdzenie, czy obraz istnieje
-            image = db.query(Image).filter(Image.id == label.image_id).first()
-            if not image:
-                return LabelResponse(
-                    success=False,
-                    message=f"Obraz o ID {label.image_id} nie został znaleziony"
-                )
-            
-            # Sprawdzenie, czy klasa istnieje
-            object_class = db.query(ObjectClass).filter(ObjectClass.id == label.class_id).first()
-            if not object_class:
-                return LabelResponse(
-                    success=False,
-                    message=f"Klasa o ID {label.class_id} nie została znaleziona"
-                )
-            
-            # Konwersja współrzędnych do formatu JSON
-            coordinates_json = json.dumps(label.coordinates)
-            
-            # Aktualizacja etykiety
-            db_label.image_id = label.image_id
-            db_label.class_id = label.class_id
-            db_label.type = label.type
-            db_label.coordinates = coordinates_json
-            db_label.confidence = label.confidence
-            
-            db.commit()
-            db.refresh(db_label)
-            
-            # Konwersja współrzędnych z formatu JSON
-            db_label.coordinates = json.loads(db_label.coordinates)
-            
-            return LabelResponse(
-                success=True,
-                message=f"Etykieta o ID {label_id} została zaktualizowana",
-                data=db_label
-            )
-        except Exception as e:
-            return LabelResponse(
-                success=False,
-                message=f"Błąd podczas aktualizacji etykiety: {str(e)}"
+        image_ids = set(annotations_by_image)
+        if not image_ids:
+            return []
+        self._check_images_exist(image_ids)
+        self._check_classes_exist(
+            annotation.class_id for annotations in annotations_by_image.values() for annotation in annotations
+        )
+
+        existing = {
+            row.id: row for row in self.db.execute(
+                select(Annotation.id, Annotation.image_id, *[getattr(Annotation, f) for f in ANNOTATION_FIELDS])
+                .where(Annotation.image_id.in_(image_ids))
             )
-    
-    @staticmethod
-    def delete_label(db: Session, label_id: int) -> LabelResponse:
-        """
-        Usuwa etykietę o podanym ID.
-        """
+        }
+
+        to_insert, to_update, kept_ids = [], [], set()
+        for image_id, annotations in annotations_by_image.items():
+            for annotation in annotations:
+                values = annotation.dict(exclude={"id"})
+                if annotation.id is None:
+                    to_insert.append({**values, "image_id": image_id})
+                    continue
+
+                current = existing.get(annotation.id)
+                if current is None or current.image_id != image_id:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Adnotacja {annotation.id} nie należy do obrazu {image_id}"
+                    )
+                kept_ids.add(annotation.id)
+                if any(getattr(current, f) != values[f] for f in ANNOTATION_FIELDS):
+                    to_update.append({**values, "id": annotation.id})
+        to_delete = set(existing) - kept_ids
+
         try:
-            db_label = db.query(Label).filter(Label.id == label_id).first()
-            
-            if not db_label:
-                return LabelResponse(
-                    success=False,
-                    message=f"Etykieta o ID {label_id} nie została znaleziona"
-                )
-            
-            # Pobranie obrazu
-            image_id = db_label.image_id
-            
-            # Usunięcie etykiety
-            db.delete(db_label)
-            db.commit()
-            
-            # Sprawdzenie, czy obraz ma jeszcze jakieś etykiety
-            remaining_labels = db.query(Label).filter(Label.image_id == image_id).count()
-            
-            if remaining_labels == 0:
-                # Jeśli nie ma więcej etykiet, oznacz obraz jako nieoznaczony
-                image = db.query(Image).filter(Image.id == image_id).first()
-                if image:
-                    image.is_labeled = False
-                    db.commit()
-            
-            return LabelResponse(
-                success=True,
-                message=f"Etykieta o ID {label_id} została usunięta"
+            self.stats.record_annotations(
+                [existing[annotation_id]._asdict() for annotation_id in to_delete]
+                + [existing[row["id"]]._asdict() for row in to_update],
+                sign=-1
             )
-        except Exception as e:
-            return LabelResponse(
-                success=False,
-                message=f"Błąd podczas usuwania etykiety: {str(e)}"
-            )
-    
-    @staticmethod
-    def create_multiple_labels(db: Session, labels: List[LabelCreate]) -> LabelsResponse:
-        """
-        Tworzy wiele etykiet jednocześnie.
-        """
-        try:
-            created_labels = []
-            image_ids = set()
-            
-            for label in labels:
-                # Sprawdzenie, czy obraz istnieje
-                image = db.query(Image).filter(Image.id == label.image_id).first()
-                if not image:
-                    continue
-                
-                # Sprawdzenie, czy klasa istnieje
-                object_class = db.query(ObjectClass).filter(ObjectClass.id == label.class_id).first()
-                if not object_class:
-                    continue
-                
-                # Konwersja współrzędnych do formatu JSON
-                coordinates_json = json.dumps(label.coordinates)
-                
-                # Utworzenie etykiety
-                db_label = Label(
-                    image_id=label.image_id,
-                    class_id=label.class_id,
-                    type=label.type,
-                    coordinates=coordinates_json,
-                    confidence=label.confidence
+            self.stats.record_annotations([
+                {**row, "image_id": existing[row["id"]].image_id} for row in to_update
+            ] + to_insert)
+
+            if to_delete:
+                self.db.execute(
+                    delete(Annotation).where(Annotation.id.in_(to_delete)).execution_options(synchronize_session=False)
                 )
-                
-                db.add(db_label)
-                image_ids.add(label.image_id)
-                created_labels.append(db_label)
-            
-            db.commit()
-            
-            # Odświeżenie etykiet
-            for label in created_labels:
-                db.refresh(label)
-                # Konwersja współrzędnych z formatu JSON
-                label.coordinates = json.loads(label.coordinates)
-            
-            # Oznaczenie obrazów jako oznaczone
-            for image_id in image_ids:
-                image = db.query(Image).filter(Image.id == image_id).first()
-                if image:
-                    image.is_labeled = True
-            
-            db.commit()
-            
-            return LabelsResponse(
-                success=True,
-                message=f"Utworzono {len(created_labels)} etykiet",
-                data=created_labels,
-                total=len(created_labels)
-            )
+            if to_update:
+                self.db.execute(update(Annotation), to_update)
+            if to_insert:
+                self.db.execute(insert(Annotation), to_insert)
+            self._refresh_is_labeled(image_ids)
+            self.stats.flush()
+
+            result = [
+                dict(row) for row in self.db.execute(
+                    select(*Annotation.__table__.columns)
+                    .where(Annotation.image_id.in_(image_ids))
+                    .order_by(Annotation.image_id, Annotation.id)
+                ).mappings()
+            ]
+            self.db.commit()
+            return result
         except Exception as e:
-            return LabelsResponse(
-                success=False,
-                message=f"Błąd podczas tworzenia etykiet: {str(e)}"
-            )
+            logger.error(f"Błąd podczas zastępowania adnotacji: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas zastępowania adnotacji: {str(e)}")
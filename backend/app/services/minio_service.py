@@ -1,36 +1,84 @@
 import json
 import os
+import logging
+import threading
+from datetime import timedelta
+import certifi
+import urllib3
 from minio import Minio
 from minio.error import S3Error
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Bucket images jest publicznie dostępny do odczytu (frontend pobiera obrazy bezpośrednio)
+IMAGES_BUCKET_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [{
+        "Effect": "Allow",
+        "Principal": {"AWS": ["*"]},
+        "Action": ["s3:GetObject"],
+        "Resource": [f"arn:aws:s3:::{settings.IMAGES_BUCKET}/*"]
+    }]
+}
+
 class MinioService:
+    """Współdzielona warstwa dostępu do MinIO (jeden klient z pulą połączeń na proces)"""
+
     def __init__(self):
-        self.client = Minio(
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Minio:
+        # Pula połączeń urllib3 nie może być dzielona między procesami po fork() (workery Celery),
+        # dlatego każdy proces tworzy własnego klienta przy pierwszym użyciu
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._create_client()
+                    self._pid = os.getpid()
+        return self._client
+
+    @staticmethod
+    def _create_client() -> Minio:
+        http_client = urllib3.PoolManager(
+            maxsize=settings.MINIO_MAX_POOL_CONNECTIONS,
+            timeout=urllib3.Timeout(connect=settings.MINIO_CONNECT_TIMEOUT, read=settings.MINIO_READ_TIMEOUT),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
+        return Minio(
             settings.MINIO_URL,
             access_key=settings.MINIO_ROOT_USER,
             secret_key=settings.MINIO_ROOT_PASSWORD,
-            secure=settings.MINIO_SECURE
+            secure=settings.MINIO_SECURE,
+            http_client=http_client
         )
         
     def create_buckets(self):
-        """Tworzy wymagane buckety, jeśli nie istnieją."""
+        """Tworzy wymagane buckety, jeśli nie istnieją (wywoływane raz przy starcie API i workera)."""
         buckets = [
             settings.MODELS_BUCKET,
             settings.IMAGES_BUCKET,
             settings.DATASETS_BUCKET,
-            settings.TEMP_BUCKET
+            settings.TEMP_BUCKET,
+            settings.VIDEOS_BUCKET
         ]
         
         for bucket in buckets:
             try:
                 if not self.client.bucket_exists(bucket):
                     self.client.make_bucket(bucket)
-                    print(f"Bucket '{bucket}' został utworzony.")
+                    if bucket == settings.IMAGES_BUCKET:
+                        self.client.set_bucket_policy(bucket, json.dumps(IMAGES_BUCKET_POLICY))
+                    logger.info(f"Bucket '{bucket}' został utworzony.")
                 else:
-                    print(f"Bucket '{bucket}' już istnieje.")
+                    logger.info(f"Bucket '{bucket}' już istnieje.")
             except S3Error as e:
-                print(f"Błąd podczas tworzenia bucketu '{bucket}': {e}")
+                logger.error(f"Błąd podczas tworzenia bucketu '{bucket}': {e}")
     
     def upload_file(self, file_path, bucket_name, object_name=None):
         """Przesyła plik do MinIO."""
@@ -39,11 +87,11 @@ class MinioService:
             
         try:
             self.client.fput_object(
-                bucket_name, object_name, file_path
+                bucket_name, object_name, file_path, part_size=settings.MINIO_PART_SIZE
             )
             return True, object_name
         except S3Error as e:
-            print(f"Błąd podczas przesyłania pliku: {e}")
+            logger.error(f"Błąd podczas przesyłania pliku: {e}")
             return False, str(e)
     
     def download_file(self, bucket_name, object_name, file_path):
@@ -54,18 +102,27 @@ class MinioService:
             )
             return True
         except S3Error as e:
-            print(f"Błąd podczas pobierania pliku: {e}")
+            logger.error(f"Błąd podczas pobierania pliku: {e}")
             return False
+
+    def read_object(self, bucket_name, object_name) -> bytes:
+        """Pobiera całą zawartość obiektu do pamięci."""
+        response = self.client.get_object(bucket_name, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
     
     def get_file_url(self, bucket_name, object_name, expires=3600):
         """Generuje tymczasowy URL do pliku."""
         try:
             url = self.client.presigned_get_object(
-                bucket_name, object_name, expires=expires
+                bucket_name, object_name, expires=timedelta(seconds=expires)
             )
             return url
         except S3Error as e:
-            print(f"Błąd podczas generowania URL: {e}")
+            logger.error(f"Błąd podczas generowania URL: {e}")
             return None
     
     def list_files(self, bucket_name, prefix="", recursive=True):
@@ -76,7 +133,7 @@ class MinioService:
             )
             return [obj.object_name for obj in objects]
         except S3Error as e:
-            print(f"Błąd podczas listowania plików: {e}")
+            logger.error(f"Błąd podczas listowania plików: {e}")
             return []
     
     def delete_file(self, bucket_name, object_name):
@@ -85,7 +142,7 @@ class MinioService:
             self.client.remove_object(bucket_name, object_name)
             return True
         except S3Error as e:
-            print(f"Błąd podczas usuwania pliku: {e}")
+            logger.error(f"Błąd podczas usuwania pliku: {e}")
             return False
     
     def upload_image(self, file_path, image_id):
@@ -0,0 +1,133 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Dict, Any, Callable, List, Optional
+from app.models.models import Model, Training, Image
+from app.core.config import settings
+from app.ai_engines.inference_engine import InferenceEngine
+from app.ai_engines.model_registry import model_registry
+from app.ai_engines.model_export import evaluate_runtime
+from app.ai_engines.training_engine import TrainingEngine
+from app.ai_engines.benchmark import load_images
+from app.services.minio_service import minio_service
+import os
+import shutil
+import logging
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def export_object(model: Model, filename: str) -> str:
+    """Klucz wyeksportowanego pliku w buckecie models (osobny katalog dla każdej wersji modelu)"""
+    return f"exports/model_{model.id}/{model.version or 'latest'}/{filename}"
+
+
+class ModelExportService:
+    """Eksport modeli do ONNX (FP32 i INT8) z pomiarem opóźnienia i zgodności wykryć"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.training_engine = TrainingEngine()
+
+    def _validation_images(self, model: Model) -> List[np.ndarray]:
+        """
+        Obrazy do porównania środowisk - z datasetu ostatniego zakończonego trenowania modelu
+
+        Bez takiego datasetu zwracane są obrazy syntetyczne (tylko pomiar opóźnienia).
+        """
+        dataset_id = self.db.execute(
+            select(Training.dataset_id)
+            .where(Training.model_id == model.id, Training.status == "completed")
+            .order_by(Training.completed_at.desc())
+            .limit(1)
+        ).scalar()
+        images = []
+        if dataset_id is not None:
+            paths = self.db.execute(
+                select(Image.path).where(Image.dataset_id == dataset_id).order_by(Image.id)
+                .limit(settings.EXPORT_VALIDATION_IMAGES)
+            ).scalars().all()
+            for path in paths:
+                data = minio_service.read_object(settings.IMAGES_BUCKET, path)
+                decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if decoded is not None:
+                    images.append(decoded)
+        return images
+
+    def export_model(
+        self,
+        model_id: int,
+        int8: bool = True,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Eksportuje model i zapisuje dostępne środowiska uruchomieniowe w Model.config["runtimes"]
+
+        Każde środowisko dostaje zmierzone opóźnienie (p50, jeden obraz) oraz zgodność
+        wykryć z modelem PyTorch na obrazach walidacyjnych. Rejestr modeli wybiera
+        na tej podstawie najszybsze środowisko mieszczące się w EXPORT_ACCURACY_TOLERANCE.
+        """
+        model = self.db.query(Model).filter(Model.id == model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+
+        weights_path = model_registry.resolve_weights(model)
+        if not weights_path.endswith(".pt"):
+            raise HTTPException(status_code=400, detail="Eksport wymaga wag PyTorch (.pt)")
+
+        output_dir = os.path.join(settings.MODELS_DIR, "exports", f"model_{model.id}")
+        try:
+            if progress_callback:
+                progress_callback({"stage": "export"})
+            exported = self.training_engine.export_model(weights_path, output_dir, int8)
+
+            images = self._validation_images(model)
+            validated = bool(images)
+            if not validated:
+                logger.warning(f"Brak obrazów walidacyjnych modelu {model.id} - zgodność wykryć nie zostanie sprawdzona")
+                images = load_images(None, settings.EXPORT_VALIDATION_IMAGES, settings.INFERENCE_IMAGE_SIZE, settings.INFERENCE_IMAGE_SIZE)
+
+            if progress_callback:
+                progress_callback({"stage": "benchmark", "runtime": "torch", "images": len(images)})
+            reference_engine = InferenceEngine(weights_path)
+            reference, report = evaluate_runtime(reference_engine, images)
+            names = {str(class_id): name for class_id, name in reference_engine.names.items()}
+            runtimes = {"torch": {"path": model.path, **report}}
+
+            uploaded = {}
+            for runtime, path in exported.items():
+                if progress_callback:
+                    progress_callback({"stage": "benchmark", "runtime": runtime, "images": len(images)})
+                engine = InferenceEngine(path, runtime=runtime, names=reference_engine.names)
+                _, report = evaluate_runtime(engine, images, reference if validated else None)
+                if not validated:
+                    report["within_tolerance"] = None
+
+                # Ten sam plik ONNX obsługuje kilka środowisk - przesyłany jest raz
+                if path not in uploaded:
+                    uploaded[path] = export_object(model, os.path.basename(path))
+                    minio_service.client.fput_object(
+                        settings.MODELS_BUCKET, uploaded[path], path, part_size=settings.MINIO_PART_SIZE
+                    )
+                runtimes[runtime] = {"path": uploaded[path], **report}
+                logger.info(f"Model {model.id}, środowisko {runtime}: {report}")
+
+            model.config = {
+                **(model.config or {}),
+                "runtimes": runtimes,
+                "runtime_version": model.version,
+                "names": names
+            }
+            self.db.commit()
+            model_registry.invalidate(model.id)
+            return {"model_id": model.id, "version": model.version, "validated": validated, "runtimes": runtimes}
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Błąd podczas eksportu modelu: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas eksportu modelu: {str(e)}")
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
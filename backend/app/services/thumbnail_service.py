@@ -0,0 +1,210 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_, and_
+from typing import Dict, Any, List, Optional, Tuple
+from app.models.models import Image
+from app.core.config import settings
+from app.services.minio_service import minio_service
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage, ImageOps
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Formaty miniatur: rozszerzenie -> (format PIL, typ MIME)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+def thumbnail_source(image: Image) -> str:
+    """
+    Prefiks kluczy miniatur obrazu
+
+    Dla wygenerowanych miniatur jest to prefiks zapisany w Image.thumbnail_key (późniejsze
+    uzupełnienie content_hash go nie zmienia). Nowe miniatury dostają skrót treści
+    oryginału, więc obrazy o tej samej treści współdzielą miniatury.
+    """
+    return image.thumbnail_key or image.content_hash or f"image_{image.id}"
+
+
+def thumbnail_object(image: Image, size: str, image_format: str) -> str:
+    """Klucz miniatury w buckecie images"""
+    return f"thumbnails/{thumbnail_source(image)}/{size}.{image_format}"
+
+
+def thumbnail_etag(image: Image, size: str, image_format: str) -> str:
+    return f'"{thumbnail_source(image)}-{size}-{image_format}"'
+
+
+def render_pyramid(data: bytes, sizes: Optional[Dict[str, int]] = None) -> Dict[Tuple[str, str], bytes]:
+    """
+    Generuje miniatury obrazu we wszystkich rozmiarach i formatach
+
+    Dekoder JPEG skaluje obraz już przy odczycie (draft), a każdy mniejszy poziom
+    liczony jest z poprzedniego, nie z oryginału. Orientacja EXIF jest uwzględniana.
+
+    Returns:
+        Dict (rozmiar, format) -> zakodowany plik
+    """
+    sizes = sizes or settings.THUMBNAIL_SIZES
+    levels = sorted(sizes.items(), key=lambda item: -item[1])
+    results = {}
+    with PILImage.open(io.BytesIO(data)) as source:
+        source.draft("RGB", (levels[0][1], levels[0][1]))
+        current = ImageOps.exif_transpose(source).convert("RGB")
+
+    for name, max_side in levels:
+        current = current.copy()
+        current.thumbnail((max_side, max_side), PILImage.Resampling.LANCZOS)
+        for image_format, (pil_format, _) in THUMBNAIL_FORMATS.items():
+            buffer = io.BytesIO()
+            current.save(buffer, format=pil_format, quality=settings.THUMBNAIL_QUALITY, optimize=pil_format == "JPEG")
+            results[(name, image_format)] = buffer.getvalue()
+    return results
+
+
+class ThumbnailService:
+    """Miniatury obrazów (kilka rozmiarów, WebP i JPEG) w buckecie images pod kluczami thumbnails/"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.minio_client = minio_service.client
+
+    def _render_and_upload(self, image: Image) -> Tuple[str, int]:
+        """
+        Generuje i zapisuje miniatury jednego obrazu
+
+        Returns:
+            Krotka (prefiks kluczy do zapisania w Image.thumbnail_key, liczba zapisanych plików)
+        """
+        source = image.content_hash or f"image_{image.id}"
+        data = minio_service.read_object(settings.IMAGES_BUCKET, image.path)
+        rendered = render_pyramid(data)
+        for (size, image_format), payload in rendered.items():
+            self.minio_client.put_object(
+                settings.IMAGES_BUCKET,
+                f"thumbnails/{source}/{size}.{image_format}",
+                io.BytesIO(payload),
+                length=len(payload),
+                content_type=THUMBNAIL_FORMATS[image_format][1]
+            )
+        return source, len(rendered)
+
+    def generate(self, image_ids: List[int]) -> Dict[str, Any]:
+        """
+        Generuje miniatury dla listy obrazów (równolegle, THUMBNAIL_WORKERS wątków)
+
+        Obrazy, których nie udało się przetworzyć, są pomijane i raportowane w wyniku.
+        """
+        images = self.db.execute(select(Image).where(Image.id.in_(image_ids))).scalars().all()
+        done, failed, files = 0, [], 0
+
+        def process(image: Image):
+            try:
+                return image, self._render_and_upload(image)
+            except Exception as e:
+                logger.warning(f"Nie udało się wygenerować miniatur obrazu {image.id}: {str(e)}")
+                return image, None
+
+        with ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS) as pool:
+            rendered = list(pool.map(process, images))
+
+        # Atrybuty ORM ustawiane w wątku sesji, nie w wątkach puli
+        for image, outcome in rendered:
+            if outcome is None:
+                failed.append(image.id)
+                continue
+            image.thumbnail_key, count = outcome
+            image.has_thumbnails = True
+            done += 1
+            files += count
+        if done:
+            self.db.commit()
+        return {"generated": done, "failed": failed, "files": files}
+
+    def pending_ids(self, dataset_id: int, limit: int, after: int = 0) -> List[int]:
+        """ID obrazów datasetu bez miniatur (większe niż after)"""
+        stmt = (
+            select(Image.id)
+            .where(Image.dataset_id == dataset_id, Image.id > after, Image.has_thumbnails.is_(False))
+            .order_by(Image.id)
+            .limit(limit)
+        )
+        return list(self.db.execute(stmt).scalars())
+
+    def ensure(self, image: Image, force: bool = False):
+        """
+        Generuje miniatury obrazu na żądanie, jeśli zadanie Celery jeszcze ich nie utworzyło
+
+        force - ponowne generowanie, gdy pliki miniatur zniknęły z MinIO mimo has_thumbnails.
+        """
+        if image.has_thumbnails and not force:
+            return
+        try:
+            image.thumbnail_key, _ = self._render_and_upload(image)
+            image.has_thumbnails = True
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Błąd podczas generowania miniatur: {str(e)}")
+            self.db.rollback()
+            raise HTTPException(status_code=500, detail=f"Błąd podczas generowania miniatur: {str(e)}")
+
+    def delete(self, image: Image):
+        """Usuwa miniatury obrazu, o ile żaden inny obraz nie korzysta z tych samych plików"""
+        if not image.has_thumbnails:
+            return
+        source = thumbnail_source(image)
+        shared = self.db.execute(
+            select(func.count()).select_from(Image)
+            .where(
+                Image.id != image.id,
+                Image.has_thumbnails.is_(True),
+                or_(Image.thumbnail_key == source, and_(Image.thumbnail_key.is_(None), Image.content_hash == source))
+            )
+        ).scalar()
+        if shared:
+            return
+        for size in settings.THUMBNAIL_SIZES:
+            for image_format in THUMBNAIL_FORMATS:
+                minio_service.delete_file(settings.IMAGES_BUCKET, thumbnail_object(image, size, image_format))
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parsuje nagłówek Range z jednym zakresem bajtów (bytes=a-b, bytes=a-, bytes=-n)
+
+    Returns:
+        (początek, koniec włącznie) lub None, jeśli nagłówek nie dotyczy bajtów lub ma wiele zakresów
+
+    Raises:
+        ValueError: zakres niemożliwy do spełnienia (odpowiedź 416)
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                raise ValueError("Pusty zakres")
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        raise ValueError("Nieprawidłowy zakres")
+    if first >= size or first > last:
+        raise ValueError("Zakres poza plikiem")
+    return first, last
+
+
+def iter_object(bucket: str, object_name: str, offset: int = 0, length: int = 0):
+    """Strumieniuje (fragment) obiektu MinIO, zwalniając połączenie po zakończeniu"""
+    response = minio_service.client.get_object(bucket, object_name, offset=offset, length=length)
+    try:
+        yield from response.stream(64 * 1024)
+    finally:
+        response.close()
+        response.release_conn()
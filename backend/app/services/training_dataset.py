@@ -0,0 +1,155 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Dict, Any, List, Optional
+from app.models.models import Image, Class
+from app.core.config import settings
+from app.services.annotation_store import ColumnarAnnotations
+from app.services.image_cache import ImageCache
+import os
+import logging
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+SPLITS = ("train", "val")
+
+
+def is_validation(image_ids: np.ndarray, val_split: float) -> np.ndarray:
+    """
+    Deterministyczny podział obrazów na zbiór treningowy i walidacyjny
+
+    Przydział zależy tylko od ID obrazu (mieszanie multiplikatywne), więc przy wznowieniu
+    trenowania lub po dodaniu obrazów istniejące obrazy zostają w tym samym zbiorze.
+    """
+    hashed = (np.asarray(image_ids, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return hashed.astype(np.float64) / 2 ** 32 < val_split
+
+
+class TrainingDatasetBuilder:
+    """
+    Przygotowuje lokalny dataset w układzie YOLO (images/, labels/, data.yaml) do trenowania
+
+    Obrazy pobierane są przez lokalny cache adresowany treścią (ImageCache) i wstawiane
+    do układu YOLO jako twarde dowiązania, więc kolejne trenowanie tego samego datasetu
+    nie pobiera ich ponownie. Etykiety liczone są z kolumnowej migawki adnotacji.
+    Budowanie jest idempotentne: istniejące pliki są pomijane, a pliki obrazów usuniętych
+    z datasetu kasowane - wznowione trenowanie korzysta z tego samego katalogu.
+    """
+
+    def __init__(self, db: Session, cache: Optional[ImageCache] = None):
+        self.db = db
+        self.cache = cache or ImageCache()
+
+    def _get_images(self, dataset_id: int) -> List[tuple]:
+        stmt = select(Image.id, Image.path, Image.content_hash).where(Image.dataset_id == dataset_id).order_by(Image.id)
+        return self.db.execute(stmt).all()
+
+    def _get_class_names(self, class_ids: List[int]) -> Dict[int, str]:
+        if not class_ids:
+            return {}
+        rows = self.db.execute(select(Class.id, Class.name).where(Class.id.in_(class_ids))).all()
+        return {row.id: row.name for row in rows}
+
+    @staticmethod
+    def _remove_stale(directory: str, expected: set):
+        for name in os.listdir(directory):
+            if name not in expected:
+                os.remove(os.path.join(directory, name))
+
+    def build(
+        self,
+        dataset_id: int,
+        annotations: ColumnarAnnotations,
+        target_dir: str,
+        val_split: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Buduje dataset YOLO w katalogu target_dir
+
+        Returns:
+            Dict ze ścieżką data.yaml, listą ID klas (kolejność indeksów YOLO) i licznikami obrazów
+        """
+        val_split = settings.TRAINING_VAL_SPLIT if val_split is None else float(val_split)
+        images = self._get_images(dataset_id)
+        if not images:
+            raise ValueError(f"Dataset {dataset_id} nie zawiera obrazów")
+
+        image_ids = np.array([image.id for image in images], dtype=np.int64)
+        validation = is_validation(image_ids, val_split)
+        # Bardzo małe datasety: bez obrazów walidacyjnych walidacja korzysta ze zbioru treningowego
+        use_train_for_val = not validation.any()
+
+        indices, classes = annotations.class_indices(
+            [class_id for class_id in np.unique(annotations.class_ids).tolist() if class_id >= 0]
+        )
+        names = self._get_class_names(classes)
+        if not classes:
+            raise ValueError(f"Dataset {dataset_id} nie zawiera adnotacji z przypisaną klasą")
+        boxes = annotations.yolo_boxes()
+        rows_by_image = annotations.group_by_image()
+
+        for split in SPLITS:
+            os.makedirs(os.path.join(target_dir, "images", split), exist_ok=True)
+            os.makedirs(os.path.join(target_dir, "labels", split), exist_ok=True)
+
+        expected = {(kind, split): set() for kind in ("images", "labels") for split in SPLITS}
+        links = []
+        for image, is_val in zip(images, validation.tolist()):
+            split = "val" if is_val else "train"
+            extension = os.path.splitext(image.path)[1] or ".jpg"
+            image_name = f"{image.id}{extension}"
+            label_name = f"{image.id}.txt"
+            expected[("images", split)].add(image_name)
+            expected[("labels", split)].add(label_name)
+            key = self.cache.key_for(image.content_hash, image.path)
+            links.append((key, image.path, os.path.join(target_dir, "images", split, image_name)))
+
+            rows = rows_by_image.get(image.id)
+            lines = []
+            if rows is not None:
+                rows = rows[indices[rows] >= 0]
+                lines = [
+                    f"{class_index} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f}"
+                    for class_index, box in zip(indices[rows].tolist(), boxes[rows].tolist())
+                ]
+            with open(os.path.join(target_dir, "labels", split, label_name), "w") as f:
+                f.write("\n".join(lines))
+
+        for (kind, split), names_expected in expected.items():
+            self._remove_stale(os.path.join(target_dir, kind, split), names_expected)
+
+        missing = [(key, object_name, path) for key, object_name, path in links if not os.path.exists(path)]
+        hits, misses = self.cache.hits, self.cache.misses
+        self.cache.fetch_many((key, object_name) for key, object_name, _ in missing)
+        for key, _, path in missing:
+            self.cache.link(key, path)
+        self.cache.evict()
+
+        data_yaml = os.path.join(target_dir, "data.yaml")
+        with open(data_yaml, "w") as f:
+            yaml.safe_dump({
+                "path": target_dir,
+                "train": "images/train",
+                "val": "images/train" if use_train_for_val else "images/val",
+                "nc": len(classes),
+                "names": {index: names.get(class_id, str(class_id)) for index, class_id in enumerate(classes)},
+            }, f, allow_unicode=True, sort_keys=False)
+
+        val_images = int(validation.sum())
+        logger.info(
+            f"Przygotowano dataset {dataset_id} do trenowania: {len(images) - val_images} obrazów treningowych, "
+            f"{val_images} walidacyjnych, {len(classes)} klas"
+        )
+        return {
+            "data_yaml": data_yaml,
+            "classes": classes,
+            "names": [names.get(class_id, str(class_id)) for class_id in classes],
+            "images": len(images),
+            "train_images": len(images) - val_images,
+            "val_images": val_images,
+            "annotations": int((indices >= 0).sum()),
+            "revision": annotations.revision,
+            "cache_hits": self.cache.hits - hits,
+            "cache_misses": self.cache.misses - misses,
+        }
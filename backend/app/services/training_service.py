@@ -1,17 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select
+from typing import List, Optional, Dict, Any, Callable, Iterator
+from datetime import datetime, timezone
+from minio.error import S3Error
 from app.db.session import get_db
 from app.schemas.schemas import TrainingCreate, TrainingResponse, TrainingList
-from app.models.models import Training
+from app.models.models import Training, Model
+from app.core.config import settings
 import os
 import uuid
 import shutil
 import logging
 from app.ai_engines.training_engine import TrainingEngine
+from app.ai_engines.model_registry import model_registry
+from app.services.annotation_store import AnnotationStore
+from app.services.training_dataset import TrainingDatasetBuilder
+from app.services.minio_service import minio_service
+from app.db.pagination import paginate, iter_ndjson
 
 logger = logging.getLogger(__name__)
 
+
+def checkpoint_object(training_id: int) -> str:
+    """Nazwa punktu kontrolnego trenowania w buckecie models"""
+    return f"checkpoints/training_{training_id}/last.pt"
+
+
 class TrainingService:
     def __init__(self, db: Session):
         self.db = db
@@ -44,9 +59,13 @@ class TrainingService:
             raise HTTPException(status_code=404, detail="Zadanie trenowania nie znalezione")
         return training
 
-    def get_trainings(self, skip: int = 0, limit: int = 100) -> List[Training]:
-        """Pobiera listę zadań trenowania"""
-        return self.db.query(Training).offset(skip).limit(limit).all()
+    def get_trainings(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Pobiera stronę listy zadań trenowania (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, select(Training), Training, limit, cursor, skip)
+
+    def stream_trainings(self) -> Iterator[str]:
+        """Zwraca wszystkie zadania trenowania jako strumień NDJSON"""
+        return iter_ndjson(self.db, select(Training), Training, TrainingResponse)
 
     def update_training(self, training_id: int, training_data: dict) -> Training:
         """Aktualizuje zadanie trenowania"""
@@ -66,30 +85,122 @@ class TrainingService:
         self.db.commit()
         return True
         
-    def process_training(self, training_id: int) -> dict:
-        """Przetwarza zadanie trenowania"""
+    def _restore_checkpoint(self, training_id: int, run_dir: str) -> Optional[str]:
+        """Zwraca lokalny last.pt przerwanego trenowania (pobierany z MinIO, jeśli brak na dysku)"""
+        local_path = os.path.join(run_dir, "train", "weights", "last.pt")
+        if os.path.exists(local_path):
+            return local_path
+
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.part"
+        try:
+            minio_service.client.fget_object(settings.MODELS_BUCKET, checkpoint_object(training_id), tmp_path)
+        except S3Error:
+            return None
+        os.replace(tmp_path, local_path)
+        return local_path
+
+    def _base_weights(self, model: Model) -> str:
+        """Wagi początkowe - aktualne wagi modelu .pt lub domyślne wagi YOLO"""
+        weights = model_registry.resolve_weights(model)
+        return weights if weights.endswith(".pt") else settings.DEFAULT_MODEL_WEIGHTS
+
+    def process_training(self, training_id: int, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> dict:
+        """
+        Przetwarza zadanie trenowania
+
+        Metryki każdej epoki zapisywane są w Training.results na bieżąco, a punkt kontrolny
+        last.pt trafia do MinIO co TRAINING_CHECKPOINT_INTERVAL epok. Ponowne uruchomienie
+        przerwanego zadania wznawia trenowanie od ostatniego punktu kontrolnego.
+        """
         training = self.get_training(training_id)
+        model = self.db.query(Model).filter(Model.id == training.model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+        config = training.config or {}
+        run_dir = os.path.join(settings.TRAINING_DIR, f"training_{training_id}")
         
         # Aktualizacja statusu
-        self.update_training(training_id, {"status": "processing"})
+        self.update_training(training_id, {
+            "status": "processing",
+            "error": None,
+            "started_at": training.started_at or datetime.now(timezone.utc)
+        })
         
         try:
-            # Tutaj logika trenowania modelu
+            # Adnotacje z kolumnowej migawki (odświeżanej przyrostowo, jeśli nieaktualna)
+            annotations = AnnotationStore(self.db).load(training.dataset_id)
+            dataset = TrainingDatasetBuilder(self.db).build(
+                training.dataset_id, annotations, os.path.join(run_dir, "dataset"), config.get("val_split")
+            )
+            dataset_summary = {key: value for key, value in dataset.items() if key != "data_yaml"}
+            base_weights = self._base_weights(model)
+            self.db.rollback()
+
+            checkpoint = self._restore_checkpoint(training_id, run_dir)
+            # Przy wznowieniu zachowujemy metryki epok zapisane przed przerwaniem
+            previous = (training.results or {}).get("epoch_metrics", []) if checkpoint else []
+            history = {metrics["epoch"]: metrics for metrics in previous}
+
+            def on_epoch(metrics: Dict[str, Any], epochs: int):
+                history[metrics["epoch"]] = metrics
+                self.update_training(training_id, {"results": {
+                    "status": "training",
+                    "epoch": metrics["epoch"],
+                    "epochs": epochs,
+                    "dataset": dataset_summary,
+                    "epoch_metrics": [history[epoch] for epoch in sorted(history)]
+                }})
+                if progress_callback:
+                    progress_callback({"epoch": metrics["epoch"], "epochs": epochs, "metrics": metrics})
+
+            def on_checkpoint(path: str, epoch: int):
+                if epoch % max(1, settings.TRAINING_CHECKPOINT_INTERVAL) == 0:
+                    minio_service.client.fput_object(
+                        settings.MODELS_BUCKET, checkpoint_object(training_id), path, part_size=settings.MINIO_PART_SIZE
+                    )
+
             result = self.training_engine.train(
                 training_id=training_id,
-                dataset_id=training.dataset_id,
-                model_id=training.model_id,
-                config=training.config
+                data_yaml=dataset["data_yaml"],
+                weights=base_weights,
+                config=config,
+                run_dir=run_dir,
+                resume_from=checkpoint,
+                on_epoch=on_epoch,
+                on_checkpoint=on_checkpoint
             )
-            
-            # Aktualizacja statusu i wyników
+
+            # Najlepsze wagi trafiają do bucketu models jako nowa wersja modelu
+            object_name = f"model_{model.id}_training_{training_id}.pt"
+            minio_service.client.fput_object(
+                settings.MODELS_BUCKET, object_name, result["model_path"], part_size=settings.MINIO_PART_SIZE
+            )
+            metrics = {**result["metrics"], "epochs": len(history), "dataset": dataset_summary}
+            results = {
+                **metrics,
+                "status": "completed",
+                "model_path": object_name,
+                "epoch_metrics": [history[epoch] for epoch in sorted(history)]
+            }
+            model = self.db.query(Model).filter(Model.id == training.model_id).first()
+            model.path = object_name
+            model.version = f"training-{training_id}"
+            model.metrics = metrics
+            model.status = "trained"
             self.update_training(training_id, {
                 "status": "completed",
-                "results": result
+                "results": results,
+                "completed_at": datetime.now(timezone.utc)
             })
+            model_registry.invalidate(model.id)
+
+            minio_service.delete_file(settings.MODELS_BUCKET, checkpoint_object(training_id))
+            shutil.rmtree(run_dir, ignore_errors=True)
             
-            return result
+            return results
         except Exception as e:
             logger.error(f"Błąd podczas trenowania: {str(e)}")
+            self.db.rollback()
             self.update_training(training_id, {"status": "failed", "error": str(e)})
             raise HTTPException(status_code=500, detail=f"Błąd podczas trenowania: {str(e)}")
@@ -0,0 +1,195 @@
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Dict, Any, Callable, Iterator, Optional
+from datetime import datetime, timezone
+from app.models.models import VideoDetection, Model
+from app.core.config import settings
+from app.core.detection_codec import VideoResults
+from app.ai_engines.model_registry import model_registry
+from app.ai_engines.video_pipeline import VideoPipeline
+from app.services.image_utils import get_stream_size
+from app.services.minio_service import minio_service
+from app.db.pagination import paginate
+from starlette.concurrency import run_in_threadpool
+import io
+import os
+import json
+import uuid
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ("mp4", "avi", "mov", "mkv", "webm", "m4v")
+
+
+class VideoDetectionService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.minio_client = minio_service.client
+
+    async def create_video_detection(
+        self,
+        file: UploadFile,
+        model_id: int,
+        frame_stride: int = 1,
+        conf_threshold: Optional[float] = None,
+        iou_threshold: Optional[float] = None
+    ) -> VideoDetection:
+        """
+        Przesyła plik wideo do bucketu videos i tworzy zadanie detekcji
+
+        Plik strumieniowany jest bezpośrednio do MinIO (multipart), bez zapisu na dysku API.
+        """
+        file_extension = file.filename.split(".")[-1].lower()
+        if file_extension not in VIDEO_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Nieobsługiwany format wideo: {file_extension}")
+        # Zapytania synchroniczne wykonywane są poza pętlą zdarzeń
+        if not await run_in_threadpool(self._model_exists, model_id):
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+
+        object_name = f"{uuid.uuid4()}.{file_extension}"
+        uploaded = False
+        try:
+            size = get_stream_size(file.file)
+            await run_in_threadpool(
+                self.minio_client.put_object,
+                settings.VIDEOS_BUCKET,
+                object_name,
+                file.file,
+                length=size,
+                part_size=settings.MINIO_PART_SIZE,
+                content_type=f"video/{file_extension}"
+            )
+            uploaded = True
+
+            video_detection = VideoDetection(
+                name=file.filename,
+                path=object_name,
+                size=size,
+                model_id=model_id,
+                status="created",
+                config={"frame_stride": frame_stride, "conf_threshold": conf_threshold, "iou_threshold": iou_threshold}
+            )
+            return await run_in_threadpool(self._save, video_detection)
+        except Exception as e:
+            logger.error(f"Błąd podczas tworzenia zadania detekcji wideo: {str(e)}")
+            await run_in_threadpool(self.db.rollback)
+            if uploaded:
+                await run_in_threadpool(self.minio_client.remove_object, settings.VIDEOS_BUCKET, object_name)
+            raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia zadania detekcji wideo: {str(e)}")
+
+    def _model_exists(self, model_id: int) -> bool:
+        return self.db.query(Model.id).filter(Model.id == model_id).first() is not None
+
+    def _save(self, video_detection: VideoDetection) -> VideoDetection:
+        self.db.add(video_detection)
+        self.db.commit()
+        self.db.refresh(video_detection)
+        return video_detection
+
+    def get_video_detection(self, video_detection_id: int) -> VideoDetection:
+        """Pobiera zadanie detekcji wideo po ID"""
+        video_detection = self.db.query(VideoDetection).filter(VideoDetection.id == video_detection_id).first()
+        if not video_detection:
+            raise HTTPException(status_code=404, detail="Zadanie detekcji wideo nie znalezione")
+        return video_detection
+
+    def get_video_detections(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Pobiera stronę listy zadań detekcji wideo (paginacja kursorem po (created_at, id))"""
+        return paginate(self.db, select(VideoDetection), VideoDetection, limit, cursor, skip)
+
+    def update_video_detection(self, video_detection_id: int, data: dict) -> VideoDetection:
+        video_detection = self.get_video_detection(video_detection_id)
+        for key, value in data.items():
+            if hasattr(video_detection, key):
+                setattr(video_detection, key, value)
+        self.db.commit()
+        self.db.refresh(video_detection)
+        return video_detection
+
+    def delete_video_detection(self, video_detection_id: int) -> bool:
+        """Usuwa zadanie detekcji wideo wraz z plikiem wideo i wynikami"""
+        video_detection = self.get_video_detection(video_detection_id)
+        for object_name in (video_detection.path, video_detection.results_path):
+            if object_name:
+                minio_service.delete_file(settings.VIDEOS_BUCKET, object_name)
+        self.db.delete(video_detection)
+        self.db.commit()
+        return True
+
+    def process_video_detection(
+        self,
+        video_detection_id: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> dict:
+        """
+        Przetwarza zadanie detekcji wideo
+
+        Plik pobierany jest z MinIO do katalogu tymczasowego (OpenCV wymaga ścieżki),
+        klatki przetwarzane przez VideoPipeline, a wyniki zapisywane w buckecie videos.
+        """
+        video_detection = self.get_video_detection(video_detection_id)
+        model = self.db.query(Model).filter(Model.id == video_detection.model_id).first()
+        if not model:
+            raise HTTPException(status_code=404, detail="Model nie znaleziony")
+        config = video_detection.config or {}
+
+        self.update_video_detection(video_detection_id, {
+            "status": "processing",
+            "error": None,
+            "started_at": datetime.now(timezone.utc)
+        })
+
+        try:
+            engine = model_registry.get(model)
+            suffix = os.path.splitext(video_detection.path)[1]
+            with tempfile.NamedTemporaryFile(suffix=suffix, dir=settings.VIDEO_TMP_DIR) as tmp:
+                self.minio_client.fget_object(settings.VIDEOS_BUCKET, video_detection.path, tmp.name)
+                pipeline = VideoPipeline(
+                    engine,
+                    stride=config.get("frame_stride") or 1,
+                    conf_threshold=config.get("conf_threshold"),
+                    iou_threshold=config.get("iou_threshold"),
+                    progress_callback=progress_callback
+                )
+                results, stats = pipeline.run(tmp.name, engine.names)
+
+            blob = results.to_bytes()
+            results_path = f"results/video_detection_{video_detection_id}.vrp"
+            self.minio_client.put_object(
+                settings.VIDEOS_BUCKET, results_path, io.BytesIO(blob), length=len(blob),
+                content_type="application/octet-stream"
+            )
+
+            self.update_video_detection(video_detection_id, {
+                "status": "completed",
+                "results_path": results_path,
+                "frames_total": stats["frames_total"],
+                "frames_processed": stats["frames_processed"],
+                "objects": stats["objects"],
+                "video_fps": stats["video_fps"],
+                "throughput_fps": stats["throughput_fps"],
+                "processing_time": stats["processing_time"],
+                "stats": stats,
+                "completed_at": datetime.now(timezone.utc)
+            })
+            return {"video_detection_id": video_detection_id, **stats}
+        except Exception as e:
+            logger.error(f"Błąd podczas detekcji wideo: {str(e)}")
+            self.db.rollback()
+            self.update_video_detection(video_detection_id, {"status": "failed", "error": str(e)})
+            raise HTTPException(status_code=500, detail=f"Błąd podczas detekcji wideo: {str(e)}")
+
+    def load_results(self, video_detection: VideoDetection) -> VideoResults:
+        if video_detection.status != "completed" or not video_detection.results_path:
+            raise HTTPException(status_code=409, detail="Detekcja wideo nie została zakończona")
+        return VideoResults.from_bytes(minio_service.read_object(settings.VIDEOS_BUCKET, video_detection.results_path))
+
+    @staticmethod
+    def iter_frames_ndjson(results: VideoResults) -> Iterator[str]:
+        """Wyniki jako NDJSON - jeden wiersz na przetworzoną klatkę ({"frame", "time", "objects"})"""
+        for frame, packed in results.iter_frames():
+            time_s = round(frame / results.fps, 3) if results.fps else None
+            yield json.dumps({"frame": frame, "time": time_s, "objects": packed.to_objects()}) + "\n"
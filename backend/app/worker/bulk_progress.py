@@ -0,0 +1,90 @@
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_job_key(job_id: str) -> str:
+    """Klucz metadanych joba detekcji masowej w backendzie wyników Celery"""
+    return f"bulk-detection-{job_id}"
+
+
+class BulkJobProgress:
+    """
+    Postęp joba detekcji masowej zbierany z jego partii (zadań grupy Celery)
+
+    Każda partia zapisuje swoje liczniki w hashach Redis joba, więc postęp całego joba
+    to suma po partiach, a łączne liczby obrazów i partii pochodzą z metadanych zapisanych
+    przy tworzeniu joba. Zakończone partie trafiają do zbioru - partia, której dodanie
+    dopełnia zbiór, jako jedyna widzi koniec joba (SADD i SCARD w jednej transakcji).
+    """
+
+    def __init__(self, job_id: str, meta: Dict[str, Any]):
+        self.job_id = job_id
+        self.meta = meta
+        prefix = f"{bulk_job_key(job_id)}:progress"
+        self._processed_key = f"{prefix}:processed"
+        self._failed_key = f"{prefix}:failed"
+        self._finished_key = f"{prefix}:finished"
+
+    @classmethod
+    def load(cls, job_id: Optional[str]) -> Optional["BulkJobProgress"]:
+        """Zwraca postęp joba lub None, gdy zadanie nie należy do joba detekcji masowej"""
+        if not job_id:
+            return None
+        try:
+            meta = get_redis().get(bulk_job_key(job_id))
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się odczytać metadanych joba {job_id}: {str(e)}")
+            return None
+        return cls(job_id, json.loads(meta)) if meta else None
+
+    def _summary(self, processed: Dict[bytes, bytes], failed: Dict[bytes, bytes], finished: int) -> Dict[str, Any]:
+        total_images = self.meta["total_images"]
+        processed_images = sum(int(value) for value in processed.values())
+        return {
+            "job_id": self.job_id,
+            "model_id": self.meta["model_id"],
+            "total_images": total_images,
+            "processed_images": processed_images,
+            "failed_images": sum(int(value) for value in failed.values()),
+            "total_chunks": self.meta["total_chunks"],
+            "finished_chunks": finished,
+            "progress": round(processed_images / total_images, 4) if total_images else 1.0,
+        }
+
+    def _update(self, chunk_id: str, processed: int, failed: int, finish: bool) -> Optional[Dict[str, Any]]:
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            pipe.hset(self._processed_key, chunk_id, processed)
+            pipe.hset(self._failed_key, chunk_id, failed)
+            if finish:
+                pipe.sadd(self._finished_key, chunk_id)
+            pipe.scard(self._finished_key)
+            pipe.hgetall(self._processed_key)
+            pipe.hgetall(self._failed_key)
+            for key in (self._processed_key, self._failed_key, self._finished_key):
+                pipe.expire(key, settings.BULK_PROGRESS_TTL)
+            results = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Nie udało się zapisać postępu joba {self.job_id}: {str(e)}")
+            return None
+        finished, processed_map, failed_map = results[-6:-3]
+        return self._summary(processed_map, failed_map, finished)
+
+    def report(self, chunk_id: str, processed: int, failed: int = 0) -> Optional[Dict[str, Any]]:
+        """Zapisuje bieżące liczniki partii i zwraca postęp całego joba"""
+        return self._update(chunk_id, processed, failed, finish=False)
+
+    def finish(self, chunk_id: str, processed: int, failed: int) -> Optional[Dict[str, Any]]:
+        """Zapisuje końcowe liczniki partii; w wyniku "completed" = True tylko dla ostatniej partii joba"""
+        summary = self._update(chunk_id, processed, failed, finish=True)
+        if summary is not None:
+            summary["completed"] = summary["finished_chunks"] == summary["total_chunks"]
+        return summary
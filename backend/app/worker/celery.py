@@ -1,5 +1,7 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 from app.core.config import settings
+from app.worker.routing import TASK_QUEUES, TASK_ANNOTATIONS, DEFAULT_QUEUE, route_task
 
 celery_app = Celery(
     "worker",
@@ -8,9 +10,12 @@ celery_app = Celery(
     include=["app.worker.tasks"]
 )
 
-celery_app.conf.task_routes = {
-    "app.worker.tasks.*": {"queue": "default"}
-}
+# Osobne kolejki dla detekcji, trenowania i pozostałych zadań (app/worker/routing.py).
+# Współbieżność, prefetch i max-tasks-per-child ustawiane są per worker w docker-compose.
+celery_app.conf.task_queues = TASK_QUEUES
+celery_app.conf.task_default_queue = DEFAULT_QUEUE
+celery_app.conf.task_routes = (route_task,)
+celery_app.conf.task_annotations = TASK_ANNOTATIONS
 
 celery_app.conf.update(
     task_serializer="json",
@@ -18,4 +23,31 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Zadania acks_late niepotwierdzone w tym czasie broker dostarcza ponownie
+    broker_transport_options={"visibility_timeout": settings.CELERY_VISIBILITY_TIMEOUT},
+    # Czas startu zadania w wyniku (status STARTED) - pomiar opóźnienia kolejki
+    task_track_started=True,
+    # Rozgrzewanie modeli przy starcie procesu może trwać dłużej niż domyślne 4 s
+    worker_proc_alive_timeout=120 if settings.MODEL_WARMUP_IDS else 4.0,
 )
+
+# Zadania okresowe - wymagają procesu Celery beat (usługa beat w docker-compose.yml)
+celery_app.conf.beat_schedule = {
+    "purge-detection-cache": {
+        "task": "purge_detection_cache",
+        "schedule": settings.DETECTION_CACHE_PURGE_INTERVAL,
+    },
+}
+
+@worker_init.connect
+def create_buckets(**kwargs):
+    """Sprawdza/tworzy buckety MinIO raz przy starcie workera"""
+    from app.services.minio_service import minio_service
+    minio_service.create_buckets()
+
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    """Ładuje modele z MODEL_WARMUP_IDS w każdym procesie workera"""
+    if settings.MODEL_WARMUP_IDS:
+        from app.ai_engines.model_registry import model_registry
+        model_registry.warm_up(settings.MODEL_WARMUP_IDS)
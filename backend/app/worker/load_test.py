@@ -0,0 +1,120 @@
+"""
+Test obciążeniowy kolejek Celery - opóźnienie kolejki przy mieszanym obciążeniu
+
+Wysyła zadania latency_probe do kolejek detection, training i default w zadanym tempie
+(długie "trenowania" symulowane są zajęciem procesu) i raportuje opóźnienie od wysłania
+do rozpoczęcia zadania (p50/p95/p99/max) dla każdej kolejki. Wymaga działających
+workerów (np. docker-compose up worker-detection worker-training worker-default).
+
+Użycie:
+    python -m app.worker.load_test --duration 60 --detection-rate 50 --training-jobs 2
+    python -m app.worker.load_test --single-queue default   # porównanie z jedną kolejką
+"""
+import argparse
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from celery.result import AsyncResult
+
+from app.worker.celery import celery_app
+from app.worker.routing import DEFAULT_QUEUE, DETECTION_QUEUE, TRAINING_QUEUE
+from app.worker.tasks import latency_probe
+
+
+def _schedule(duration: float, rate: float) -> List[float]:
+    """Momenty wysłania (s od startu) dla stałego tempa"""
+    if rate <= 0:
+        return []
+    return list(np.arange(0.0, duration, 1.0 / rate))
+
+
+def run_load(
+    duration: float,
+    detection_rate: float,
+    detection_busy: float,
+    training_jobs: int,
+    training_busy: float,
+    default_rate: float,
+    default_busy: float,
+    single_queue: Optional[str] = None
+) -> List[Tuple[str, AsyncResult]]:
+    """Wysyła mieszane obciążenie i zwraca listę (kolejka logiczna, wynik)"""
+    plan = []
+    # Trenowania wysyłane są na początku - blokują procesy przez cały test
+    plan += [(0.0, TRAINING_QUEUE, training_busy) for _ in range(training_jobs)]
+    plan += [(t, DETECTION_QUEUE, detection_busy) for t in _schedule(duration, detection_rate)]
+    plan += [(t, DEFAULT_QUEUE, default_busy) for t in _schedule(duration, default_rate)]
+    plan.sort(key=lambda item: item[0])
+
+    results = []
+    started = time.monotonic()
+    for offset, queue, busy in plan:
+        delay = offset - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        result = latency_probe.apply_async(args=[time.time(), busy], queue=single_queue or queue)
+        results.append((queue, result))
+    return results
+
+
+def collect(results: List[Tuple[str, AsyncResult]], timeout: float) -> Dict[str, Dict[str, float]]:
+    """Czeka na wyniki i liczy statystyki opóźnienia kolejki per kolejka (ms)"""
+    latencies = defaultdict(list)
+    missing = defaultdict(int)
+    deadline = time.monotonic() + timeout
+    for queue, result in results:
+        try:
+            value = result.get(timeout=max(0.1, deadline - time.monotonic()))
+            latencies[queue].append(value["queue_latency"] * 1000)
+        except Exception:
+            missing[queue] += 1
+        finally:
+            result.forget()
+
+    report = {}
+    for queue in sorted(set(latencies) | set(missing)):
+        values = np.array(latencies[queue]) if latencies[queue] else np.array([np.nan])
+        report[queue] = {
+            "tasks": len(latencies[queue]),
+            "timed_out": missing[queue],
+            "p50_ms": float(np.nanpercentile(values, 50)),
+            "p95_ms": float(np.nanpercentile(values, 95)),
+            "p99_ms": float(np.nanpercentile(values, 99)),
+            "max_ms": float(np.nanmax(values)),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test opóźnienia kolejek Celery przy mieszanym obciążeniu")
+    parser.add_argument("--duration", type=float, default=60.0, help="Czas wysyłania zadań (s)")
+    parser.add_argument("--detection-rate", type=float, default=50.0, help="Zadania detekcji na sekundę")
+    parser.add_argument("--detection-busy", type=float, default=0.05, help="Czas pracy zadania detekcji (s)")
+    parser.add_argument("--training-jobs", type=int, default=2, help="Liczba symulowanych trenowań")
+    parser.add_argument("--training-busy", type=float, default=120.0, help="Czas symulowanego trenowania (s)")
+    parser.add_argument("--default-rate", type=float, default=1.0, help="Pozostałe zadania na sekundę")
+    parser.add_argument("--default-busy", type=float, default=1.0, help="Czas pracy pozostałych zadań (s)")
+    parser.add_argument("--single-queue", default=None, help="Wyślij wszystko do jednej kolejki (porównanie)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Maksymalny czas oczekiwania na wyniki (s)")
+    args = parser.parse_args()
+
+    print(f"Broker: {celery_app.conf.broker_url}")
+    results = run_load(
+        args.duration, args.detection_rate, args.detection_busy, args.training_jobs, args.training_busy,
+        args.default_rate, args.default_busy, args.single_queue
+    )
+    print(f"Wysłano {len(results)} zadań, oczekiwanie na wyniki...")
+    report = collect(results, args.timeout)
+
+    print(f"{'kolejka':>10} {'zadania':>8} {'timeout':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for queue, stats in report.items():
+        print(
+            f"{queue:>10} {stats['tasks']:>8} {stats['timed_out']:>8} {stats['p50_ms']:>10.1f} "
+            f"{stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f} {stats['max_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
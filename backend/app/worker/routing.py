@@ -0,0 +1,82 @@
+from typing import Any, Dict, Optional
+from kombu import Exchange, Queue
+from app.core.config import settings
+
+# Kolejki Celery:
+# - detection: krótkie zadania inferencji, wiele małych procesów z większym prefetch
+# - training:  długie trenowania/eksporty modeli, dedykowane procesy (prefetch 1)
+# - video:     detekcja wideo (zadania wielogodzinne, osobny worker - nie blokują kolejki default)
+# - default:   pozostałe zadania (import/eksport datasetów, diagnostyka)
+DETECTION_QUEUE = "detection"
+TRAINING_QUEUE = "training"
+VIDEO_QUEUE = "video"
+DEFAULT_QUEUE = "default"
+
+TASK_QUEUES = (
+    Queue(DETECTION_QUEUE, Exchange(DETECTION_QUEUE), routing_key=DETECTION_QUEUE),
+    Queue(TRAINING_QUEUE, Exchange(TRAINING_QUEUE), routing_key=TRAINING_QUEUE),
+    Queue(VIDEO_QUEUE, Exchange(VIDEO_QUEUE), routing_key=VIDEO_QUEUE),
+    Queue(DEFAULT_QUEUE, Exchange(DEFAULT_QUEUE), routing_key=DEFAULT_QUEUE),
+)
+
+# Przypisanie zadań do kolejek (nazwy z @shared_task(name=...))
+QUEUE_BY_TASK = {
+    "process_detection": DETECTION_QUEUE,
+    "process_detection_batch": DETECTION_QUEUE,
+    "train_model": TRAINING_QUEUE,
+    "export_model": TRAINING_QUEUE,
+    "process_video_detection": VIDEO_QUEUE,
+}
+
+# Opcje wykonania poszczególnych zadań (task_annotations)
+# acks_late tylko dla detekcji - zadanie przerwane awarią procesu wraca do kolejki.
+# Trenowanie potwierdzane jest przy starcie: niepotwierdzone zadanie dłuższe niż
+# visibility_timeout brokera Redis zostałoby dostarczone drugi raz w trakcie działania.
+TASK_ANNOTATIONS = {
+    "process_detection": {
+        "acks_late": True,
+        "reject_on_worker_lost": True,
+        "soft_time_limit": settings.DETECTION_SOFT_TIME_LIMIT,
+        "time_limit": settings.DETECTION_TIME_LIMIT,
+    },
+    "process_detection_batch": {
+        "acks_late": True,
+        "reject_on_worker_lost": True,
+        "soft_time_limit": settings.DETECTION_SOFT_TIME_LIMIT,
+        "time_limit": settings.DETECTION_TIME_LIMIT,
+    },
+    "train_model": {
+        "acks_late": False,
+        "soft_time_limit": settings.TRAINING_SOFT_TIME_LIMIT,
+        "time_limit": settings.TRAINING_TIME_LIMIT,
+    },
+    "export_model": {
+        "acks_late": False,
+        "soft_time_limit": settings.TRAINING_SOFT_TIME_LIMIT,
+        "time_limit": settings.TRAINING_TIME_LIMIT,
+    },
+    "process_video_detection": {
+        "soft_time_limit": settings.VIDEO_DETECTION_SOFT_TIME_LIMIT,
+        "time_limit": settings.VIDEO_DETECTION_TIME_LIMIT,
+    },
+    "import_dataset": {
+        "soft_time_limit": settings.DEFAULT_TASK_SOFT_TIME_LIMIT,
+        "time_limit": settings.DEFAULT_TASK_TIME_LIMIT,
+    },
+    "export_dataset": {
+        "soft_time_limit": settings.DEFAULT_TASK_SOFT_TIME_LIMIT,
+        "time_limit": settings.DEFAULT_TASK_TIME_LIMIT,
+    },
+}
+
+
+def route_task(name: str, args, kwargs, options: Dict[str, Any], task=None, **kw) -> Optional[Dict[str, str]]:
+    """
+    Router Celery: wybiera kolejkę na podstawie nazwy zadania
+
+    Kolejka podana jawnie w apply_async(queue=...) ma pierwszeństwo (np. zadania
+    testu obciążeniowego kierowane do konkretnej kolejki).
+    """
+    if options.get("queue"):
+        return None
+    return {"queue": QUEUE_BY_TASK.get(name, DEFAULT_QUEUE)}
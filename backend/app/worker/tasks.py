@@ -1,60 +1,382 @@
 import logging
+import time
 from celery import shared_task
-from app.services.detection_service import DetectionService
+from app.services.detection_service import DetectionService, BatchDetectionError
 from app.services.training_service import TrainingService
+from app.services.dataset_import_service import DatasetImportService
+from app.services.dataset_export_service import DatasetExportService
+from app.services.detection_cache import DetectionCache
+from app.services.annotation_store import AnnotationStore
+from app.services.dataset_stats_service import DatasetStatsService
+from app.services.thumbnail_service import ThumbnailService
+from app.services.video_detection_service import VideoDetectionService
+from app.services.model_export_service import ModelExportService
 from app.db.session import SessionLocal
+from app.core.config import settings
+from app.core.events import publish_event, ProgressPublisher
+from app.worker.bulk_progress import BulkJobProgress
 
 logger = logging.getLogger(__name__)
 
-@shared_task(name="process_detection")
-def process_detection(image_id: int, model_id: int):
+def publish_task_event(task, status: str, data: dict = None):
+    """
+    Publikuje zdarzenie zadania
+
+    W kanale grupy (np. joba detekcji masowej) zdarzenie pojedynczej partii ma status
+    z prefiksem chunk_ - statusy processing i completed grupy dotyczą całego joba.
+    """
+    publish_event("task", task.request.id, status, data)
+    if task.request.group:
+        publish_event("task", task.request.group, f"chunk_{status}", {**(data or {}), "task_id": task.request.id})
+
+def publish_job_finish(job: BulkJobProgress, summary: dict):
+    """Publikuje zakończenie joba detekcji masowej - tylko przez partię, która zakończyła się ostatnia"""
+    if summary and summary["completed"]:
+        publish_event("task", job.job_id, "completed", summary)
+
+@shared_task(bind=True, name="process_detection")
+def process_detection(
+    self,
+    image_id: int,
+    model_id: int,
+    conf_threshold: float = None,
+    iou_threshold: float = None,
+    claim_key: str = None,
+    tile_size: int = None,
+    tile_overlap: float = None
+):
     """
     Zadanie asynchroniczne do przetwarzania detekcji obiektów na obrazie
+
+    claim_key - klucz cache zarejestrowany przez API (zwalniany po zakończeniu zadania)
     """
     logger.info(f"Rozpoczęcie detekcji dla obrazu {image_id} z modelem {model_id}")
+    publish_task_event(self, "started", {"image_id": image_id, "model_id": model_id})
     try:
         db = SessionLocal()
         detection_service = DetectionService(db)
-        result = detection_service.process_detection(image_id, model_id)
+        result = detection_service.process_detection(
+            image_id, model_id, conf_threshold, iou_threshold, tile_size, tile_overlap
+        )
         db.close()
+        publish_task_event(self, "completed", {
+            "image_id": image_id,
+            "detection_id": result["detection_id"],
+            "objects": len(result["objects"]),
+            "cached": result["cached"]
+        })
         return {"status": "success", "result": result}
     except Exception as e:
         logger.error(f"Błąd podczas detekcji: {str(e)}")
         if 'db' in locals():
             db.close()
+        publish_task_event(self, "failed", {"image_id": image_id, "message": str(e)})
         return {"status": "error", "message": str(e)}
+    finally:
+        # Zwolnienie bez DetectionService - także gdy jego utworzenie się nie powiodło
+        if claim_key:
+            DetectionCache().release(claim_key)
 
-@shared_task(name="train_model")
-def train_model(training_id: int):
+@shared_task(bind=True, name="process_detection_batch")
+def process_detection_batch(
+    self,
+    image_ids: list,
+    model_id: int,
+    conf_threshold: float = None,
+    iou_threshold: float = None,
+    tile_size: int = None,
+    tile_overlap: float = None
+):
+    """
+    Zadanie asynchroniczne do przetwarzania detekcji na partii obrazów (detekcja masowa)
+    """
+    logger.info(f"Rozpoczęcie detekcji partii {len(image_ids)} obrazów z modelem {model_id}")
+    try:
+        job = BulkJobProgress.load(self.request.group)
+        job_events = ProgressPublisher("task", job.job_id) if job else None
+        db = SessionLocal()
+        detection_service = DetectionService(db)
+
+        def report_progress(processed: int, total: int):
+            self.update_state(state="PROGRESS", meta={"processed": processed, "total": total})
+            publish_task_event(self, "processing", {"processed": processed, "total": total})
+            if job:
+                # Postęp całego joba (sumy po partiach), nie liczniki tej partii
+                summary = job.report(self.request.id, processed)
+                if summary:
+                    job_events(summary)
+
+        result = detection_service.process_detection_batch(
+            image_ids, model_id, report_progress, conf_threshold, iou_threshold, tile_size, tile_overlap
+        )
+        db.close()
+        publish_task_event(self, "completed", result)
+        if job:
+            publish_job_finish(job, job.finish(self.request.id, result["processed"], result["failed"]))
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas detekcji partii: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        # Liczniki obrazów z partii zatwierdzonych przed błędem (bez nich cała partia jest nieudana)
+        counts = {"total": len(image_ids), "processed": 0, "failed": 0}
+        if isinstance(e, BatchDetectionError):
+            counts.update(processed=e.processed, failed=e.failed)
+        publish_task_event(self, "failed", {"message": str(e), **counts})
+        if 'job' in locals() and job:
+            # Jak w GET /detection/bulk/{job_id}: zatwierdzone obrazy są gotowe, reszta partii nieudana
+            succeeded = counts["processed"] - counts["failed"]
+            publish_job_finish(job, job.finish(self.request.id, counts["total"], counts["total"] - succeeded))
+        return {"status": "error", "message": str(e), **counts}
+
+@shared_task(bind=True, name="process_video_detection")
+def process_video_detection(self, video_detection_id: int):
+    """
+    Zadanie asynchroniczne do detekcji na klatkach pliku wideo
+    """
+    logger.info(f"Rozpoczęcie detekcji wideo {video_detection_id}")
+    publish_task_event(self, "started", {"video_detection_id": video_detection_id})
+    try:
+        db = SessionLocal()
+        video_service = VideoDetectionService(db)
+        task_events = ProgressPublisher("task", self.request.id)
+
+        def report_progress(processed: int, total: int):
+            progress = {"video_detection_id": video_detection_id, "processed": processed, "total": total}
+            self.update_state(state="PROGRESS", meta=progress)
+            task_events(progress)
+
+        result = video_service.process_video_detection(video_detection_id, report_progress)
+        db.close()
+        publish_task_event(self, "completed", result)
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas detekcji wideo: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        publish_task_event(self, "failed", {"video_detection_id": video_detection_id, "message": str(e)})
+        return {"status": "error", "message": str(e)}
+
+@shared_task(bind=True, name="train_model")
+def train_model(self, training_id: int):
     """
     Zadanie asynchroniczne do trenowania modelu
     """
     logger.info(f"Rozpoczęcie trenowania dla zadania {training_id}")
+    publish_event("training", training_id, "started", {"task_id": self.request.id})
     try:
         db = SessionLocal()
         training_service = TrainingService(db)
-        result = training_service.process_training(training_id)
+
+        def report_epoch(progress: dict):
+            self.update_state(state="PROGRESS", meta=progress)
+            publish_event("training", training_id, "processing", {"task_id": self.request.id, **progress})
+
+        result = training_service.process_training(training_id, report_epoch)
+        model_id = training_service.get_training(training_id).model_id
         db.close()
+        publish_event("training", training_id, "completed", {"task_id": self.request.id})
+        if settings.TRAINING_AUTO_EXPORT:
+            export_model.delay(model_id)
         return {"status": "success", "result": result}
     except Exception as e:
         logger.error(f"Błąd podczas trenowania: {str(e)}")
         if 'db' in locals():
             db.close()
+        publish_event("training", training_id, "failed", {"task_id": self.request.id, "message": str(e)})
+        return {"status": "error", "message": str(e)}
+
+@shared_task(bind=True, name="import_dataset")
+def import_dataset(self, dataset_id: int, object_name: str, dataset_format: str):
+    """
+    Zadanie asynchroniczne do importu archiwum datasetu (YOLO, COCO, VOC) z MinIO
+    """
+    logger.info(f"Rozpoczęcie importu {object_name} do datasetu {dataset_id}")
+    try:
+        db = SessionLocal()
+        import_service = DatasetImportService(db)
+        task_events = ProgressPublisher("task", self.request.id)
+
+        def report_progress(progress: dict):
+            self.update_state(state="PROGRESS", meta=progress)
+            task_events(progress)
+
+        result = import_service.import_archive(dataset_id, object_name, dataset_format, report_progress)
+        db.close()
+        publish_task_event(self, "completed", result)
+        publish_event("dataset", dataset_id, "updated", {"task_id": self.request.id, "import": result})
+        refresh_annotation_store.delay(dataset_id)
+        generate_dataset_thumbnails.delay(dataset_id)
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas importu datasetu: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        publish_task_event(self, "failed", {"message": str(e)})
         return {"status": "error", "message": str(e)}
 
-@shared_task(name="export_model")
-def export_model(model_id: int, format: str):
+@shared_task(bind=True, name="export_dataset")
+def export_dataset(self, dataset_id: int, export_format: str = None, archive_type: str = "zip"):
     """
-    Zadanie asynchroniczne do eksportowania modelu do określonego formatu
+    Zadanie asynchroniczne do eksportu datasetu do archiwum YOLO/COCO/VOC w MinIO
     """
-    logger.info(f"Rozpoczęcie eksportu modelu {model_id} do formatu {format}")
+    logger.info(f"Rozpoczęcie eksportu datasetu {dataset_id} do formatu {export_format}")
     try:
         db = SessionLocal()
-        # Tutaj implementacja eksportu modelu
+        export_service = DatasetExportService(db)
+        task_events = ProgressPublisher("task", self.request.id)
+
+        def report_progress(progress: dict):
+            self.update_state(state="PROGRESS", meta=progress)
+            task_events(progress)
+
+        result = export_service.export_dataset(dataset_id, export_format, archive_type, report_progress)
+        db.close()
+        publish_task_event(self, "completed", result)
+        publish_event("dataset", dataset_id, "exported", {"task_id": self.request.id, "url": result.get("url")})
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas eksportu datasetu: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        publish_task_event(self, "failed", {"message": str(e)})
+        return {"status": "error", "message": str(e)}
+
+@shared_task(bind=True, name="export_model")
+def export_model(self, model_id: int, int8: bool = None):
+    """
+    Zadanie asynchroniczne do eksportowania modelu do ONNX (oraz ONNX INT8)
+    """
+    logger.info(f"Rozpoczęcie eksportu modelu {model_id}")
+    publish_task_event(self, "started", {"model_id": model_id})
+    try:
+        db = SessionLocal()
+        export_service = ModelExportService(db)
+
+        def report_progress(progress: dict):
+            self.update_state(state="PROGRESS", meta=progress)
+            publish_task_event(self, "processing", {"model_id": model_id, **progress})
+
+        int8 = settings.EXPORT_INT8 if int8 is None else int8
+        result = export_service.export_model(model_id, int8, report_progress)
         db.close()
-        return {"status": "success", "message": f"Model {model_id} wyeksportowany do formatu {format}"}
+        publish_task_event(self, "completed", {"model_id": model_id, "runtimes": list(result["runtimes"])})
+        return {"status": "success", "result": result}
     except Exception as e:
         logger.error(f"Błąd podczas eksportu modelu: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        publish_task_event(self, "failed", {"model_id": model_id, "message": str(e)})
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name="refresh_annotation_store")
+def refresh_annotation_store(dataset_id: int, full: bool = False):
+    """
+    Zadanie odświeżające kolumnową migawkę adnotacji datasetu (AnnotationStore)
+    """
+    try:
+        db = SessionLocal()
+        annotations = AnnotationStore(db).refresh(dataset_id, full=full)
+        db.close()
+        return {"status": "success", "result": {"dataset_id": dataset_id, "annotations": len(annotations), "revision": annotations.revision}}
+    except Exception as e:
+        logger.error(f"Błąd podczas odświeżania migawki adnotacji: {str(e)}")
         if 'db' in locals():
             db.close()
         return {"status": "error", "message": str(e)}
+
+@shared_task(name="generate_thumbnails")
+def generate_thumbnails(image_ids: list):
+    """
+    Zadanie generujące miniatury (wszystkie rozmiary, WebP i JPEG) dla listy obrazów
+    """
+    try:
+        db = SessionLocal()
+        result = ThumbnailService(db).generate(image_ids)
+        db.close()
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas generowania miniatur: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name="generate_dataset_thumbnails")
+def generate_dataset_thumbnails(dataset_id: int):
+    """
+    Zadanie generujące brakujące miniatury obrazów datasetu (np. po imporcie archiwum)
+    """
+    try:
+        db = SessionLocal()
+        thumbnail_service = ThumbnailService(db)
+        generated, failed, after = 0, [], 0
+        while True:
+            image_ids = thumbnail_service.pending_ids(dataset_id, settings.THUMBNAIL_BATCH_SIZE, after)
+            if not image_ids:
+                break
+            result = thumbnail_service.generate(image_ids)
+            generated += result["generated"]
+            failed += result["failed"]
+            after = image_ids[-1]
+        db.close()
+        return {"status": "success", "result": {"dataset_id": dataset_id, "generated": generated, "failed": failed}}
+    except Exception as e:
+        logger.error(f"Błąd podczas generowania miniatur datasetu: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name="rebuild_dataset_stats")
+def rebuild_dataset_stats(dataset_id: int):
+    """
+    Zadanie przeliczające statystyki datasetu od zera (z migawki adnotacji)
+    """
+    try:
+        db = SessionLocal()
+        stats = DatasetStatsService(db).rebuild(dataset_id)
+        result = {"dataset_id": dataset_id, "annotations_count": stats.annotations_count}
+        db.close()
+        return {"status": "success", "result": result}
+    except Exception as e:
+        logger.error(f"Błąd podczas przeliczania statystyk datasetu: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name="purge_detection_cache")
+def purge_detection_cache():
+    """
+    Zadanie usuwające przeterminowane wpisy cache wyników detekcji z bazy danych
+    """
+    try:
+        db = SessionLocal()
+        removed = DetectionCache(db).purge_expired()
+        db.close()
+        logger.info(f"Usunięto {removed} przeterminowanych wpisów cache detekcji")
+        return {"status": "success", "result": {"removed": removed}}
+    except Exception as e:
+        logger.error(f"Błąd podczas czyszczenia cache detekcji: {str(e)}")
+        if 'db' in locals():
+            db.close()
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name="model_registry_stats")
+def model_registry_stats():
+    """
+    Zwraca liczniki rejestru modeli procesu workera, który wykonał zadanie
+
+    Liczniki całej floty: GET /api/v1/models/registry/stats.
+    """
+    from app.ai_engines.model_registry import model_registry
+    return model_registry.stats()
+
+@shared_task(name="latency_probe")
+def latency_probe(sent_at: float, busy_seconds: float = 0.0):
+    """
+    Zadanie testu obciążeniowego: zwraca opóźnienie kolejki (start - wysłanie)
+    i opcjonalnie zajmuje proces przez busy_seconds (symulacja pracy)
+    """
+    started_at = time.time()
+    if busy_seconds:
+        time.sleep(busy_seconds)
+    return {"queue_latency": started_at - sent_at, "started_at": started_at}
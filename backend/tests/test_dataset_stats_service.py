@@ -0,0 +1,58 @@
+"""Statystyki datasetu z adnotacjami bez klasy (Annotation.class_id NULL)"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+from app.services.annotation_store import ColumnarAnnotations  # noqa: E402
+from app.services.dataset_stats_service import DatasetStatsService  # noqa: E402
+
+
+def _session(stats, class_names):
+    db = MagicMock()
+    query = db.query.return_value.filter.return_value
+    query.first.return_value = (stats.dataset_id,)
+    query.__iter__.side_effect = lambda: iter(class_names)
+    db.get.return_value = stats
+    db.execute.return_value.one.return_value = (stats.images_count, stats.labeled_images_count)
+    return db
+
+
+def _stats(class_counts):
+    return SimpleNamespace(
+        dataset_id=1, images_count=2, labeled_images_count=2, annotations_count=sum(class_counts.values()),
+        class_counts=class_counts, box_size_histogram=[], updated_at=None
+    )
+
+
+def test_get_stats_reports_null_class_separately():
+    stats = _stats({"1": 3, "None": 2})
+    result = DatasetStatsService(_session(stats, [(1, "car")])).get_stats(1)
+
+    assert result["classes"] == [{"class_id": 1, "name": "car", "count": 3}]
+    assert result["unclassified_count"] == 2
+    assert result["annotations_count"] == 5
+    assert result["imbalance_ratio"] == 1.0
+
+
+def test_snapshot_null_class_round_trips_through_get_stats():
+    stats = _stats({})
+    db = _session(stats, [(1, "car")])
+    annotations = ColumnarAnnotations(
+        ids=np.arange(3),
+        image_ids=np.array([1, 1, 2]),
+        class_ids=np.array([1, -1, 1]),
+        boxes=np.array([[0.1, 0.1, 0.3, 0.3]] * 3, dtype=np.float32)
+    )
+
+    service = DatasetStatsService(db)
+    service._compute(stats, annotations)
+    result = service.get_stats(1)
+
+    assert stats.class_counts == {"1": 2, "None": 1}
+    assert result["classes"] == [{"class_id": 1, "name": "car", "count": 2}]
+    assert result["unclassified_count"] == 1